@@ -73,6 +73,7 @@ CREATE TABLE restaurants (
     -- Ratings and stats
     average_rating DECIMAL(3, 2) DEFAULT 0.00,
     total_reviews INTEGER DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0, -- running totals kept by the API, see reviews.py
     total_orders INTEGER DEFAULT 0,
     
     -- Delivery info
@@ -233,6 +234,46 @@ CREATE TABLE cart_items (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- ===============================================
+-- ORDER COUNTER SHARDS (checkouts bump a random shard; the API folds them into
+-- restaurants.total_orders every few seconds, see order_counters.py)
+-- ===============================================
+CREATE TABLE restaurant_order_count_shards (
+    restaurant_id UUID REFERENCES restaurants(id) ON DELETE CASCADE,
+    shard INTEGER NOT NULL,
+    orders INTEGER NOT NULL DEFAULT 0, -- not yet folded into total_orders
+    
+    PRIMARY KEY (restaurant_id, shard)
+);
+
+-- ===============================================
+-- SALES ROLLUPS (maintained by the API in the order transactions, see analytics.py)
+-- ===============================================
+CREATE TABLE restaurant_sales_rollups (
+    restaurant_id UUID REFERENCES restaurants(id) ON DELETE CASCADE,
+    granularity VARCHAR(10) CHECK (granularity IN ('hour', 'day')),
+    bucket_start TIMESTAMP NOT NULL, -- UTC
+    
+    orders INTEGER NOT NULL DEFAULT 0,
+    cancelled_orders INTEGER NOT NULL DEFAULT 0,
+    delivered_orders INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+    
+    PRIMARY KEY (restaurant_id, granularity, bucket_start)
+);
+
+CREATE TABLE menu_item_sales_rollups (
+    menu_item_id UUID REFERENCES menu_items(id) ON DELETE CASCADE,
+    granularity VARCHAR(10) CHECK (granularity IN ('hour', 'day')),
+    bucket_start TIMESTAMP NOT NULL, -- UTC
+    restaurant_id UUID NOT NULL REFERENCES restaurants(id) ON DELETE CASCADE,
+    
+    quantity INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+    
+    PRIMARY KEY (menu_item_id, granularity, bucket_start)
+);
+
 -- ===============================================
 -- INDEXES FOR PERFORMANCE
 -- ===============================================
@@ -250,6 +291,10 @@ CREATE INDEX idx_restaurants_owner_id ON restaurants(owner_id);
 CREATE INDEX idx_restaurants_cuisine_type ON restaurants(cuisine_type);
 CREATE INDEX idx_restaurants_location ON restaurants(latitude, longitude);
 CREATE INDEX idx_restaurants_active_open ON restaurants(is_active, is_open);
+CREATE INDEX idx_restaurants_created_at ON restaurants(created_at, id);
+-- Nearby search with GEO_BACKEND=postgis (requires: CREATE EXTENSION postgis;)
+-- CREATE INDEX idx_restaurants_geography ON restaurants
+--     USING GIST (geography(ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)));
 
 -- Menu indexes
 CREATE INDEX idx_menu_categories_restaurant_id ON menu_categories(restaurant_id);
@@ -257,6 +302,16 @@ CREATE INDEX idx_menu_items_restaurant_id ON menu_items(restaurant_id);
 CREATE INDEX idx_menu_items_category_id ON menu_items(category_id);
 CREATE INDEX idx_menu_items_available ON menu_items(is_available);
 
+-- Full-text search (SEARCH_BACKEND=postgres); expressions match crud._search_document
+CREATE INDEX idx_restaurants_search ON restaurants USING GIN ((
+    setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'B')
+));
+CREATE INDEX idx_menu_items_search ON menu_items USING GIN ((
+    setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'B')
+));
+
 -- Order indexes
 CREATE INDEX idx_orders_customer_id ON orders(customer_id);
 CREATE INDEX idx_orders_restaurant_id ON orders(restaurant_id);
@@ -265,7 +320,7 @@ CREATE INDEX idx_orders_created_at ON orders(created_at);
 CREATE INDEX idx_order_items_order_id ON order_items(order_id);
 
 -- Review indexes
-CREATE INDEX idx_restaurant_reviews_restaurant_id ON restaurant_reviews(restaurant_id);
+CREATE INDEX idx_restaurant_reviews_restaurant_id ON restaurant_reviews(restaurant_id, created_at);
 CREATE INDEX idx_restaurant_reviews_customer_id ON restaurant_reviews(customer_id);
 
 -- Favorites indexes
@@ -274,6 +329,10 @@ CREATE INDEX idx_favorites_user_id ON favorites(user_id);
 -- Cart indexes
 CREATE INDEX idx_cart_items_user_id ON cart_items(user_id);
 
+-- Sales rollup indexes
+CREATE INDEX idx_restaurant_sales_rollups_bucket ON restaurant_sales_rollups(granularity, bucket_start);
+CREATE INDEX idx_menu_item_sales_rollups_restaurant ON menu_item_sales_rollups(restaurant_id, granularity, bucket_start);
+
 -- ===============================================
 -- FUNCTIONS AND TRIGGERS
 -- ===============================================
@@ -297,32 +356,12 @@ CREATE TRIGGER update_orders_updated_at BEFORE UPDATE ON orders FOR EACH ROW EXE
 CREATE TRIGGER update_restaurant_reviews_updated_at BEFORE UPDATE ON restaurant_reviews FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_cart_items_updated_at BEFORE UPDATE ON cart_items FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
--- Function to update restaurant average rating
-CREATE OR REPLACE FUNCTION update_restaurant_rating()
-RETURNS TRIGGER AS $$
-BEGIN
-    UPDATE restaurants 
-    SET 
-        average_rating = (
-            SELECT COALESCE(AVG(rating), 0) 
-            FROM restaurant_reviews 
-            WHERE restaurant_id = COALESCE(NEW.restaurant_id, OLD.restaurant_id)
-        ),
-        total_reviews = (
-            SELECT COUNT(*) 
-            FROM restaurant_reviews 
-            WHERE restaurant_id = COALESCE(NEW.restaurant_id, OLD.restaurant_id)
-        )
-    WHERE id = COALESCE(NEW.restaurant_id, OLD.restaurant_id);
-    
-    RETURN COALESCE(NEW, OLD);
-END;
-$$ language 'plpgsql';
-
--- Trigger to update restaurant rating when review is added/updated/deleted
-CREATE TRIGGER update_restaurant_rating_trigger 
-    AFTER INSERT OR UPDATE OR DELETE ON restaurant_reviews
-    FOR EACH ROW EXECUTE FUNCTION update_restaurant_rating();
+-- Restaurant ratings (average_rating, total_reviews, rating_sum) are maintained by
+-- the API as running totals in each review transaction instead of a trigger that
+-- re-aggregates every review of the restaurant per write; `python reviews.py`
+-- recomputes them from restaurant_reviews, leaving restaurants without any review
+-- rows (such as the sample data below) as they are. On a database created with the
+-- old update_restaurant_rating_trigger, it also drops the trigger and adds rating_sum.
 
 -- ===============================================
 -- SAMPLE DATA (ITALIAN & CHINESE RESTAURANTS)
@@ -354,6 +393,9 @@ INSERT INTO restaurants (owner_id, name, description, cuisine_type, phone, email
 ((SELECT id FROM users WHERE email = 'chen@dragonpalace.com'), 'Dragon Palace', 'Traditional Szechuan and Cantonese dishes with bold flavors', 'chinese', '(555) 345-6789', 'chen@dragonpalace.com', '789 Chinatown Ave', 'New York', 'NY', '10013', 40.7157, -73.9970, '/images/restaurants/dragon-palace-cover.jpg', true, true, 4.7, 312, 4.99, 20.00, 25),
 ((SELECT id FROM users WHERE email = 'li@goldenwok.com'), 'Golden Wok Express', 'Fast and delicious Chinese takeout with generous portions', 'chinese', '(555) 456-7890', 'li@goldenwok.com', '321 Dragon Street', 'New York', 'NY', '10013', 40.7183, -73.9944, '/images/restaurants/golden-wok-cover.jpg', true, true, 4.2, 156, 3.49, 10.00, 20);
 
+-- Sample ratings have no review rows behind them (reconciliation keeps them); keep the running sum consistent
+UPDATE restaurants SET rating_sum = ROUND(average_rating * total_reviews);
+
 -- This schema provides:
 -- 1. Complete user management (customers, sellers, admins)
 -- 2. Restaurant management with location support
@@ -363,5 +405,5 @@ INSERT INTO restaurants (owner_id, name, description, cuisine_type, phone, email
 -- 6. Cart persistence
 -- 7. Address management
 -- 8. Performance optimized with proper indexes
--- 9. Automatic triggers for data consistency
+-- 9. Automatic triggers for data consistency (ratings are kept by the API)
 -- 10. Sample data for Italian and Chinese restaurants
\ No newline at end of file
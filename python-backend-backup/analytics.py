@@ -0,0 +1,184 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import MenuItem, MenuItemSalesRollup, Order, OrderItem, Restaurant, RestaurantSalesRollup
+
+# Sales rollups: per-restaurant and per-menu-item counters in hourly and daily UTC
+# buckets, maintained incrementally in the order transactions (crud.create_order,
+# crud.update_order), so dashboards read O(buckets) rows instead of scanning orders.
+# Orders count in the bucket they were placed in; a cancellation reverses their
+# revenue and item sales there.
+
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+RESTAURANT_COUNTERS = ("orders", "cancelled_orders", "delivered_orders", "revenue")
+MENU_ITEM_COUNTERS = ("quantity", "revenue")
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Start of the UTC hour / day containing moment, as a naive datetime"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    if granularity == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def bucket_end(moment: datetime, granularity: str) -> datetime:
+    """First hour / day boundary at or after moment: the exclusive end of a range up to moment"""
+    start = bucket_start(moment, granularity)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return start if start == moment else start + GRANULARITIES[granularity]
+
+def _add(db: Session, model, rows: List[Dict], counters: Tuple[str, ...]):
+    """Add rows' counters onto existing buckets, creating missing ones (one executemany)"""
+    if not rows:
+        return
+    table = model.__table__
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    statement = dialect_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key],
+        set_={name: table.c[name] + statement.excluded[name] for name in counters},
+    )
+    db.execute(statement, rows)
+
+def _apply(db: Session, restaurant_id: str, placed_at: datetime, restaurant_deltas: Dict,
+           item_deltas: List[Tuple[str, int, float]]):
+    restaurant_rows, item_rows = [], []
+    for granularity in GRANULARITIES:
+        start = bucket_start(placed_at, granularity)
+        restaurant_rows.append({
+            "restaurant_id": restaurant_id, "granularity": granularity, "bucket_start": start,
+            **{name: restaurant_deltas.get(name, 0) for name in RESTAURANT_COUNTERS},
+        })
+        item_rows.extend(
+            {"menu_item_id": menu_item_id, "granularity": granularity, "bucket_start": start,
+             "restaurant_id": restaurant_id, "quantity": quantity, "revenue": revenue}
+            for menu_item_id, quantity, revenue in item_deltas
+        )
+    _add(db, RestaurantSalesRollup, restaurant_rows, RESTAURANT_COUNTERS)
+    _add(db, MenuItemSalesRollup, item_rows, MENU_ITEM_COUNTERS)
+
+def record_order_placed(db: Session, restaurant_id: str, placed_at: datetime, total_amount: float,
+                        order_items: List[Dict]):
+    """Count a new order; order_items are the rows inserted into order_items"""
+    _apply(
+        db, restaurant_id, placed_at, {"orders": 1, "revenue": total_amount},
+        [(item["menu_item_id"], item["quantity"], item["total_price"]) for item in order_items],
+    )
+
+def record_status_change(db: Session, order_id: str, restaurant_id: str, placed_at: datetime,
+                         total_amount: float, previous_status: str, status: str):
+    """Count a status transition in the caller's transaction; only delivery and cancellation move rollups"""
+    if status == previous_status:
+        return
+    if status == "delivered":
+        _apply(db, restaurant_id, placed_at, {"delivered_orders": 1}, [])
+    elif status == "cancelled":
+        # Cancellations are rare; reading the order's lines back keeps order placement cheap
+        lines = db.execute(
+            select(OrderItem.menu_item_id, func.sum(OrderItem.quantity), func.sum(OrderItem.total_price))
+            .where(OrderItem.order_id == order_id)
+            .group_by(OrderItem.menu_item_id)
+        ).all()
+        _apply(
+            db, restaurant_id, placed_at, {"cancelled_orders": 1, "revenue": -total_amount},
+            [(menu_item_id, -quantity, -revenue) for menu_item_id, quantity, revenue in lines],
+        )
+
+def _scope(query, model, restaurant_id: Optional[str], owner_id: Optional[str]):
+    if restaurant_id:
+        query = query.where(model.restaurant_id == restaurant_id)
+    if owner_id:
+        query = query.where(model.restaurant_id.in_(select(Restaurant.id).where(Restaurant.owner_id == owner_id)))
+    return query
+
+def get_sales(db: Session, granularity: str, start: datetime, end: datetime,
+              restaurant_id: Optional[str] = None, owner_id: Optional[str] = None):
+    """Summed counters per bucket starting in [start, end), oldest first; empty buckets omitted"""
+    query = select(
+        RestaurantSalesRollup.bucket_start,
+        *(func.sum(getattr(RestaurantSalesRollup, name)).label(name) for name in RESTAURANT_COUNTERS),
+    ).where(
+        RestaurantSalesRollup.granularity == granularity,
+        RestaurantSalesRollup.bucket_start >= start,
+        RestaurantSalesRollup.bucket_start < end,
+    )
+    query = _scope(query, RestaurantSalesRollup, restaurant_id, owner_id)
+    return db.execute(query.group_by(RestaurantSalesRollup.bucket_start).order_by(RestaurantSalesRollup.bucket_start)).all()
+
+def get_top_menu_items(db: Session, granularity: str, start: datetime, end: datetime, limit: int = 10,
+                       restaurant_id: Optional[str] = None, owner_id: Optional[str] = None):
+    """Best-selling menu items by revenue over the buckets starting in [start, end)"""
+    quantity = func.sum(MenuItemSalesRollup.quantity)
+    revenue = func.sum(MenuItemSalesRollup.revenue)
+    query = (
+        select(MenuItemSalesRollup.menu_item_id, MenuItem.restaurant_id, MenuItem.name,
+               quantity.label("quantity"), revenue.label("revenue"))
+        .join(MenuItem, MenuItem.id == MenuItemSalesRollup.menu_item_id)
+        .where(
+            MenuItemSalesRollup.granularity == granularity,
+            MenuItemSalesRollup.bucket_start >= start,
+            MenuItemSalesRollup.bucket_start < end,
+        )
+    )
+    query = _scope(query, MenuItemSalesRollup, restaurant_id, owner_id)
+    query = query.group_by(MenuItemSalesRollup.menu_item_id, MenuItem.restaurant_id, MenuItem.name)
+    return db.execute(query.having(quantity > 0).order_by(revenue.desc()).limit(limit)).all()
+
+def rebuild(db: Session, batch_size: int = 10000):
+    """Recompute every rollup from orders, e.g. after a bulk load that bypassed crud (datagen)"""
+    restaurant_buckets = defaultdict(lambda: dict.fromkeys(RESTAURANT_COUNTERS, 0))
+    item_buckets = defaultdict(lambda: dict.fromkeys(MENU_ITEM_COUNTERS, 0))
+
+    orders = select(Order.restaurant_id, Order.created_at, Order.status, Order.total_amount)
+    for partition in db.execute(orders.execution_options(yield_per=batch_size)).partitions():
+        for restaurant_id, created_at, status, total_amount in partition:
+            for granularity in GRANULARITIES:
+                bucket = restaurant_buckets[restaurant_id, granularity, bucket_start(created_at, granularity)]
+                bucket["orders"] += 1
+                if status == "cancelled":
+                    bucket["cancelled_orders"] += 1
+                else:
+                    bucket["revenue"] += total_amount
+                    bucket["delivered_orders"] += status == "delivered"
+
+    lines = (
+        select(OrderItem.menu_item_id, Order.restaurant_id, Order.created_at, OrderItem.quantity, OrderItem.total_price)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.status != "cancelled")
+    )
+    for partition in db.execute(lines.execution_options(yield_per=batch_size)).partitions():
+        for menu_item_id, restaurant_id, created_at, quantity, total_price in partition:
+            for granularity in GRANULARITIES:
+                bucket = item_buckets[menu_item_id, granularity, bucket_start(created_at, granularity), restaurant_id]
+                bucket["quantity"] += quantity
+                bucket["revenue"] += total_price
+
+    db.execute(delete(RestaurantSalesRollup))
+    db.execute(delete(MenuItemSalesRollup))
+    restaurant_rows = [
+        {"restaurant_id": restaurant_id, "granularity": granularity, "bucket_start": start, **counters}
+        for (restaurant_id, granularity, start), counters in restaurant_buckets.items()
+    ]
+    item_rows = [
+        {"menu_item_id": menu_item_id, "granularity": granularity, "bucket_start": start,
+         "restaurant_id": restaurant_id, **counters}
+        for (menu_item_id, granularity, start, restaurant_id), counters in item_buckets.items()
+    ]
+    for model, rows in ((RestaurantSalesRollup, restaurant_rows), (MenuItemSalesRollup, item_rows)):
+        for offset in range(0, len(rows), batch_size):
+            db.execute(insert(model), rows[offset:offset + batch_size])
+    db.commit()
+    return len(restaurant_rows), len(item_rows)
+
+if __name__ == "__main__":
+    __import__("main")  # creates the tables
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        restaurant_count, item_count = rebuild(db)
+    print(f"rebuilt {restaurant_count} restaurant and {item_count} menu item buckets")
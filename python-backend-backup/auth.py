@@ -1,40 +1,158 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from time import monotonic
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from prometheus_client import Counter
+import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 
-from database import SessionLocal
+from database import db_session, get_db, run_db
 from models import User
-from schemas import TokenData
+from schemas import TokenData, UserResponse
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Authenticated principals are cached per token subject so authorization checks
+# skip the users query; a TTL of 0 disables the cache
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+# When set, invalidations are broadcast over Redis pub/sub so every worker drops the
+# principal at once. Without it only the worker handling the change does, and the
+# others keep serving the old role / active flag for up to USER_CACHE_TTL seconds.
+USER_CACHE_REDIS_URL = os.getenv("USER_CACHE_REDIS_URL")
+USER_CACHE_CHANNEL = os.getenv("USER_CACHE_CHANNEL", "principal-invalidations")
+
+# bcrypt cost factor; each +1 doubles hashing time
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Hashing runs on a dedicated pool so a login burst cannot stall the event loop or
+# starve the threadpool used for DB calls; 0 workers hashes inline (benchmarks only)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+# Hashes allowed to queue behind busy workers before requests are shed with a 503
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+_hash_executor = (
+    ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    if PASSWORD_HASH_WORKERS > 0 else None
+)
+_hashes_in_flight = 0
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def _run_hash(fn, *args):
+    global _hashes_in_flight
+    if _hash_executor is None:
+        return fn(*args)
+    if _hashes_in_flight >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent authentication requests, please retry",
+            headers={"Retry-After": "1"},
+        )
+    _hashes_in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hashes_in_flight -= 1
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_hash(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _run_hash(get_password_hash, password)
+
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = get_user_by_email(db, email)
+USER_CACHE_REQUESTS = Counter("user_cache_requests_total", "Principal cache lookups by result", ["result"])
+
+_principal_cache = OrderedDict()
+
+def _cached_principal(email: str):
+    entry = _principal_cache.get(email)
+    if entry is None or entry[0] < monotonic():
+        USER_CACHE_REQUESTS.labels("miss").inc()
+        return None
+    _principal_cache.move_to_end(email)
+    USER_CACHE_REQUESTS.labels("hit").inc()
+    return entry[1]
+
+def _cache_principal(email: str, principal: UserResponse):
+    if USER_CACHE_TTL <= 0:
+        return
+    _principal_cache[email] = (monotonic() + USER_CACHE_TTL, principal)
+    _principal_cache.move_to_end(email)
+    while len(_principal_cache) > USER_CACHE_MAX_ENTRIES:
+        _principal_cache.popitem(last=False)
+
+_redis = None
+if USER_CACHE_REDIS_URL:
+    import redis.asyncio as redis
+
+    _redis = redis.Redis.from_url(USER_CACHE_REDIS_URL, decode_responses=True)
+_invalidation_listener: Optional[asyncio.Task] = None
+
+async def invalidate_user_principal(email: str):
+    """Drop a cached principal, on every worker, after the user's role or active flag changes"""
+    _principal_cache.pop(email, None)
+    if _redis is not None:
+        try:
+            await _redis.publish(USER_CACHE_CHANNEL, email)
+        except Exception:
+            logger.warning("Principal invalidation publish failed; other workers expire it by TTL", exc_info=True)
+
+async def _listen_for_invalidations(redis_client):
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(USER_CACHE_CHANNEL)
+                # Invalidations published while we were not subscribed are lost
+                _principal_cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        _principal_cache.pop(message["data"], None)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Principal invalidation listener lost Redis; reconnecting", exc_info=True)
+            await asyncio.sleep(1)
+
+def start_invalidation_listener():
+    global _invalidation_listener
+    if _redis is not None and (_invalidation_listener is None or _invalidation_listener.done()):
+        _invalidation_listener = asyncio.get_running_loop().create_task(_listen_for_invalidations(_redis))
+
+async def close():
+    if _invalidation_listener is not None:
+        _invalidation_listener.cancel()
+    if _redis is not None:
+        await _redis.close()
+
+async def authenticate_user(db: Session, email: str, password: str):
+    user = await run_db(db, get_user_by_email, email)
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    if not await verify_password_async(password, user.password_hash):
         return False
     return user
 
@@ -48,13 +166,6 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -69,7 +180,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = get_user_by_email(db, email=token_data.email)
+    user = _cached_principal(token_data.email)
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        db_user = await run_db(db, get_user_by_email, email=token_data.email)
+        if db_user is None:
+            raise credentials_exception
+        user = UserResponse.model_validate(db_user)
+        _cache_principal(token_data.email, user)
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return user
+
+async def get_stream_user(token: str) -> UserResponse:
+    """get_current_user for long-lived streams: the lookup session is closed before
+    streaming starts, so idle connections do not pin pooled DB connections"""
+    async with db_session() as db:
+        return await get_current_user(token=token, db=db)
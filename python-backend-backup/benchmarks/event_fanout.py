@@ -0,0 +1,62 @@
+"""Order event fan-out benchmark.
+
+Opens many idle subscriptions on the in-process broker (as SSE / WebSocket streams
+would), then publishes status transitions and reports memory per subscription and
+publish latency. Fan-out is keyed by customer / seller, so a publish only touches
+the streams of one order's parties however many are open.
+
+    python benchmarks/event_fanout.py --subscribers 20000 --events 10000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tracemalloc
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import order_events
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def run(args):
+    broker = order_events.LocalBroker()
+    customers = [f"customer-{n}" for n in range(args.subscribers)]
+    sellers = [f"seller-{n}" for n in range(args.sellers)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subscriptions = [broker.subscribe(order_events.customer_key(user_id)) for user_id in customers]
+    subscriptions += [broker.subscribe(order_events.seller_key(user_id)) for user_id in sellers]
+    per_subscription = (tracemalloc.get_traced_memory()[0] - before) / len(subscriptions)
+    tracemalloc.stop()
+
+    timings = []
+    for n in range(args.events):
+        event = {
+            "order_id": f"order-{n}", "restaurant_id": "r", "customer_id": customers[n % len(customers)],
+            "owner_id": sellers[n % len(sellers)], "status": "confirmed", "previous_status": "pending",
+        }
+        start = perf_counter()
+        await broker.publish(event)
+        timings.append(perf_counter() - start)
+        # Streams drain their queues between publishes, as connected clients would
+        if n % 1000 == 999:
+            for subscription in subscriptions:
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+
+    print(f"{len(subscriptions)} idle subscriptions: {per_subscription:.0f} bytes each")
+    print(f"publish: mean {statistics.mean(timings) * 1e6:.1f}us  "
+          f"p99 {percentile(timings, 99) * 1e6:.1f}us over {args.events} events")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=20000)
+    parser.add_argument("--sellers", type=int, default=500)
+    parser.add_argument("--events", type=int, default=10000)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,206 @@
+"""Mixed-traffic load test for the API.
+
+Seeds a scaled dataset (sellers, restaurants, menus, customers, order history) with
+datagen.py, then drives weighted browse / menu / checkout / seller-polling traffic
+from concurrent virtual users and reports req/s and p50/p95/p99 per endpoint.
+Results are compared against a stored baseline; --save-baseline records a new one.
+
+    python benchmarks/load_test.py --restaurants 2000 --orders 200000 --duration 30
+    DATABASE_URL=postgresql://... python benchmarks/load_test.py --reuse-data
+    python benchmarks/load_test.py --base-url http://localhost:8001 --reuse-data
+
+Without --base-url requests go to the app in-process (no network, no server).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import timedelta
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/load_test.db")
+
+import httpx
+from sqlalchemy import func, select
+
+import datagen
+from auth import create_access_token
+from database import engine
+from models import MenuItem, Order, Restaurant, User
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "load_test.json")
+EMAIL_DOMAIN = "loadtest.example.com"
+# Arguments that shape the workload; a baseline only compares like with like
+WORKLOAD_PARAMETERS = ("restaurants", "menu_items", "customers", "orders", "concurrency", "duration", "seed")
+
+# Share of virtual-user actions; checkout and seller polling carry the writes and joins
+TRAFFIC_MIX = {
+    "browse": 35,
+    "restaurant": 10,
+    "menu": 25,
+    "checkout": 10,
+    "order_history": 5,
+    "seller_poll": 15,
+}
+
+def seed(args):
+    __import__("main")  # creates the tables
+    datagen.generate(
+        engine, customers=args.customers, restaurants=args.restaurants, menu_items=args.menu_items,
+        orders=args.orders, seed=args.seed, email_domain=EMAIL_DOMAIN,
+    )
+
+def load_fixture():
+    """Ids and tokens the virtual users need, read back from the seeded database"""
+    with engine.connect() as conn:
+        restaurants = conn.execute(
+            select(Restaurant.id).join(User, Restaurant.owner_id == User.id)
+            .where(User.email.like(f"%@{EMAIL_DOMAIN}"), Restaurant.is_active.is_(True))
+        ).all()
+        if not restaurants:
+            sys.exit("no load-test data found; run without --reuse-data first")
+        menu = defaultdict(list)
+        for restaurant_id, item_id in conn.execute(
+            select(MenuItem.restaurant_id, MenuItem.id).where(MenuItem.restaurant_id.in_([r.id for r in restaurants]))
+        ):
+            menu[restaurant_id].append(item_id)
+        customers = conn.execute(select(User.email).where(User.email.like(f"customer%@{EMAIL_DOMAIN}"))).scalars().all()
+        sellers = conn.execute(select(User.email).where(User.email.like(f"seller%@{EMAIL_DOMAIN}"))).scalars().all()
+        order_count = conn.execute(select(func.count(Order.id))).scalar()
+
+    token = lambda email: {"Authorization": f"Bearer {create_access_token({'sub': email}, timedelta(days=1))}"}
+    return {
+        "restaurants": [r.id for r in restaurants],
+        "menu": menu,
+        "customers": [token(email) for email in customers],
+        "sellers": [token(email) for email in sellers],
+        "orders": order_count,
+    }
+
+async def virtual_user(client, fixture, rng, deadline, samples):
+    actions, weights = zip(*TRAFFIC_MIX.items())
+    while perf_counter() < deadline:
+        action = rng.choices(actions, weights)[0]
+        restaurant_id = rng.choice(fixture["restaurants"])
+        start = perf_counter()
+        if action == "browse":
+            response = await client.get("/restaurants", params={"limit": 20})
+            if response.status_code == 200 and response.headers.get("X-Next-Cursor") and rng.random() < 0.5:
+                response = await client.get(
+                    "/restaurants", params={"limit": 20, "cursor": response.headers["X-Next-Cursor"]}
+                )
+        elif action == "restaurant":
+            response = await client.get(f"/restaurants/{restaurant_id}")
+        elif action == "menu":
+            response = await client.get(f"/restaurants/{restaurant_id}/menu-items")
+        elif action == "checkout":
+            items = rng.sample(fixture["menu"][restaurant_id], min(2, len(fixture["menu"][restaurant_id])))
+            response = await client.post("/orders", headers=rng.choice(fixture["customers"]), json={
+                "restaurant_id": restaurant_id, "delivery_address": "1 Load Test Ave",
+                "items": [{"menu_item_id": item_id, "quantity": rng.randint(1, 3)} for item_id in items],
+            })
+        elif action == "order_history":
+            response = await client.get("/orders", params={"limit": 20}, headers=rng.choice(fixture["customers"]))
+        else:  # seller_poll
+            response = await client.get(
+                "/orders", params={"limit": 50, "status": "pending"}, headers=rng.choice(fixture["sellers"])
+            )
+        samples[action].append((perf_counter() - start, response.status_code < 400))
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def summarize(samples, elapsed):
+    report = {}
+    for action in TRAFFIC_MIX:
+        timings = sorted(latency for latency, _ in samples.get(action, []))
+        if not timings:
+            continue
+        report[action] = {
+            "requests": len(timings),
+            "errors": sum(1 for _, ok in samples[action] if not ok),
+            "rps": round(len(timings) / elapsed, 2),
+            "p50_ms": round(statistics.median(timings) * 1000, 2),
+            "p95_ms": round(percentile(timings, 95) * 1000, 2),
+            "p99_ms": round(percentile(timings, 99) * 1000, 2),
+        }
+    return report
+
+def print_report(report, baseline):
+    print(f"{'endpoint':>14} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}  vs baseline (p95, req/s)")
+    regressions = []
+    for action, row in report.items():
+        line = (f"{action:>14} {row['rps']:9.1f} {row['p50_ms']:9.2f} {row['p95_ms']:9.2f} "
+                f"{row['p99_ms']:9.2f} {row['errors']:7d}")
+        base = (baseline or {}).get("endpoints", {}).get(action)
+        if base:
+            p95_change = row["p95_ms"] / base["p95_ms"] - 1
+            rps_change = row["rps"] / base["rps"] - 1
+            line += f"  {p95_change:+7.1%} {rps_change:+7.1%}"
+            regressions.append((action, p95_change))
+        print(line)
+    return regressions
+
+async def run(args, fixture):
+    transport = {"base_url": args.base_url} if args.base_url else {"app": __import__("main").app, "base_url": "http://load"}
+    samples = defaultdict(list)
+    async with httpx.AsyncClient(timeout=None, **transport) as client:
+        # Warm-up: build lazy indexes and caches, open pool connections
+        await client.get("/restaurants")
+        deadline = perf_counter() + args.duration
+        started = perf_counter()
+        await asyncio.gather(*(
+            virtual_user(client, fixture, random.Random(args.seed + n), deadline, samples)
+            for n in range(args.concurrency)
+        ))
+        return summarize(samples, perf_counter() - started)
+
+def main(args):
+    if not args.reuse_data:
+        seed(args)
+    fixture = load_fixture()
+    print(f"{len(fixture['restaurants'])} restaurants, {fixture['orders']} orders, "
+          f"{args.concurrency} virtual users for {args.duration:.0f}s on {engine.url.get_backend_name()}")
+    report = asyncio.run(run(args, fixture))
+
+    workload = {name: getattr(args, name) for name in WORKLOAD_PARAMETERS}
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("parameters") != workload:
+            print(f"warning: baseline was recorded with {baseline.get('parameters')}")
+    regressions = print_report(report, baseline)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"parameters": workload, "endpoints": report}, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+    elif args.max_regression is not None:
+        failed = [action for action, change in regressions if change > args.max_regression]
+        if failed:
+            sys.exit(f"p95 regressed more than {args.max_regression:.0%} on: {', '.join(failed)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--menu-items", type=int, default=12, help="average per restaurant")
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--base-url", help="target a running server instead of the in-process app")
+    parser.add_argument("--reuse-data", action="store_true", help="skip seeding; use load-test rows already in DATABASE_URL")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--max-regression", type=float, help="exit non-zero when any p95 regresses by more than this fraction")
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+"""Login storm benchmark.
+
+Drives concurrent POST /token requests against the app in-process while a probe
+repeatedly fetches an unrelated endpoint (GET /restaurants), then reports login
+throughput and probe latency. Runs once with bcrypt inline on the event loop
+(the old behaviour) and once on the dedicated hashing pool.
+
+    python benchmarks/login_storm.py --concurrency 32 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/login_storm.db")
+
+import httpx
+
+import auth
+import main
+
+EMAIL = "storm@example.com"
+PASSWORD = "storm-password"
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def run_storm(client, concurrency, duration):
+    deadline = perf_counter() + duration
+    logins = 0
+    shed = 0
+    probe_latencies = []
+
+    async def login_worker():
+        nonlocal logins, shed
+        while perf_counter() < deadline:
+            response = await client.post("/token", data={"username": EMAIL, "password": PASSWORD})
+            if response.status_code == 200:
+                logins += 1
+            elif response.status_code == 503:
+                shed += 1
+                await asyncio.sleep(0.01)
+
+    async def probe():
+        while perf_counter() < deadline:
+            start = perf_counter()
+            await client.get("/restaurants")
+            probe_latencies.append(perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    started = perf_counter()
+    await asyncio.gather(probe(), *(login_worker() for _ in range(concurrency)))
+    elapsed = perf_counter() - started
+    return logins / elapsed, shed, probe_latencies
+
+async def main_async(args):
+    async with httpx.AsyncClient(app=main.app, base_url="http://bench", timeout=None) as client:
+        await client.post("/register", json={
+            "email": EMAIL, "password": PASSWORD, "first_name": "Storm", "last_name": "Bench",
+        })
+        await client.get("/restaurants")
+
+        pool = auth._hash_executor
+        for mode, executor in (("inline", None), ("pool", pool)):
+            if mode == "pool" and executor is None:
+                continue
+            auth._hash_executor = executor
+            throughput, shed, probes = await run_storm(client, args.concurrency, args.duration)
+            print(
+                f"{mode:>6}: {throughput:8.1f} logins/s  shed={shed:<5d} "
+                f"probe p50={statistics.median(probes) * 1000:7.2f}ms "
+                f"p99={percentile(probes, 99) * 1000:7.2f}ms  max={max(probes) * 1000:7.2f}ms "
+                f"(n={len(probes)})"
+            )
+        auth._hash_executor = pool
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    print(f"bcrypt rounds={auth.BCRYPT_ROUNDS} hash workers={auth.PASSWORD_HASH_WORKERS}")
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,62 @@
+"""Nearby-search benchmark for the in-process grid index.
+
+Indexes N synthetic restaurants scattered over a metro area and times radius and
+k-nearest queries from random points, checking results against a brute-force scan.
+
+    python benchmarks/nearby_search.py --restaurants 50000 --queries 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from geo_index import GridIndex, haversine_km
+
+# Roughly the Los Angeles basin
+LAT_RANGE = (33.70, 34.30)
+LNG_RANGE = (-118.60, -117.90)
+
+def main(args):
+    rng = random.Random(args.seed)
+    points = {
+        f"r{i}": (rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE), rng.random() < 0.7)
+        for i in range(args.restaurants)
+    }
+    index = GridIndex()
+    start = perf_counter()
+    for restaurant_id, (lat, lng, is_open) in points.items():
+        index.upsert(restaurant_id, lat, lng, is_open)
+    print(f"indexed {len(index)} restaurants in {(perf_counter() - start) * 1000:.1f}ms")
+
+    for label, radius_km, limit in (("radius 5km, 20 nearest", 5.0, 20), ("k-NN k=10 within 50km", 50.0, 10)):
+        timings = []
+        for _ in range(args.queries):
+            lat, lng = rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)
+            start = perf_counter()
+            hits = index.nearby(lat, lng, radius_km, limit)
+            timings.append(perf_counter() - start)
+        timings.sort()
+        print(
+            f"{label:>24}: p50={statistics.median(timings) * 1e6:7.1f}us "
+            f"p99={timings[int(len(timings) * 0.99)] * 1e6:7.1f}us"
+        )
+
+        # Spot-check the last query against a full scan
+        expected = sorted(
+            (haversine_km(lat, lng, p_lat, p_lng), restaurant_id)
+            for restaurant_id, (p_lat, p_lng, is_open) in points.items()
+            if is_open and haversine_km(lat, lng, p_lat, p_lng) <= radius_km
+        )[:limit]
+        assert hits == expected, "grid index disagrees with brute force"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--restaurants", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,109 @@
+"""Restaurant rating maintenance benchmark: full re-aggregation vs running totals.
+
+Loads one restaurant with a growing number of reviews into SQLite and times
+review inserts two ways: with a trigger equivalent to the old
+update_restaurant_rating (AVG / COUNT over all of the restaurant's reviews per
+write) and through crud.create_review, which moves the running totals by the
+review's delta. Also times reviews.reconcile and checks it finds no drift.
+
+    python benchmarks/review_ratings.py --reviews 1000 10000 100000 --writes 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import uuid
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import Restaurant, RestaurantReview, User
+from schemas import ReviewCreate
+import crud
+import reviews
+
+# The rating trigger database_schema.sql used to install, in SQLite syntax
+FULL_SCAN_TRIGGER = """
+CREATE TRIGGER full_scan_rating AFTER INSERT ON restaurant_reviews
+BEGIN
+    UPDATE restaurants SET
+        average_rating = (SELECT COALESCE(AVG(rating), 0) FROM restaurant_reviews WHERE restaurant_id = NEW.restaurant_id),
+        total_reviews = (SELECT COUNT(*) FROM restaurant_reviews WHERE restaurant_id = NEW.restaurant_id)
+    WHERE id = NEW.restaurant_id;
+END
+"""
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def report(label, timings):
+    print(f"  {label:>14}: mean {statistics.mean(timings) * 1000:7.3f}ms  p99 {percentile(timings, 99) * 1000:7.3f}ms")
+
+def main(args):
+    rng = random.Random(args.seed)
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    owner = User(email="owner@example.com", password_hash="x", first_name="Own", last_name="Er", role="seller")
+    db.add(owner)
+    db.flush()
+    restaurant = Restaurant(owner_id=owner.id, name="Popular", cuisine_type="italian", street_address="1 Main St",
+                            city="Town", state="CA", postal_code="90000")
+    db.add(restaurant)
+    db.commit()
+    restaurant_id = restaurant.id
+
+    loaded = 0
+    for target in sorted(args.reviews):
+        # Customers are only foreign keys here; SQLite does not enforce them by default
+        rows = [
+            {"id": str(uuid.uuid4()), "restaurant_id": restaurant_id, "customer_id": str(uuid.uuid4()),
+             "rating": rng.randint(1, 5)}
+            for _ in range(target - loaded)
+        ]
+        for offset in range(0, len(rows), 10000):
+            db.execute(insert(RestaurantReview), rows[offset:offset + 10000])
+        db.commit()
+        loaded = target
+        start = perf_counter()
+        reviews.reconcile(db)
+        print(f"{loaded} reviews (reconcile {(perf_counter() - start) * 1000:.1f}ms)")
+
+        db.execute(text(FULL_SCAN_TRIGGER))
+        timings = []
+        for _ in range(args.writes):
+            start = perf_counter()
+            db.add(RestaurantReview(restaurant_id=restaurant_id, customer_id=str(uuid.uuid4()), rating=rng.randint(1, 5)))
+            db.commit()
+            timings.append(perf_counter() - start)
+        report("full re-scan", timings)
+        db.execute(text("DROP TRIGGER full_scan_rating"))
+        reviews.reconcile(db)  # the trigger did not keep rating_sum
+
+        timings = []
+        for _ in range(args.writes):
+            start = perf_counter()
+            crud.create_review(db, ReviewCreate(rating=rng.randint(1, 5)), restaurant_id, str(uuid.uuid4()))
+            timings.append(perf_counter() - start)
+        report("running totals", timings)
+        loaded += 2 * args.writes
+
+        drifted = reviews.reconcile(db)
+        if drifted:
+            raise SystemExit(f"running totals drifted on {drifted} restaurant(s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,69 @@
+"""Catalog search benchmark for the in-process inverted index.
+
+Indexes N synthetic menu items built from a dish vocabulary and times ranked
+queries, with and without dietary filters.
+
+    python benchmarks/search.py --menu-items 200000 --queries 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from search_index import InvertedIndex, menu_item_filter
+
+ADJECTIVES = "spicy crispy creamy smoky sweet sour garlic ginger lemon herb roasted grilled braised fried steamed".split()
+BASES = "noodles rice dumplings curry tacos pizza pasta salad soup burger ramen pho bowl wrap sandwich".split()
+PROTEINS = "chicken beef pork tofu shrimp salmon lamb mushroom paneer egg tempeh duck".split()
+EXTRAS = "sesame chili basil coconut peanut miso truffle cheese avocado kimchi scallion cilantro".split()
+
+def dish(rng):
+    name = f"{rng.choice(ADJECTIVES)} {rng.choice(PROTEINS)} {rng.choice(BASES)}"
+    description = " ".join(rng.sample(EXTRAS, 3) + rng.sample(ADJECTIVES, 2))
+    return name, description
+
+def main(args):
+    rng = random.Random(args.seed)
+    index = InvertedIndex()
+    start = perf_counter()
+    for i in range(args.menu_items):
+        name, description = dish(rng)
+        vegan = rng.random() < 0.15
+        index.upsert(f"m{i}", name, description, {
+            "restaurant_id": f"r{i % 5000}", "is_available": rng.random() < 0.95,
+            "is_vegetarian": vegan or rng.random() < 0.2, "is_vegan": vegan,
+            "is_gluten_free": rng.random() < 0.1, "spice_level": rng.randint(0, 5),
+        })
+    index.reweight()
+    print(f"indexed {len(index)} menu items in {perf_counter() - start:.2f}s")
+
+    cases = (
+        ("two terms", lambda: f"{rng.choice(ADJECTIVES)} {rng.choice(BASES)}", None),
+        ("three terms", lambda: f"{rng.choice(ADJECTIVES)} {rng.choice(PROTEINS)} {rng.choice(BASES)}", None),
+        ("three terms, vegan", lambda: f"{rng.choice(ADJECTIVES)} {rng.choice(PROTEINS)} {rng.choice(BASES)}",
+         menu_item_filter(vegan=True)),
+    )
+    for label, make_query, accept in cases:
+        timings = []
+        for _ in range(args.queries):
+            query = make_query()
+            start = perf_counter()
+            index.search(query, 20, accept=accept)
+            timings.append(perf_counter() - start)
+        timings.sort()
+        print(
+            f"{label:>20}: p50={statistics.median(timings) * 1000:6.2f}ms "
+            f"p99={timings[int(len(timings) * 0.99)] * 1000:6.2f}ms"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--menu-items", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,199 @@
+from collections import OrderedDict
+from contextlib import suppress
+from time import monotonic
+from typing import Dict, Optional
+import asyncio
+import json
+import logging
+import os
+from dotenv import load_dotenv
+from prometheus_client import Counter
+from sqlalchemy.exc import IntegrityError
+
+from crud import get_cart_lines, replace_carts
+from database import db_session, run_db
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Carts are served from a hot store and written behind to cart_items in batches;
+# the table is only read when a cart is not in the hot store.
+# When set, the hot store is Redis and carts follow their user across workers.
+# Without it carts live in process memory, which is only consistent with one worker.
+CART_REDIS_URL = os.getenv("CART_REDIS_URL")
+# Idle carts leave the hot store after this long; they stay in cart_items
+CART_TTL_SECONDS = int(os.getenv("CART_TTL_SECONDS", "86400"))
+CART_MAX_ENTRIES = int(os.getenv("CART_MAX_ENTRIES", "100000"))
+# Changed carts are persisted this often; a crash loses at most this much cart activity
+CART_FLUSH_SECONDS = float(os.getenv("CART_FLUSH_SECONDS", "5"))
+# Carts written per flush transaction
+CART_FLUSH_BATCH_SIZE = int(os.getenv("CART_FLUSH_BATCH_SIZE", "500"))
+CART_MAX_LINES = 50
+CART_MAX_QUANTITY = 99
+
+CART_LOOKUPS = Counter("cart_lookups_total", "Cart reads by where they were served from", ["source"])
+CARTS_FLUSHED = Counter("carts_flushed_total", "Carts written behind to cart_items")
+
+# A cart is plain JSON-able data:
+#   {"restaurant_id": str | None,
+#    "items": [{"menu_item_id", "name", "unit_price", "quantity", "special_instructions"}]}
+# name and unit_price are cached when the line is added and revalidated at checkout.
+def empty_cart() -> Dict:
+    return {"restaurant_id": None, "items": []}
+
+class LocalCartStore:
+    """In-process LRU with an idle TTL; carts are kept as JSON so callers never share one dict"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def get(self, user_id: str) -> Optional[Dict]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, raw = entry
+        if expires_at < monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return json.loads(raw)
+
+    async def set(self, user_id: str, cart: Dict):
+        self._entries[user_id] = (monotonic() + self.ttl, json.dumps(cart))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def close(self):
+        pass
+
+class RedisCartStore:
+    """One JSON string per cart with an idle TTL"""
+
+    def __init__(self, url: str, ttl: float):
+        import redis.asyncio as redis
+
+        self.ttl = max(int(ttl), 1)
+        self._redis = redis.Redis.from_url(url)
+
+    async def get(self, user_id: str) -> Optional[Dict]:
+        try:
+            raw = await self._redis.get(f"cart:{user_id}")
+        except Exception:
+            logger.warning("Cart store read failed for %s", user_id, exc_info=True)
+            return None
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, user_id: str, cart: Dict):
+        try:
+            await self._redis.set(f"cart:{user_id}", json.dumps(cart), ex=self.ttl)
+        except Exception:
+            # Still queued for write-behind, so the change is not lost
+            logger.warning("Cart store write failed for %s", user_id, exc_info=True)
+
+    async def close(self):
+        await self._redis.close()
+
+if CART_REDIS_URL:
+    _store = RedisCartStore(CART_REDIS_URL, CART_TTL_SECONDS)
+else:
+    _store = LocalCartStore(CART_TTL_SECONDS, CART_MAX_ENTRIES)
+
+# user_id -> latest cart not yet written to cart_items (also covers hot-store evictions)
+_pending: Dict[str, Dict] = {}
+_flusher: Optional[asyncio.Task] = None
+# Set on shutdown; the flusher is woken instead of cancelled so a flush in the
+# threadpool never has its session closed under it
+_stopping = asyncio.Event()
+
+async def load(db, user_id: str) -> Dict:
+    """The user's cart: hot store, then unflushed changes, then cart_items"""
+    cart = await _store.get(user_id)
+    if cart is not None:
+        CART_LOOKUPS.labels("hot").inc()
+        return cart
+    cart = _pending.get(user_id)
+    if cart is None:
+        CART_LOOKUPS.labels("database").inc()
+        cart = empty_cart()
+        for row in await run_db(db, get_cart_lines, user_id=user_id):
+            cart["restaurant_id"] = row.restaurant_id
+            cart["items"].append({
+                "menu_item_id": row.menu_item_id, "name": row.name, "unit_price": row.price,
+                "quantity": row.quantity, "special_instructions": row.special_instructions,
+            })
+    else:
+        CART_LOOKUPS.labels("pending").inc()
+        cart = json.loads(json.dumps(cart))  # the queued copy must not change under the flusher
+    await _store.set(user_id, cart)
+    return cart
+
+async def save(user_id: str, cart: Dict):
+    """Store a changed cart and queue it for write-behind"""
+    if not cart["items"]:
+        cart["restaurant_id"] = None
+    await _store.set(user_id, cart)
+    _pending[user_id] = cart
+
+async def flush():
+    """Write queued carts to cart_items, CART_FLUSH_BATCH_SIZE carts per transaction"""
+    # Carts queued while this runs wait for the next flush
+    queued = list(_pending.items())
+    for start in range(0, len(queued), CART_FLUSH_BATCH_SIZE):
+        if not await _write(dict(queued[start:start + CART_FLUSH_BATCH_SIZE])):
+            return
+
+async def _write(batch: Dict[str, Dict]) -> bool:
+    """Persist one batch; False when the database is failing and the flush should stop"""
+    # Persist the hot store's copy when there is one: with Redis another worker may
+    # have saved a newer cart, and the database should converge on the newest
+    latest = {}
+    for user_id, cart in batch.items():
+        stored = await _store.get(user_id)
+        latest[user_id] = cart if stored is None else stored
+    try:
+        async with db_session() as db:
+            await run_db(db, replace_carts, carts=latest)
+    except IntegrityError:
+        # A cart the database rejects must not hold back the rest of its batch:
+        # split until it is isolated, and leave only it queued
+        if len(batch) == 1:
+            logger.error("Cart write-behind rejected for user %s; retrying next flush", *batch, exc_info=True)
+            return True
+        users = list(batch)
+        half = len(users) // 2
+        return (await _write({user_id: batch[user_id] for user_id in users[:half]})
+                and await _write({user_id: batch[user_id] for user_id in users[half:]}))
+    except Exception:
+        logger.error("Cart write-behind failed for %d carts; retrying next flush", len(batch), exc_info=True)
+        return False
+    CARTS_FLUSHED.inc(len(batch))
+    # Carts leave the queue only once written; one saved again meanwhile stays queued
+    for user_id, cart in batch.items():
+        if _pending.get(user_id) is cart:
+            del _pending[user_id]
+    return True
+
+async def _flush_periodically():
+    while not _stopping.is_set():
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_stopping.wait(), CART_FLUSH_SECONDS)
+        await flush()
+
+def start():
+    global _flusher
+    if _flusher is None or _flusher.done():
+        _stopping.clear()
+        _flusher = asyncio.get_running_loop().create_task(_flush_periodically())
+
+async def stop():
+    """Stop the periodic flush once whatever is still queued has been persisted"""
+    _stopping.set()
+    if _flusher is not None and not _flusher.done():
+        await _flusher
+    else:
+        await flush()
+    await _store.close()
@@ -0,0 +1,216 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from dotenv import load_dotenv
+from prometheus_client import Counter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Catalog cache settings; a TTL of 0 disables caching
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "60"))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "10000"))
+# When set, entries live in Redis (7.0 or later) and are shared (and invalidated) across workers
+CATALOG_CACHE_REDIS_URL = os.getenv("CATALOG_CACHE_REDIS_URL")
+
+CACHE_REQUESTS = Counter(
+    "catalog_cache_requests_total",
+    "Catalog cache lookups by entry kind and result",
+    ["kind", "result"],
+)
+COALESCED_LOADS = Counter(
+    "catalog_cache_coalesced_loads_total",
+    "Cache misses served by another request's in-flight load instead of their own query",
+    ["kind"],
+)
+
+# Namespaces group the entries one write invalidates together:
+#   restaurant:{id}  -> a single RestaurantResponse
+#   restaurants      -> every GET /restaurants page (any filter/cursor)
+#   menu:{id}        -> every GET /restaurants/{id}/menu-items variant (any category)
+def restaurant_namespace(restaurant_id: str) -> str:
+    return f"restaurant:{restaurant_id}"
+
+RESTAURANT_LIST_NAMESPACE = "restaurants"
+
+def menu_namespace(restaurant_id: str) -> str:
+    return f"menu:{restaurant_id}"
+
+def _kind(namespace: str) -> str:
+    return namespace.split(":", 1)[0]
+
+class LocalCatalogCache:
+    """In-process LRU with TTL; invalidating a namespace bumps its generation"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    async def get(self, namespace: str, field: str, adapter) -> Optional[Any]:
+        key = (namespace, field)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, generation, value = entry
+            if expires_at < monotonic() or generation != self._generations.get(namespace, 0):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, namespace: str, field: str, value: Any, adapter):
+        key = (namespace, field)
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, self._generations.get(namespace, 0), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def invalidate(self, *namespaces: str):
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+class RedisCatalogCache:
+    """One Redis hash per namespace, so invalidation is a single DEL"""
+
+    def __init__(self, url: str, ttl: float):
+        import redis.asyncio as redis
+
+        self.ttl = max(int(ttl), 1)
+        self._redis = redis.Redis.from_url(url)
+
+    async def get(self, namespace: str, field: str, adapter) -> Optional[Any]:
+        try:
+            raw = await self._redis.hget(namespace, field)
+        except Exception:
+            logger.warning("Catalog cache read failed for %s", namespace, exc_info=True)
+            return None
+        return None if raw is None else adapter.validate_json(raw)
+
+    async def set(self, namespace: str, field: str, value: Any, adapter):
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.hset(namespace, field, adapter.dump_json(value))
+                # TTL counts from the namespace's first fill, not from every write (EXPIRE NX: Redis >= 7)
+                pipe.expire(namespace, self.ttl, nx=True)
+                await pipe.execute()
+        except Exception:
+            logger.warning("Catalog cache write failed for %s", namespace, exc_info=True)
+
+    async def invalidate(self, *namespaces: str):
+        try:
+            await self._redis.delete(*namespaces)
+        except Exception:
+            logger.error("Catalog cache invalidation failed for %s", namespaces, exc_info=True)
+
+if CATALOG_CACHE_REDIS_URL:
+    _backend = RedisCatalogCache(CATALOG_CACHE_REDIS_URL, CATALOG_CACHE_TTL)
+else:
+    _backend = LocalCatalogCache(CATALOG_CACHE_TTL, CATALOG_CACHE_MAX_ENTRIES)
+
+async def lookup(namespace: str, field: str, adapter) -> Optional[Any]:
+    """Cached value, or None on a miss; adapter is the pydantic TypeAdapter of the value"""
+    if CATALOG_CACHE_TTL <= 0:
+        return None
+    value = await _backend.get(namespace, field, adapter)
+    CACHE_REQUESTS.labels(_kind(namespace), "miss" if value is None else "hit").inc()
+    return value
+
+async def store(namespace: str, field: str, value: Any, adapter):
+    if CATALOG_CACHE_TTL > 0:
+        await _backend.set(namespace, field, value, adapter)
+    return value
+
+# Pre-encoded responses: (etag, JSON bytes) entries served as is, so a hit skips
+# validation and serialization, and a matching If-None-Match skips the body too
+class EncodedResponseAdapter:
+    """Stands in for a TypeAdapter: the Redis backend stores "etag\nbody" bytes as is"""
+
+    @staticmethod
+    def dump_json(value: Tuple[str, bytes]) -> bytes:
+        etag, body = value
+        return etag.encode() + b"\n" + body
+
+    @staticmethod
+    def validate_json(raw: bytes) -> Tuple[str, bytes]:
+        etag, body = raw.split(b"\n", 1)
+        return etag.decode(), body
+
+encoded_response_adapter = EncodedResponseAdapter()
+
+def encode_response(body: bytes) -> Tuple[str, bytes]:
+    """A response body with its strong ETag (a content hash, so it survives rebuilds of unchanged data)"""
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"', body
+
+def not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison, as RFC 9110 asks for GET)"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+# Single-flight: concurrent misses of one entry on this worker share one load.
+# (namespace, field) -> future of the loaded value
+_flights: Dict[Tuple[str, str], asyncio.Future] = {}
+_RETRY = object()  # the leading request was cancelled; a waiter loads for itself
+
+async def get_or_load(namespace: str, field: str, adapter, load: Callable[[], Awaitable[Any]]) -> Optional[Any]:
+    """Cached value, else load()'s, running load() once for every concurrent miss of the entry.
+
+    load() returns the value to cache, or None for "not found", which is shared
+    with the waiting requests but not cached. Its exceptions are shared too.
+    """
+    value = await lookup(namespace, field, adapter)
+    if value is not None:
+        return value
+    
+    key = (namespace, field)
+    while key in _flights:
+        COALESCED_LOADS.labels(_kind(namespace)).inc()
+        value = await asyncio.shield(_flights[key])
+        if value is not _RETRY:
+            return value
+    
+    flight = asyncio.get_running_loop().create_future()
+    _flights[key] = flight
+    try:
+        value = await load()
+        # An invalidation during the load detaches the flight: its result may predate the write
+        if value is not None and _flights.get(key) is flight:
+            await store(namespace, field, value, adapter)
+        flight.set_result(value)
+        return value
+    except Exception as e:
+        flight.set_exception(e)
+        flight.exception()  # retrieved: there may be no waiters
+        raise
+    finally:
+        if not flight.done():
+            flight.set_result(_RETRY)
+        if _flights.get(key) is flight:
+            del _flights[key]
+
+async def invalidate(*namespaces: str):
+    # Later misses must not join a load that may have read the data before this write
+    for key in [key for key in _flights if key[0] in namespaces]:
+        del _flights[key]
+    await _backend.invalidate(*namespaces)
+
+async def invalidate_restaurant(restaurant_id: str):
+    """A restaurant row changed: drop it and every restaurant list page"""
+    await invalidate(restaurant_namespace(restaurant_id), RESTAURANT_LIST_NAMESPACE)
+
+async def invalidate_menu(restaurant_id: str):
+    """A menu item changed: drop every cached view of that restaurant's menu"""
+    await invalidate(menu_namespace(restaurant_id))
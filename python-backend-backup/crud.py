@@ -1,18 +1,26 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_, case, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+import re
+import uuid
 
-from models import User, Restaurant, MenuItem, Order, OrderItem
-from schemas import UserCreate, RestaurantCreate, RestaurantUpdate, MenuItemCreate, MenuItemUpdate, OrderCreate, OrderUpdate, OrderItemCreate
+from models import User, Restaurant, MenuItem, Order, OrderItem, CartItem, RestaurantReview
+from schemas import UserCreate, UserUpdate, RestaurantCreate, RestaurantUpdate, MenuItemCreate, MenuItemUpdate, MenuItemImport, OrderCreate, OrderUpdate, OrderItemCreate, CartCheckout, ReviewCreate, ReviewUpdate
 from auth import get_password_hash
+from pagination import apply_keyset
+import analytics
+import order_counters
+import reviews
 
 # User CRUD operations
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: UserCreate, hashed_password: Optional[str] = None):
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = User(
         email=user.email,
         password_hash=hashed_password,
@@ -26,18 +34,32 @@ def create_user(db: Session, user: UserCreate):
     db.refresh(db_user)
     return db_user
 
+def get_user(db: Session, user_id: str):
+    return db.query(User).filter(User.id == user_id).first()
+
+def update_user(db: Session, user_id: str, user_update: UserUpdate):
+    db_user = db.query(User).filter(User.id == user_id).first()
+    if db_user:
+        update_data = user_update.model_dump(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(db_user, field, value)
+        db.commit()
+        db.refresh(db_user)
+    return db_user
+
 # Restaurant CRUD operations
 def create_restaurant(db: Session, restaurant: RestaurantCreate, owner_id: str):
     db_restaurant = Restaurant(
         owner_id=owner_id,
-        **restaurant.dict()
+        **restaurant.model_dump()
     )
     db.add(db_restaurant)
     db.commit()
     db.refresh(db_restaurant)
     return db_restaurant
 
-def get_restaurants(db: Session, skip: int = 0, limit: int = 100, cuisine_type: Optional[str] = None, owner_id: Optional[str] = None):
+def get_restaurants(db: Session, skip: int = 0, limit: int = 100, cuisine_type: Optional[str] = None, owner_id: Optional[str] = None,
+                    cursor: Optional[str] = None):
     query = db.query(Restaurant)
     
     if cuisine_type:
@@ -46,15 +68,80 @@ def get_restaurants(db: Session, skip: int = 0, limit: int = 100, cuisine_type:
     if owner_id:
         query = query.filter(Restaurant.owner_id == owner_id)
     
-    return query.filter(Restaurant.is_active == True).offset(skip).limit(limit).all()
+    query = apply_keyset(query.filter(Restaurant.is_active == True), Restaurant, cursor)
+    if not cursor:
+        query = query.offset(skip)
+    
+    return query.limit(limit).all()
 
 def get_restaurant(db: Session, restaurant_id: str):
     return db.query(Restaurant).filter(Restaurant.id == restaurant_id).first()
 
+def get_restaurants_by_ids(db: Session, restaurant_ids: List[str]):
+    if not restaurant_ids:
+        return []
+    return db.query(Restaurant).filter(Restaurant.id.in_(restaurant_ids)).all()
+
+def get_restaurant_locations(db: Session):
+    # Slim (id, latitude, longitude, is_open) rows for building the geo index
+    return (
+        db.query(Restaurant.id, Restaurant.latitude, Restaurant.longitude, Restaurant.is_open)
+        .filter(Restaurant.is_active == True, Restaurant.latitude.isnot(None), Restaurant.longitude.isnot(None))
+        .all()
+    )
+
+def _restaurant_geography(lat, lng):
+    return func.geography(func.ST_SetSRID(func.ST_MakePoint(lng, lat), 4326))
+
+def get_nearby_restaurants_postgis(db: Session, latitude: float, longitude: float, radius_km: float,
+                                   limit: int = 20, open_only: bool = True):
+    # Must match the idx_restaurants_geography expression index in database_schema.sql
+    location = _restaurant_geography(Restaurant.latitude, Restaurant.longitude)
+    origin = _restaurant_geography(latitude, longitude)
+    query = db.query(Restaurant, (func.ST_Distance(location, origin) / 1000.0).label("distance_km")).filter(
+        Restaurant.is_active == True,
+        func.ST_DWithin(location, origin, radius_km * 1000.0),
+    )
+    if open_only:
+        query = query.filter(Restaurant.is_open == True)
+    return query.order_by(location.op("<->")(origin)).limit(limit).all()
+
+def get_restaurant_search_documents(db: Session):
+    return (
+        db.query(Restaurant.id, Restaurant.name, Restaurant.description, Restaurant.cuisine_type)
+        .filter(Restaurant.is_active == True)
+        .all()
+    )
+
+def _search_document(name_column, description_column):
+    # Must match the GIN expression indexes in database_schema.sql
+    return func.setweight(func.to_tsvector("english", func.coalesce(name_column, "")), "A").op("||")(
+        func.setweight(func.to_tsvector("english", func.coalesce(description_column, "")), "B")
+    )
+
+def _search_query(text: str):
+    # Any-term match; ranking rewards documents matching more of the terms
+    terms = re.findall(r"[a-z0-9]+", text.lower())
+    return func.to_tsquery("english", " | ".join(terms)) if terms else None
+
+def search_restaurants_postgres(db: Session, text: str, limit: int = 20):
+    tsquery = _search_query(text)
+    if tsquery is None:
+        return []
+    document = _search_document(Restaurant.name, Restaurant.description)
+    rank = func.ts_rank(document, tsquery)
+    return (
+        db.query(Restaurant, rank.label("score"))
+        .filter(Restaurant.is_active == True, document.op("@@")(tsquery))
+        .order_by(rank.desc())
+        .limit(limit)
+        .all()
+    )
+
 def update_restaurant(db: Session, restaurant_id: str, restaurant_update: RestaurantUpdate):
     db_restaurant = db.query(Restaurant).filter(Restaurant.id == restaurant_id).first()
     if db_restaurant:
-        update_data = restaurant_update.dict(exclude_unset=True)
+        update_data = restaurant_update.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_restaurant, field, value)
         db.commit()
@@ -72,7 +159,7 @@ def delete_restaurant(db: Session, restaurant_id: str):
 def create_menu_item(db: Session, menu_item: MenuItemCreate, restaurant_id: str):
     db_menu_item = MenuItem(
         restaurant_id=restaurant_id,
-        **menu_item.dict()
+        **menu_item.model_dump()
     )
     db.add(db_menu_item)
     db.commit()
@@ -87,13 +174,55 @@ def get_menu_items(db: Session, restaurant_id: str, category: Optional[str] = No
     
     return query.filter(MenuItem.is_available == True).order_by(MenuItem.sort_order, MenuItem.name).all()
 
+def get_menu_items_by_ids(db: Session, item_ids: List[str], active_restaurants_only: bool = False):
+    if not item_ids:
+        return []
+    query = db.query(MenuItem).filter(MenuItem.id.in_(item_ids))
+    if active_restaurants_only:
+        query = query.join(Restaurant, Restaurant.id == MenuItem.restaurant_id).filter(Restaurant.is_active == True)
+    return query.all()
+
+def get_menu_item_search_documents(db: Session):
+    # Items of inactive restaurants are not searchable
+    return db.query(
+        MenuItem.id, MenuItem.restaurant_id, MenuItem.name, MenuItem.description, MenuItem.is_available,
+        MenuItem.is_vegetarian, MenuItem.is_vegan, MenuItem.is_gluten_free, MenuItem.spice_level
+    ).join(Restaurant, Restaurant.id == MenuItem.restaurant_id).filter(Restaurant.is_active == True).all()
+
+def search_menu_items_postgres(db: Session, text: str, limit: int = 20, vegetarian: Optional[bool] = None,
+                               vegan: Optional[bool] = None, gluten_free: Optional[bool] = None,
+                               max_spice_level: Optional[int] = None, min_spice_level: Optional[int] = None):
+    tsquery = _search_query(text)
+    if tsquery is None:
+        return []
+    document = _search_document(MenuItem.name, MenuItem.description)
+    rank = func.ts_rank(document, tsquery)
+    query = (
+        db.query(MenuItem, rank.label("score"))
+        .join(Restaurant, Restaurant.id == MenuItem.restaurant_id)
+        .filter(MenuItem.is_available == True, Restaurant.is_active == True, document.op("@@")(tsquery))
+    )
+    
+    if vegetarian is not None:
+        query = query.filter(MenuItem.is_vegetarian == vegetarian)
+    if vegan is not None:
+        query = query.filter(MenuItem.is_vegan == vegan)
+    if gluten_free is not None:
+        query = query.filter(MenuItem.is_gluten_free == gluten_free)
+    if max_spice_level is not None:
+        query = query.filter(MenuItem.spice_level <= max_spice_level)
+    if min_spice_level is not None:
+        query = query.filter(MenuItem.spice_level >= min_spice_level)
+    
+    return query.order_by(rank.desc()).limit(limit).all()
+
 def get_menu_item(db: Session, item_id: str):
     return db.query(MenuItem).filter(MenuItem.id == item_id).first()
 
 def update_menu_item(db: Session, item_id: str, menu_item_update: MenuItemUpdate):
     db_menu_item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
     if db_menu_item:
-        update_data = menu_item_update.dict(exclude_unset=True)
+        update_data = menu_item_update.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_menu_item, field, value)
         db.commit()
@@ -107,39 +236,278 @@ def delete_menu_item(db: Session, item_id: str):
         db.commit()
     return db_menu_item
 
+def import_menu_items(db: Session, restaurant_id: str, items: List[MenuItemImport], prune: bool = False,
+                      batch_size: int = 500):
+    """Upsert a validated menu in one transaction with batched executemany writes.
+
+    Rows update the restaurant's item with their id, else the one with the same
+    (category, name), else insert. prune marks items the import leaves out as
+    unavailable (not deleted: past orders reference them). Returns the written
+    rows and the pruned ids.
+    """
+    existing = db.execute(
+        select(MenuItem.id, MenuItem.category, MenuItem.name).where(MenuItem.restaurant_id == restaurant_id)
+    ).all()
+    existing_ids = {row.id for row in existing}
+    by_key = {(row.category, row.name): row.id for row in existing}
+    
+    inserts, updates = [], []
+    for position, item in enumerate(items):
+        values = item.model_dump(exclude={"id"})
+        if values["sort_order"] is None:
+            values["sort_order"] = position
+        # Ids from another restaurant's export are not ours to overwrite
+        item_id = item.id if item.id in existing_ids else by_key.get((item.category, item.name))
+        if item_id:
+            updates.append({"id": item_id, "restaurant_id": restaurant_id, **values})
+        else:
+            inserts.append({"id": str(uuid.uuid4()), "restaurant_id": restaurant_id, **values})
+    
+    for start in range(0, len(inserts), batch_size):
+        db.execute(insert(MenuItem), inserts[start:start + batch_size])
+    # ORM bulk UPDATE by primary key: one executemany per batch
+    for start in range(0, len(updates), batch_size):
+        db.execute(update(MenuItem), updates[start:start + batch_size])
+    
+    pruned_ids = []
+    if prune:
+        kept = {row["id"] for row in updates}
+        pruned_ids = [item_id for item_id in existing_ids if item_id not in kept]
+        for start in range(0, len(pruned_ids), batch_size):
+            db.execute(
+                update(MenuItem)
+                .where(MenuItem.id.in_(pruned_ids[start:start + batch_size]), MenuItem.is_available == True)
+                .values(is_available=False)
+                .execution_options(synchronize_session=False)
+            )
+    
+    db.commit()
+    return inserts, updates, pruned_ids
+
+def get_menu_export_rows(db: Session, restaurant_id: str):
+    """Every item of a menu, unavailable ones included, as plain rows in menu order"""
+    return db.execute(
+        select(
+            MenuItem.id, MenuItem.name, MenuItem.description, MenuItem.price, MenuItem.image_url,
+            MenuItem.is_available, MenuItem.is_vegetarian, MenuItem.is_vegan, MenuItem.is_gluten_free,
+            MenuItem.spice_level, MenuItem.calories, MenuItem.prep_time, MenuItem.category, MenuItem.sort_order
+        )
+        .where(MenuItem.restaurant_id == restaurant_id)
+        .order_by(MenuItem.sort_order, MenuItem.name)
+    ).mappings().all()
+
+# Review CRUD operations (restaurant ratings move with each write, see reviews.py)
+def create_review(db: Session, review: ReviewCreate, restaurant_id: str, customer_id: str):
+    """Returns None when the customer has already reviewed the restaurant"""
+    db_review = RestaurantReview(restaurant_id=restaurant_id, customer_id=customer_id, **review.model_dump())
+    db.add(db_review)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        return None
+    reviews.apply_rating_delta(db, restaurant_id, review.rating, 1)
+    db.commit()
+    db.refresh(db_review)
+    return db_review
+
+def get_review(db: Session, review_id: str):
+    return db.query(RestaurantReview).filter(RestaurantReview.id == review_id).first()
+
+def get_reviews(db: Session, restaurant_id: str, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    query = apply_keyset(db.query(RestaurantReview).filter(RestaurantReview.restaurant_id == restaurant_id),
+                         RestaurantReview, cursor)
+    if not cursor:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+def update_review(db: Session, review_id: str, review_update: ReviewUpdate, expected_rating: int):
+    """Apply the update only if the review still has expected_rating.
+
+    The rating delta is taken against the rating the conditional UPDATE matched,
+    so concurrent edits cannot both apply a delta from the same old rating.
+    Returns None when the review is gone or its rating changed meanwhile.
+    """
+    update_data = review_update.model_dump(exclude_unset=True)
+    if not update_data:
+        return get_review(db, review_id)
+    updated = db.execute(
+        update(RestaurantReview)
+        .where(RestaurantReview.id == review_id, RestaurantReview.rating == expected_rating)
+        .values(**update_data, updated_at=func.now())
+        .returning(RestaurantReview.restaurant_id, RestaurantReview.rating)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if updated is None:
+        db.rollback()
+        return None
+    if updated.rating != expected_rating:
+        reviews.apply_rating_delta(db, updated.restaurant_id, updated.rating - expected_rating, 0)
+    db.commit()
+    db.expire_all()
+    return get_review(db, review_id)
+
+def delete_review(db: Session, review_id: str):
+    """Returns False when the review was already deleted"""
+    deleted = db.execute(
+        delete(RestaurantReview)
+        .where(RestaurantReview.id == review_id)
+        .returning(RestaurantReview.restaurant_id, RestaurantReview.rating)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if deleted is None:
+        db.rollback()
+        return False
+    reviews.apply_rating_delta(db, deleted.restaurant_id, -deleted.rating, -1)
+    db.commit()
+    return True
+
+# Cart CRUD operations (carts.py keeps the live copy; these load and persist it)
+def get_cart_lines(db: Session, user_id: str):
+    """A persisted cart's lines with the name, price and restaurant they were priced from"""
+    return db.execute(
+        select(CartItem.menu_item_id, CartItem.quantity, CartItem.special_instructions,
+               MenuItem.name, MenuItem.price, MenuItem.restaurant_id)
+        .join(MenuItem, MenuItem.id == CartItem.menu_item_id)
+        .where(CartItem.user_id == user_id)
+        .order_by(CartItem.created_at, CartItem.id)
+    ).all()
+
+def replace_carts(db: Session, carts: dict):
+    """Overwrite the persisted lines of many carts (user_id -> cart) in one transaction.
+
+    Lines whose menu item has since been deleted are dropped; the cart keeps
+    them until checkout reports them unavailable.
+    """
+    db.execute(delete(CartItem).where(CartItem.user_id.in_(list(carts))))
+    menu_item_ids = {line["menu_item_id"] for cart in carts.values() for line in cart["items"]}
+    existing = set(db.scalars(select(MenuItem.id).where(MenuItem.id.in_(menu_item_ids)))) if menu_item_ids else set()
+    lines = [
+        {"user_id": user_id, "menu_item_id": line["menu_item_id"], "quantity": line["quantity"],
+         "special_instructions": line["special_instructions"]}
+        for user_id, cart in carts.items()
+        for line in cart["items"]
+        if line["menu_item_id"] in existing
+    ]
+    if lines:
+        db.execute(insert(CartItem), lines)
+    db.commit()
+
+def checkout_cart(db: Session, cart: dict, customer_id: str, checkout: CartCheckout):
+    """Turn a cart into an order if its cached prices still hold: (order, changes).
+
+    Menu items and their restaurant are validated in one query; when anything
+    changed (price, availability) nothing is written and changes lists the
+    current state of every affected line for the caller to reprice the cart.
+    """
+    lines = cart["items"]
+    current = {
+        row.id: row
+        for row in db.execute(
+            select(MenuItem.id, MenuItem.name, MenuItem.price, MenuItem.is_available, MenuItem.restaurant_id,
+                   Restaurant.is_active, Restaurant.delivery_fee, Restaurant.estimated_delivery_time)
+            .join(Restaurant, Restaurant.id == MenuItem.restaurant_id)
+            .where(MenuItem.id.in_([line["menu_item_id"] for line in lines]))
+        )
+    }
+    
+    changes = []
+    for line in lines:
+        row = current.get(line["menu_item_id"])
+        if row is None or not row.is_available or not row.is_active or row.restaurant_id != cart["restaurant_id"]:
+            changes.append({"menu_item_id": line["menu_item_id"], "available": False})
+        elif row.price != line["unit_price"]:
+            changes.append({"menu_item_id": line["menu_item_id"], "available": True, "unit_price": row.price,
+                            "previous_unit_price": line["unit_price"]})
+    if changes:
+        return None, changes
+    
+    order_items_data = [
+        {
+            "menu_item_id": line["menu_item_id"],
+            "quantity": line["quantity"],
+            "unit_price": line["unit_price"],
+            "total_price": line["unit_price"] * line["quantity"],
+            "special_instructions": line["special_instructions"]
+        }
+        for line in lines
+    ]
+    restaurant = current[lines[0]["menu_item_id"]]
+    db_order = _place_order(
+        db, customer_id, checkout, cart["restaurant_id"], restaurant.delivery_fee,
+        restaurant.estimated_delivery_time, order_items_data, sum(item["total_price"] for item in order_items_data)
+    )
+    return db_order, []
+
 # Order CRUD operations
+
+# Loader profiles: the relationships each endpoint touches, loaded up front in a
+# fixed number of queries (lazy loads would cost one SELECT per row, and an
+# AsyncSession cannot lazy-load during serialization at all)
+ORDER_LOADER_PROFILES = {
+    # Full OrderResponse graph: restaurant and customer joined into the order
+    # query, items with their menu items in one extra SELECT
+    "response": (
+        joinedload(Order.restaurant),
+        joinedload(Order.customer),
+        selectinload(Order.order_items).joinedload(OrderItem.menu_item),
+    ),
+    # Permission checks only need the owning restaurant
+    "ownership": (
+        joinedload(Order.restaurant),
+    ),
+}
+
 def create_order(db: Session, order: OrderCreate, customer_id: str):
-    # Get restaurant info for calculations
+    # Everything below runs in one transaction with a fixed number of round
+    # trips, however many lines the cart has
     restaurant = get_restaurant(db, order.restaurant_id)
     if not restaurant:
         return None
     
+    # Fetch every menu item in the cart with a single IN query
+    menu_item_ids = {item_data.menu_item_id for item_data in order.items}
+    menu_items = {
+        menu_item.id: menu_item
+        for menu_item in db.query(MenuItem).filter(MenuItem.id.in_(menu_item_ids))
+    }
+    
     # Calculate order totals
     subtotal = 0
     order_items_data = []
     
     for item_data in order.items:
-        menu_item = get_menu_item(db, item_data.menu_item_id)
+        menu_item = menu_items.get(item_data.menu_item_id)
         if menu_item:
             item_total = menu_item.price * item_data.quantity
             subtotal += item_total
             order_items_data.append({
-                "menu_item": menu_item,
+                "menu_item_id": menu_item.id,
                 "quantity": item_data.quantity,
                 "unit_price": menu_item.price,
                 "total_price": item_total,
                 "special_instructions": item_data.special_instructions
             })
     
+    return _place_order(
+        db, customer_id, order, order.restaurant_id, restaurant.delivery_fee, restaurant.estimated_delivery_time,
+        order_items_data, subtotal
+    )
+
+def _place_order(db: Session, customer_id: str, order, restaurant_id: str, delivery_fee: float,
+                 estimated_delivery_minutes: int, order_items_data: List[dict], subtotal: float):
+    """Write a priced order, its items and the counters it moves, then commit.
+
+    order supplies the delivery details (an OrderCreate or CartCheckout).
+    """
     # Calculate other charges
-    delivery_fee = restaurant.delivery_fee
     tax_amount = subtotal * 0.08  # 8% tax
     total_amount = subtotal + delivery_fee + tax_amount
     
     # Create order
     db_order = Order(
         customer_id=customer_id,
-        restaurant_id=order.restaurant_id,
+        restaurant_id=restaurant_id,
         delivery_address=order.delivery_address,
         delivery_instructions=order.delivery_instructions,
         special_instructions=order.special_instructions,
@@ -147,36 +515,34 @@ def create_order(db: Session, order: OrderCreate, customer_id: str):
         delivery_fee=delivery_fee,
         tax_amount=tax_amount,
         total_amount=total_amount,
-        estimated_delivery_time=datetime.utcnow().replace(minute=datetime.utcnow().minute + restaurant.estimated_delivery_time)
+        estimated_delivery_time=datetime.utcnow() + timedelta(minutes=estimated_delivery_minutes)
     )
     
     db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
-    
-    # Create order items
-    for item_data in order_items_data:
-        db_order_item = OrderItem(
-            order_id=db_order.id,
-            menu_item_id=item_data["menu_item"].id,
-            quantity=item_data["quantity"],
-            unit_price=item_data["unit_price"],
-            total_price=item_data["total_price"],
-            special_instructions=item_data["special_instructions"]
+    db.flush()
+    order_id = db_order.id
+    
+    # Bulk-insert order items in one executemany
+    if order_items_data:
+        db.execute(
+            insert(OrderItem),
+            [{"order_id": order_id, **item_data} for item_data in order_items_data]
         )
-        db.add(db_order_item)
     
-    db.commit()
+    # created_at came back with the INSERT (RETURNING), so this costs no extra read
+    analytics.record_order_placed(db, restaurant_id, db_order.created_at, total_amount, order_items_data)
+    
+    # restaurants.total_orders is sharded so checkouts do not queue on the restaurant row
+    order_counters.record_order(db, restaurant_id)
     
-    # Update restaurant total orders
-    restaurant.total_orders += 1
     db.commit()
     
-    return db_order
+    return get_order(db, order_id)
 
 def get_orders(db: Session, skip: int = 0, limit: int = 100, status: Optional[str] = None, 
-               customer_id: Optional[str] = None, seller_id: Optional[str] = None):
-    query = db.query(Order)
+               customer_id: Optional[str] = None, seller_id: Optional[str] = None, profile: str = "response",
+               cursor: Optional[str] = None):
+    query = db.query(Order).options(*ORDER_LOADER_PROFILES[profile])
     
     if status:
         query = query.filter(Order.status == status)
@@ -186,20 +552,129 @@ def get_orders(db: Session, skip: int = 0, limit: int = 100, status: Optional[st
     
     if seller_id:
         # Get orders for restaurants owned by this seller
-        restaurant_ids = db.query(Restaurant.id).filter(Restaurant.owner_id == seller_id).subquery()
+        restaurant_ids = select(Restaurant.id).where(Restaurant.owner_id == seller_id)
         query = query.filter(Order.restaurant_id.in_(restaurant_ids))
     
-    return query.order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
+    query = apply_keyset(query, Order, cursor)
+    if not cursor:
+        query = query.offset(skip)
+    
+    return query.limit(limit).all()
 
-def get_order(db: Session, order_id: str):
-    return db.query(Order).filter(Order.id == order_id).first()
+def iter_order_export_rows(db: Session, batch_size: int, start: Optional[datetime] = None,
+                           end: Optional[datetime] = None, restaurant_id: Optional[str] = None,
+                           status: Optional[str] = None, seller_id: Optional[str] = None):
+    """Flat order rows, oldest first, as partitions of up to batch_size rows.
 
-def update_order(db: Session, order_id: str, order_update: OrderUpdate):
-    db_order = db.query(Order).filter(Order.id == order_id).first()
-    if db_order:
-        update_data = order_update.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_order, field, value)
-        db.commit()
-        db.refresh(db_order)
-    return db_order
\ No newline at end of file
+    yield_per fetches through a server-side cursor where the driver has one
+    (psycopg2), so memory stays flat however many orders match.
+    """
+    query = (
+        select(
+            Order.id, Order.created_at, Order.status, Order.restaurant_id, Restaurant.name.label("restaurant_name"),
+            Order.customer_id, Order.subtotal, Order.delivery_fee,
+            Order.tax_amount, Order.tip_amount, Order.total_amount, Order.payment_status,
+            Order.estimated_delivery_time, Order.actual_delivery_time
+        )
+        .join(Restaurant, Order.restaurant_id == Restaurant.id)
+        .order_by(Order.created_at, Order.id)
+    )
+    
+    if start:
+        query = query.where(Order.created_at >= start)
+    if end:
+        query = query.where(Order.created_at < end)
+    if restaurant_id:
+        query = query.where(Order.restaurant_id == restaurant_id)
+    if status:
+        query = query.where(Order.status == status)
+    if seller_id:
+        query = query.where(Restaurant.owner_id == seller_id)
+    
+    yield from db.execute(query.execution_options(yield_per=batch_size)).partitions()
+
+def get_order(db: Session, order_id: str, profile: str = "response"):
+    return (
+        db.query(Order)
+        .options(*ORDER_LOADER_PROFILES[profile])
+        .filter(Order.id == order_id)
+        .execution_options(populate_existing=True)
+        .first()
+    )
+
+# Order lifecycle, matching the status CHECK in database_schema.sql: the statuses
+# each status may move to. delivered and cancelled are final.
+ORDER_TRANSITIONS = {
+    "pending": {"confirmed", "cancelled"},
+    "confirmed": {"preparing", "cancelled"},
+    "preparing": {"ready", "cancelled"},
+    "ready": {"picked_up", "cancelled"},
+    "picked_up": {"delivering"},
+    "delivering": {"delivered"},
+    "delivered": set(),
+    "cancelled": set(),
+}
+
+def can_transition(current_status: str, new_status: str) -> bool:
+    # Re-sending the current status is an idempotent no-op, so client retries succeed
+    return new_status == current_status or new_status in ORDER_TRANSITIONS.get(current_status, ())
+
+def order_predecessors(new_status: str) -> set:
+    """Statuses an order may be in for an update to new_status to apply"""
+    return {status for status in ORDER_TRANSITIONS if can_transition(status, new_status)}
+
+def update_order(db: Session, order_id: str, order_update: OrderUpdate, owner_id: Optional[str] = None,
+                 expected_status: Optional[str] = None):
+    """Apply the update in one conditional UPDATE ... RETURNING: (order, previous_status).
+
+    The WHERE clause carries the whole check: the order must be in a status
+    that may move to the new one (exactly expected_status when given) and, with
+    owner_id, belong to one of that owner's restaurants, so concurrent updates
+    cannot both move the order from the same status. Returns (None, None) when
+    no row qualified; the caller reads the order back to say why.
+    """
+    update_data = order_update.model_dump(exclude_unset=True)
+    if not update_data:
+        order = get_order(db, order_id)
+        if order is None or owner_id not in (None, order.restaurant.owner_id):
+            return None, None
+        return order, None
+    # The row as it was, locked and materialized before the UPDATE reads it (the UPDATE
+    # targets it through the CTE), so RETURNING can report the status the order left;
+    # RETURNING itself only sees the new row
+    current = (
+        select(Order.id, Order.status).where(Order.id == order_id).with_for_update()
+        .cte("current_order").prefix_with("MATERIALIZED")
+    )
+    if update_data.get("status") == "delivered" and "actual_delivery_time" not in update_data:
+        # A repeated delivered -> delivered keeps the real delivery time
+        update_data["actual_delivery_time"] = case(
+            (Order.status == "delivered", Order.actual_delivery_time), else_=func.now()
+        )
+    statement = (
+        update(Order)
+        .add_cte(current)
+        .where(Order.id.in_(select(current.c.id)))
+        .values(**update_data)
+        .returning(
+            select(current.c.status).scalar_subquery().label("previous_status"),
+            Order.restaurant_id, Order.created_at, Order.total_amount,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if "status" in update_data:
+        predecessors = {expected_status} if expected_status is not None else order_predecessors(update_data["status"])
+        statement = statement.where(Order.status.in_(predecessors))
+    if owner_id is not None:
+        statement = statement.where(Order.restaurant_id.in_(select(Restaurant.id).where(Restaurant.owner_id == owner_id)))
+    updated = db.execute(statement).first()
+    if updated is None:
+        db.rollback()
+        return None, None
+    if "status" in update_data:
+        analytics.record_status_change(
+            db, order_id, updated.restaurant_id, updated.created_at, updated.total_amount,
+            updated.previous_status, update_data["status"]
+        )
+    db.commit()
+    return get_order(db, order_id), updated.previous_status
\ No newline at end of file
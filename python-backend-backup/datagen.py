@@ -0,0 +1,300 @@
+"""Synthetic dataset generator.
+
+Streams users, restaurants, menu items, orders and order items into the database
+in batches: COPY on PostgreSQL, driver-level executemany elsewhere. Popularity is
+Zipf-skewed (a few restaurants, dishes and customers take most orders) and orders
+follow daily lunch/dinner peaks, weekend lift and growth over the date range.
+
+    python datagen.py --customers 1000000 --restaurants 20000 --orders 10000000 \\
+        --start 2024-01-01 --end 2024-12-31
+
+Ids are derived from --seed, so the same arguments always produce the same rows.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import bindparam, update
+
+from auth import get_password_hash
+from models import Restaurant
+
+BATCH_SIZE = 10000
+
+CUISINES = ["italian", "chinese", "mexican", "indian", "thai", "japanese", "american", "mediterranean"]
+NAME_WORDS = ["Golden", "Little", "Blue", "Spicy", "Corner", "Garden", "Royal", "Urban", "Lucky", "Harbor"]
+NAME_NOUNS = ["Kitchen", "Bistro", "House", "Grill", "Express", "Table", "Cantina", "Noodle Bar", "Diner", "Oven"]
+DISHES = ["Chicken", "Noodles", "Curry", "Tacos", "Pizza", "Dumplings", "Salad", "Burger", "Soup", "Rice Bowl",
+          "Pasta", "Sushi Roll", "Wrap", "Tofu", "Shrimp", "Fries", "Cake", "Lemonade"]
+DISH_STYLES = ["Classic", "Spicy", "Crispy", "Garlic", "Vegan", "Smoky", "House", "Lemon", "Sesame", "Grilled"]
+CATEGORIES = ["appetizers", "mains", "mains", "mains", "desserts", "beverages"]
+ACTIVE_STATUSES = ["pending", "confirmed", "preparing", "ready", "picked_up", "delivering"]
+
+# Relative order volume per hour of day (UTC-agnostic: lunch and dinner peaks)
+HOURLY_WEIGHTS = [1, 1, 1, 1, 1, 1, 2, 3, 4, 4, 6, 12, 16, 12, 6, 5, 6, 10, 16, 18, 14, 8, 4, 2]
+
+# Each table gets its own id space so row n's id can be recomputed instead of stored
+_TABLE_TAGS = {"users": 1, "restaurants": 2, "menu_items": 3, "orders": 4, "order_items": 5}
+
+COLUMNS = {
+    "users": ("id", "email", "password_hash", "first_name", "last_name", "phone", "role", "is_active", "created_at"),
+    "restaurants": (
+        "id", "owner_id", "name", "description", "cuisine_type", "street_address", "city", "state", "postal_code",
+        "latitude", "longitude", "is_active", "is_open", "average_rating", "total_reviews", "rating_sum", "total_orders",
+        "delivery_fee", "minimum_order", "estimated_delivery_time", "created_at",
+    ),
+    "menu_items": (
+        "id", "restaurant_id", "name", "description", "price", "is_available", "is_vegetarian", "is_vegan",
+        "is_gluten_free", "spice_level", "prep_time", "category", "sort_order", "created_at",
+    ),
+    "orders": (
+        "id", "customer_id", "restaurant_id", "status", "delivery_address", "subtotal", "delivery_fee",
+        "tax_amount", "tip_amount", "total_amount", "estimated_delivery_time", "actual_delivery_time",
+        "payment_status", "payment_method", "created_at",
+    ),
+    "order_items": ("id", "order_id", "menu_item_id", "quantity", "unit_price", "total_price", "created_at"),
+}
+
+def zipf_cum_weights(n: int, skew: float):
+    """Cumulative weights for random.choices: rank k is drawn proportionally to 1 / k**skew"""
+    return list(accumulate(1.0 / (rank ** skew) for rank in range(1, n + 1)))
+
+class _Writer:
+    """Batched row sink: COPY FROM STDIN on PostgreSQL, executemany otherwise"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.postgres = conn.dialect.name == "postgresql"
+        self.counts = {}
+        self._pending = {}
+
+    def timestamp(self, value: datetime) -> str:
+        """Naive UTC datetime -> column literal (SQLAlchemy's own storage format outside PostgreSQL)"""
+        if self.postgres:
+            return value.isoformat(sep=" ") + "+00"
+        return value.isoformat(sep=" ", timespec="microseconds")
+
+    def add(self, table: str, row: tuple):
+        rows = self._pending.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= BATCH_SIZE:
+            # Every buffer goes, parents first: a child batch may point at rows still pending
+            self.flush()
+
+    def flush(self):
+        for name in COLUMNS:
+            rows = self._pending.pop(name, None)
+            if not rows:
+                continue
+            if self.postgres:
+                self._copy(name, rows)
+            else:
+                self._executemany(name, rows)
+            self.counts[name] = self.counts.get(name, 0) + len(rows)
+
+    def _copy(self, table, rows):
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(_copy_value(value) for value in row))
+            buffer.write("\n")
+        buffer.seek(0)
+        cursor = self.conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table} ({', '.join(COLUMNS[table])}) FROM STDIN", buffer)
+        finally:
+            cursor.close()
+
+    def _executemany(self, table, rows):
+        placeholder = {"qmark": "?", "numeric": None}.get(self.conn.dialect.paramstyle, "%s")
+        columns = COLUMNS[table]
+        marks = ", ".join(f":{i + 1}" for i in range(len(columns))) if placeholder is None else \
+            ", ".join([placeholder] * len(columns))
+        self.conn.exec_driver_sql(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({marks})", rows)
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    if isinstance(value, str):
+        return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+    return str(value)
+
+def generate(engine, customers: int = 10000, restaurants: int = 500, menu_items: int = 20, orders: int = 100000,
+             start: datetime = None, end: datetime = None, seed: int = 42, skew: float = 1.1,
+             email_domain: str = "datagen.example.com", password: str = "password123", progress=print):
+    """Bulk-load a synthetic dataset into engine's (existing) tables; returns rows written per table.
+
+    menu_items is the average per restaurant. Users are customers plus one seller per
+    restaurant-owning account (sellers own one to three restaurants).
+    """
+    rng = random.Random(seed)
+    # UUID-shaped ids: seed-derived prefix, table tag, row number
+    prefix = rng.getrandbits(32)
+    id_prefixes = {table: f"{prefix:08x}-0000-{tag:04x}-" for table, tag in _TABLE_TAGS.items()}
+    new_id = lambda table, n: f"{id_prefixes[table]}{n >> 48:04x}-{n & 0xFFFFFFFFFFFF:012x}"
+    # Work in naive UTC; order days start at midnight
+    end = end or datetime.now(timezone.utc)
+    if end.tzinfo:
+        end = end.astimezone(timezone.utc).replace(tzinfo=None)
+    start = start or end - timedelta(days=90)
+    if start.tzinfo:
+        start = start.astimezone(timezone.utc).replace(tzinfo=None)
+    start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    password_hash = get_password_hash(password)
+    started = perf_counter()
+    report = lambda table, n: progress and progress(f"{table:>12}: {n:>11,d} rows  {perf_counter() - started:7.1f}s")
+
+    with engine.begin() as conn:
+        writer = _Writer(conn)
+        add, timestamp = writer.add, writer.timestamp
+        start_at = timestamp(start)
+
+        # Sellers own 1-3 restaurants each; owner of restaurant r is seller owner_of[r]
+        owner_of = array("l")
+        sellers = 0
+        while len(owner_of) < restaurants:
+            owner_of.extend([sellers] * min(rng.choice((1, 1, 1, 2, 3)), restaurants - len(owner_of)))
+            sellers += 1
+        for n in range(sellers):
+            add("users", (new_id("users", n), f"seller{n}@{email_domain}", password_hash, "Seller", str(n),
+                          f"+1-555-{n % 10000:04d}", "seller", True, start_at))
+        for n in range(customers):
+            add("users", (new_id("users", sellers + n), f"customer{n}@{email_domain}", password_hash,
+                          "Customer", str(n), None, "customer", True, timestamp(start + (end - start) * rng.random() ** 2)))
+        writer.flush()
+        report("users", sellers + customers)
+
+        # Menus: first item index and size per restaurant, prices kept for order totals
+        first_item, menu_size, prices = array("l"), array("l"), array("d")
+        restaurant_ids = [new_id("restaurants", r) for r in range(restaurants)]
+        for r in range(restaurants):
+            first_item.append(first_item[-1] + menu_size[-1] if r else 0)
+            menu_size.append(max(3, int(rng.gauss(menu_items, menu_items / 3))))
+            # Ratings without review rows behind them, kept consistent with each other
+            # (reviews.reconcile leaves restaurants without reviews as they are)
+            review_count = rng.randint(5, 500)
+            rating_sum = round(rng.uniform(3.0, 5.0) * review_count)
+            add("restaurants", (
+                restaurant_ids[r], new_id("users", owner_of[r]),
+                f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_NOUNS)} {r}", "Synthetic restaurant",
+                rng.choice(CUISINES), f"{rng.randint(1, 9999)} Main St", "New York", "NY", "10001",
+                round(rng.uniform(40.55, 40.90), 6), round(rng.uniform(-74.10, -73.70), 6),
+                rng.random() < 0.97, rng.random() < 0.8, round(rating_sum / review_count, 2), review_count, rating_sum, 0,
+                rng.choice((0.99, 1.99, 2.99, 3.99)), rng.choice((0.0, 10.0, 15.0)), rng.choice((20, 30, 45)),
+                timestamp(start - timedelta(days=rng.randint(0, 365))),
+            ))
+        writer.flush()
+        menu_item_ids = []
+        for r in range(restaurants):
+            for position in range(menu_size[r]):
+                price = round(rng.uniform(3.5, 32.0), 2)
+                prices.append(price)
+                menu_item_ids.append(new_id("menu_items", len(menu_item_ids)))
+                style, dish = rng.choice(DISH_STYLES), rng.choice(DISHES)
+                add("menu_items", (
+                    menu_item_ids[-1], restaurant_ids[r], f"{style} {dish}",
+                    f"{style} {dish.lower()} made to order", price, rng.random() < 0.95,
+                    style == "Vegan" or rng.random() < 0.2, style == "Vegan", rng.random() < 0.15,
+                    3 if style == "Spicy" else rng.randint(0, 2), 15, rng.choice(CATEGORIES), position, start_at,
+                ))
+        writer.flush()
+        report("menu_items", len(prices))
+
+        # Orders in time order: volume per day grows over the range and lifts at weekends
+        restaurant_weights = zipf_cum_weights(restaurants, skew)
+        customer_weights = zipf_cum_weights(customers, skew * 0.7)
+        dish_weights = zipf_cum_weights(max(menu_size), skew)
+        hour_weights = list(accumulate(HOURLY_WEIGHTS))
+        days = max(1, (end - start).days)
+        day_weights = [(1 + d / days) * (1.3 if (start + timedelta(days=d)).weekday() >= 5 else 1.0)
+                       for d in range(days)]
+        day_scale = orders / sum(day_weights)
+        order_counts = array("l", [0] * restaurants)
+        order_n = item_n = 0
+        carry = 0.0
+        for d in range(days):
+            carry += day_weights[d] * day_scale
+            today = int(carry) if d < days - 1 else orders - order_n
+            carry -= today
+            day_start = start + timedelta(days=d)
+            offsets = sorted(rng.choices(range(24), cum_weights=hour_weights, k=today))
+            picked = rng.choices(range(restaurants), cum_weights=restaurant_weights, k=today)
+            buyers = rng.choices(range(customers), cum_weights=customer_weights, k=today)
+            for hour, r, c in zip(offsets, picked, buyers):
+                created_at = day_start + timedelta(seconds=(hour + rng.random()) * 3600)
+                created_at_value = timestamp(created_at)
+                order_id = new_id("orders", order_n)
+                subtotal = 0.0
+                size = menu_size[r]
+                lines = rng.choices(range(size), cum_weights=dish_weights[:size], k=rng.choice((1, 1, 2, 2, 3, 4)))
+                # Items are added after their order, which needs their subtotal first
+                order_items = []
+                for position in set(lines):
+                    price = prices[first_item[r] + position]
+                    quantity = lines.count(position)
+                    subtotal += price * quantity
+                    order_items.append((new_id("order_items", item_n), order_id, menu_item_ids[first_item[r] + position],
+                                        quantity, price, round(price * quantity, 2), created_at_value))
+                    item_n += 1
+                if end - created_at < timedelta(hours=2):
+                    status, payment_status = rng.choice(ACTIVE_STATUSES), "pending"
+                else:
+                    status, payment_status = ("cancelled", "refunded") if rng.random() < 0.06 else ("delivered", "paid")
+                subtotal = round(subtotal, 2)
+                delivery_fee, tax, tip = 2.99, round(subtotal * 0.08, 2), round(subtotal * rng.choice((0, 0.1, 0.15, 0.2)), 2)
+                eta = created_at + timedelta(minutes=35)
+                add("orders", (
+                    order_id, new_id("users", sellers + c), restaurant_ids[r], status, f"{c} Customer Ave",
+                    subtotal, delivery_fee, tax, tip, round(subtotal + delivery_fee + tax + tip, 2), timestamp(eta),
+                    timestamp(eta + timedelta(minutes=rng.randint(-10, 20))) if status == "delivered" else None,
+                    payment_status, "card", created_at_value,
+                ))
+                for row in order_items:
+                    add("order_items", row)
+                order_counts[r] += 1
+                order_n += 1
+                if order_n % 1000000 == 0:
+                    report("orders", order_n)
+        writer.flush()
+        if order_n % 1000000:
+            report("orders", order_n)
+
+        conn.execute(
+            update(Restaurant.__table__).where(Restaurant.id == bindparam("restaurant_id"))
+            .values(total_orders=bindparam("count")),
+            [{"restaurant_id": restaurant_ids[r], "count": count} for r, count in enumerate(order_counts) if count],
+        )
+    return writer.counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=10000)
+    parser.add_argument("--restaurants", type=int, default=500)
+    parser.add_argument("--menu-items", type=int, default=20, help="average per restaurant")
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--start", type=datetime.fromisoformat, help="first order day (default: end - 90 days)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="last order time (default: now)")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for restaurant/dish popularity")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--email-domain", default="datagen.example.com")
+    args = parser.parse_args()
+
+    from database import Base, engine
+    Base.metadata.create_all(bind=engine)
+    written = generate(
+        engine, customers=args.customers, restaurants=args.restaurants, menu_items=args.menu_items,
+        orders=args.orders, start=args.start, end=args.end, seed=args.seed, skew=args.skew,
+        email_domain=args.email_domain,
+    )
+    print(", ".join(f"{count:,d} {table}" for table, count in written.items()))
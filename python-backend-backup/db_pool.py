@@ -0,0 +1,84 @@
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from prometheus_client import Counter, Gauge, Histogram
+from time import perf_counter
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Pool settings (per worker process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Server-side statement timeout in milliseconds, 0 disables it (PostgreSQL only)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+# Pool metrics, labelled by engine ("sync" / "async")
+POOL_SIZE = Gauge("db_pool_size", "Configured number of pooled connections", ["engine"])
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out", ["engine"])
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Overflow connections currently open", ["engine"])
+POOL_WAITERS = Gauge("db_pool_waiters", "Callers currently waiting for a connection", ["engine"])
+POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting to check out a connection",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Checkouts that gave up after pool_timeout", ["engine"])
+
+class _InstrumentedPoolMixin:
+    """Times every checkout and tracks how many callers are queued behind the pool"""
+    metrics_label = "sync"
+
+    def _do_get(self):
+        waiters = POOL_WAITERS.labels(self.metrics_label)
+        waiters.inc()
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.labels(self.metrics_label).inc()
+            raise
+        finally:
+            waiters.dec()
+            POOL_WAIT_SECONDS.labels(self.metrics_label).observe(perf_counter() - start)
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    metrics_label = "sync"
+
+class InstrumentedAsyncAdaptedQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+def engine_kwargs(url: str, is_async: bool = False) -> dict:
+    """create_engine / create_async_engine keyword arguments for the configured pool"""
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":")):
+        # In-memory SQLite relies on its single-connection pool
+        return {}
+
+    kwargs = {
+        "poolclass": InstrumentedAsyncAdaptedQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+    if DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+        if is_async:
+            kwargs["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            kwargs["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+
+    return kwargs
+
+def register_pool_metrics(pool, label: str):
+    """Expose live pool occupancy for an engine's pool"""
+    if not isinstance(pool, QueuePool):
+        return
+    POOL_SIZE.labels(label).set_function(pool.size)
+    POOL_CHECKED_OUT.labels(label).set_function(pool.checkedout)
+    POOL_OVERFLOW.labels(label).set_function(lambda: max(pool.overflow(), 0))
@@ -0,0 +1,147 @@
+from collections import defaultdict
+from math import asin, ceil, cos, degrees, floor, radians, sin, sqrt
+from time import monotonic
+from typing import List, Optional, Tuple
+import asyncio
+import heapq
+import os
+import threading
+from dotenv import load_dotenv
+
+from crud import get_restaurant_locations
+from database import run_db
+
+load_dotenv()
+
+# "memory" answers nearby queries from an in-process grid index; "postgis" pushes them
+# to PostgreSQL (needs the postgis extension and the GiST index in database_schema.sql)
+GEO_BACKEND = os.getenv("GEO_BACKEND", "memory")
+# Grid cell edge in degrees (0.01 is roughly 1.1 km of latitude); smaller cells suit denser cities
+GEO_CELL_DEGREES = float(os.getenv("GEO_CELL_DEGREES", "0.01"))
+# Full rebuild interval; picks up writes made through other workers
+GEO_INDEX_REFRESH_SECONDS = float(os.getenv("GEO_INDEX_REFRESH_SECONDS", "300"))
+
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    dlat = radians(lat2 - lat1)
+    dlng = radians(lng2 - lng1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+class GridIndex:
+    """Restaurants bucketed into fixed lat/lng cells; queries scan the cells under the radius's bounding box"""
+
+    def __init__(self, cell_degrees: float = GEO_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        # Columns count from -180° and wrap, so the cells either side of the antimeridian are neighbours
+        self._columns = ceil(360 / cell_degrees - 1e-9)
+        self._cells = defaultdict(dict)  # (row, col) -> {restaurant_id: (lat, lng, is_open)}
+        self._cell_of = {}  # restaurant_id -> (row, col)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cell_of)
+
+    def _row(self, lat: float) -> int:
+        return floor(lat / self.cell_degrees)
+
+    def _col(self, lng: float) -> int:
+        return floor(((lng + 180) % 360) / self.cell_degrees) % self._columns
+
+    def upsert(self, restaurant_id: str, lat: float, lng: float, is_open: bool):
+        cell = self._row(lat), self._col(lng)
+        with self._lock:
+            previous = self._cell_of.get(restaurant_id)
+            if previous is not None and previous != cell:
+                self._cells[previous].pop(restaurant_id, None)
+            self._cells[cell][restaurant_id] = (lat, lng, is_open)
+            self._cell_of[restaurant_id] = cell
+
+    def remove(self, restaurant_id: str):
+        with self._lock:
+            cell = self._cell_of.pop(restaurant_id, None)
+            if cell is not None:
+                self._cells[cell].pop(restaurant_id, None)
+
+    def nearby(self, lat: float, lng: float, radius_km: float, limit: int,
+               open_only: bool = True) -> List[Tuple[float, str]]:
+        """(distance_km, restaurant_id) pairs within radius_km, nearest first, at most limit"""
+        # Search a small circle first: once it holds limit hits, nothing outside it can be nearer
+        for search_km in (radius_km / 16, radius_km / 4, radius_km):
+            found = self._within(lat, lng, search_km, open_only)
+            if len(found) >= limit:
+                break
+        return heapq.nsmallest(limit, found)
+
+    def _within(self, lat: float, lng: float, radius_km: float, open_only: bool) -> List[Tuple[float, str]]:
+        # Bounding box of the circle; it spans every longitude when it reaches a pole
+        angle = radius_km / EARTH_RADIUS_KM
+        dlat = degrees(angle) + 1e-9
+        lat_min, lat_max = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        if lat_min == -90.0 or lat_max == 90.0 or sin(angle) >= cos(radians(lat)):
+            dlng = 180.0
+        else:
+            dlng = degrees(asin(sin(angle) / cos(radians(lat)))) + 1e-9
+
+        rows = range(self._row(lat_min), self._row(lat_max) + 1)
+        first_col = self._col(lng - dlng)
+        wraps_around = 2 * dlng >= 360 - 2 * self.cell_degrees
+        col_span = self._columns - 1 if wraps_around else (self._col(lng + dlng) - first_col) % self._columns
+        # Past the number of occupied cells, walking those is cheaper than walking the box
+        # (wide boxes near the poles), which caps a query at one pass over the index
+        if len(rows) * (col_span + 1) > len(self._cells):
+            buckets = [
+                bucket for (row, col), bucket in list(self._cells.items())
+                if row in rows and (col - first_col) % self._columns <= col_span
+            ]
+        else:
+            buckets = [
+                self._cells.get((row, (first_col + offset) % self._columns))
+                for row in rows for offset in range(col_span + 1)
+            ]
+
+        found = []
+        for bucket in buckets:
+            if not bucket:
+                continue
+            for restaurant_id, (r_lat, r_lng, is_open) in bucket.items():
+                if open_only and not is_open:
+                    continue
+                # Box prefilter (wrapping across ±180°) so haversine only runs for likely hits
+                if not lat_min <= r_lat <= lat_max or abs((r_lng - lng + 180) % 360 - 180) > dlng:
+                    continue
+                distance = haversine_km(lat, lng, r_lat, r_lng)
+                if distance <= radius_km:
+                    found.append((distance, restaurant_id))
+        return found
+
+_index: Optional[GridIndex] = None
+_built_at = 0.0
+_build_lock = asyncio.Lock()
+
+async def ensure_index(db) -> GridIndex:
+    """The process-wide index, (re)built from the database when missing or stale"""
+    global _index, _built_at
+    if _index is not None and monotonic() - _built_at < GEO_INDEX_REFRESH_SECONDS:
+        return _index
+    async with _build_lock:
+        if _index is None or monotonic() - _built_at >= GEO_INDEX_REFRESH_SECONDS:
+            index = GridIndex()
+            for restaurant_id, lat, lng, is_open in await run_db(db, get_restaurant_locations):
+                index.upsert(restaurant_id, lat, lng, bool(is_open))
+            _index, _built_at = index, monotonic()
+    return _index
+
+def index_restaurant(restaurant):
+    """Apply a restaurant write to the live index (no-op until it is first built)"""
+    if _index is None:
+        return
+    if restaurant.is_active and restaurant.latitude is not None and restaurant.longitude is not None:
+        _index.upsert(restaurant.id, restaurant.latitude, restaurant.longitude, bool(restaurant.is_open))
+    else:
+        _index.remove(restaurant.id)
+
+def remove_restaurant(restaurant_id: str):
+    if _index is not None:
+        _index.remove(restaurant_id)
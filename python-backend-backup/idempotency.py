@@ -0,0 +1,229 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from prometheus_client import Counter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Idempotency-Key support for non-idempotent POSTs (order placement): the first
+# request with a key runs, its 2xx response is stored for IDEMPOTENCY_TTL_SECONDS
+# and replayed to retries; duplicates arriving while it runs wait for its result.
+# Error responses are not stored, so a retry after a failure runs again.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "100000"))
+# When set, keys are shared through Redis so a retry landing on another worker
+# is deduplicated too; otherwise only retries reaching the same worker are
+IDEMPOTENCY_REDIS_URL = os.getenv("IDEMPOTENCY_REDIS_URL")
+# A claim is renewed every third of this while its request runs, however long that
+# takes (pool waits, statement timeouts); a claim whose worker died frees up after this long
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "30"))
+# How long a duplicate waits on another worker's in-flight request before a 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_POLL_SECONDS = 0.05
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+IDEMPOTENT_REQUESTS = Counter(
+    "idempotent_requests_total",
+    "Requests carrying an Idempotency-Key, by outcome",
+    ["result"],  # executed, replayed, coalesced, mismatch, busy
+)
+
+class LocalIdempotencyStore:
+    """In-process LRU; entries expire at their own deadline (claims sooner than results)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, raw = entry
+        if expires_at < monotonic():
+            del self._entries[key]
+            return None
+        return raw
+
+    def _put(self, key: str, raw: str, ttl: float):
+        self._entries[key] = (monotonic() + ttl, raw)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def claim(self, key: str, raw: str, ttl: float) -> bool:
+        if await self.get(key) is not None:
+            return False
+        self._put(key, raw, ttl)
+        return True
+
+    async def set(self, key: str, raw: str, ttl: float):
+        self._put(key, raw, ttl)
+
+    async def renew(self, key: str, raw: str, ttl: float) -> bool:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] != raw or entry[0] < monotonic():
+            return False
+        self._put(key, raw, ttl)
+        return True
+
+    async def release(self, key: str, raw: str):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] == raw:
+            del self._entries[key]
+
+    async def close(self):
+        pass
+
+class RedisIdempotencyStore:
+    """One string per key; the claim is SET NX and release only deletes our own claim"""
+
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+    _RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(f"idempotency:{key}")
+
+    async def claim(self, key: str, raw: str, ttl: float) -> bool:
+        return bool(await self._redis.set(f"idempotency:{key}", raw, nx=True, ex=max(int(ttl), 1)))
+
+    async def set(self, key: str, raw: str, ttl: float):
+        await self._redis.set(f"idempotency:{key}", raw, ex=max(int(ttl), 1))
+
+    async def renew(self, key: str, raw: str, ttl: float) -> bool:
+        return bool(await self._redis.eval(self._RENEW, 1, f"idempotency:{key}", raw, max(int(ttl * 1000), 1)))
+
+    async def release(self, key: str, raw: str):
+        await self._redis.eval(self._RELEASE, 1, f"idempotency:{key}", raw)
+
+    async def close(self):
+        await self._redis.close()
+
+if IDEMPOTENCY_REDIS_URL:
+    _store = RedisIdempotencyStore(IDEMPOTENCY_REDIS_URL)
+else:
+    _store = LocalIdempotencyStore(IDEMPOTENCY_MAX_ENTRIES)
+
+# store key -> (fingerprint, future of the stored body) for requests running on this worker.
+# The future resolves to None when the request failed without an HTTP error (retry it).
+_in_flight: Dict[str, tuple] = {}
+
+def fingerprint(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True).encode()).hexdigest()
+
+def replay(body: Any, result: str) -> JSONResponse:
+    IDEMPOTENT_REQUESTS.labels(result).inc()
+    return JSONResponse(content=body, headers={"Idempotent-Replayed": "true"})
+
+async def _keep_claimed(store_key: str, claim: str):
+    """Renew a claim until cancelled, so a slow request is never run twice"""
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_LOCK_SECONDS / 3)
+        try:
+            if not await _store.renew(store_key, claim, IDEMPOTENCY_LOCK_SECONDS):
+                logger.warning("Idempotency claim on %s was lost while its request ran", store_key)
+                return
+        except Exception:
+            logger.warning("Idempotency claim renewal failed for %s", store_key, exc_info=True)
+
+def _mismatch():
+    IDEMPOTENT_REQUESTS.labels("mismatch").inc()
+    return HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+
+async def run(key: Optional[str], scope: str, payload: Any, call: Callable[[], Awaitable[Any]]):
+    """Run call() at most once per (scope, key); scope should name the user and route.
+
+    payload is the request (body) the key is bound to; reusing a key with a
+    different payload is a 422. call() returns a JSON-able response body.
+    """
+    if key is None:
+        return await call()
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+
+    store_key = f"{scope}:{key}"
+    request_fingerprint = fingerprint(payload)
+    deadline = monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        running = _in_flight.get(store_key)
+        if running is not None:
+            running_fingerprint, future = running
+            if running_fingerprint != request_fingerprint:
+                raise _mismatch()
+            # An HTTP error from the original is raised here too: same request, same answer
+            body = await asyncio.shield(future)
+            if body is not None:
+                return replay(body, "coalesced")
+            continue
+
+        claim = json.dumps({"fingerprint": request_fingerprint, "claim": str(uuid.uuid4())})
+        try:
+            raw = await _store.get(store_key)
+            if raw is None and await _store.claim(store_key, claim, IDEMPOTENCY_LOCK_SECONDS):
+                break
+        except Exception:
+            logger.warning("Idempotency store unavailable; running request undeduplicated", exc_info=True)
+            return await call()
+        if raw is not None:
+            entry = json.loads(raw)
+            if entry["fingerprint"] != request_fingerprint:
+                raise _mismatch()
+            if "body" in entry:
+                return replay(entry["body"], "replayed")
+            # Claimed by a request still running on another worker
+            if monotonic() >= deadline:
+                IDEMPOTENT_REQUESTS.labels("busy").inc()
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[store_key] = (request_fingerprint, future)
+    renewer = asyncio.ensure_future(_keep_claimed(store_key, claim))
+    try:
+        IDEMPOTENT_REQUESTS.labels("executed").inc()
+        try:
+            body = jsonable_encoder(await call())
+        except HTTPException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved: waiters are optional
+            raise
+        finally:
+            renewer.cancel()
+        future.set_result(body)
+        try:
+            await _store.set(
+                store_key, json.dumps({"fingerprint": request_fingerprint, "body": body}), IDEMPOTENCY_TTL_SECONDS
+            )
+        except Exception:
+            # The work is done; only later retries lose their replay
+            logger.warning("Idempotency result store failed for %s", store_key, exc_info=True)
+        return body
+    finally:
+        if not future.done():
+            future.set_result(None)
+        if future.exception() is not None or future.result() is None:
+            try:
+                await _store.release(store_key, claim)
+            except Exception:
+                logger.warning("Idempotency claim release failed; it expires on its own", exc_info=True)
+        del _in_flight[store_key]
+
+async def close():
+    await _store.close()
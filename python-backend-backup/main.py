@@ -1,24 +1,52 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import datetime
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 import uvicorn
 
-from database import SessionLocal, engine, Base
+from database import engine, async_engine, Base, get_db, run_db
 from models import User, Restaurant, MenuItem, Order, OrderItem
 from schemas import (
-    UserCreate, UserResponse, Token, 
-    RestaurantCreate, RestaurantResponse, RestaurantUpdate,
-    MenuItemCreate, MenuItemResponse, MenuItemUpdate,
-    OrderCreate, OrderResponse, OrderUpdate
+    UserCreate, UserResponse, UserUpdate, Token, 
+    RestaurantCreate, RestaurantResponse, RestaurantUpdate, NearbyRestaurantResponse,
+    MenuItemCreate, MenuItemResponse, MenuItemUpdate, MenuImportResult,
+    OrderCreate, OrderResponse, OrderUpdate,
+    CartItemUpdate, CartItemResponse, CartResponse, CartCheckout,
+    ReviewCreate, ReviewUpdate, ReviewResponse,
+    RestaurantSearchHit, MenuItemSearchHit, SearchResponse,
+    SalesTotals, SalesBucket, SalesAnalyticsResponse, TopMenuItem
+)
+from pagination import decode_cursor, next_cursor
+import analytics
+import auth
+import carts
+import catalog_cache
+import menu_bulk
+import metrics
+import order_counters
+import order_events
+import order_export
+from query_profiling import QueryProfilingMiddleware
+import geo_index
+import idempotency
+import search_index
+from auth import (
+    authenticate_user, create_access_token, get_current_user, get_stream_user,
+    get_password_hash_async, invalidate_user_principal
 )
-from auth import authenticate_user, create_access_token, get_current_user, get_password_hash
 from crud import (
-    create_user, get_user_by_email, 
+    create_user, get_user_by_email, get_user, update_user,
     create_restaurant, get_restaurants, get_restaurant, update_restaurant, delete_restaurant,
+    get_restaurants_by_ids, get_nearby_restaurants_postgis, search_restaurants_postgres,
     create_menu_item, get_menu_items, get_menu_item, update_menu_item, delete_menu_item,
-    create_order, get_orders, get_order, update_order
+    get_menu_items_by_ids, search_menu_items_postgres, import_menu_items, get_menu_export_rows,
+    create_order, get_orders, get_order, update_order, ORDER_TRANSITIONS,
+    checkout_cart, create_review, get_review, get_reviews, update_review, delete_review
 )
 
 # Create all database tables
@@ -33,35 +61,84 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed", "ETag", "X-DB-Statements", "X-DB-Time-Ms", "X-DB-Slowest"],
 )
+app.add_middleware(QueryProfilingMiddleware)
+app.add_middleware(metrics.RequestMetricsMiddleware)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Streams also accept ?token= since EventSource and browser WebSockets cannot set headers
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-# Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@app.on_event("startup")
+async def start_background_writers():
+    carts.start()
+    order_counters.start()
+
+@app.on_event("startup")
+async def start_principal_invalidations():
+    auth.start_invalidation_listener()
+
+@app.on_event("shutdown")
+async def stop_background_writers():
+    # Persist cart changes still waiting for write-behind; runs before the engines are disposed
+    await carts.stop()
+    await order_counters.stop()
+
+@app.on_event("shutdown")
+async def dispose_engines():
+    # Close pooled connections so workers exit cleanly
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
+
+@app.on_event("shutdown")
+async def close_order_events():
+    await order_events.broker.close()
+
+@app.on_event("shutdown")
+async def close_idempotency_store():
+    await idempotency.close()
+
+@app.on_event("shutdown")
+async def close_principal_invalidations():
+    await auth.close()
+
+# Catalog cache entries are stored as response models, (de)serialized with these adapters
+restaurant_adapter = TypeAdapter(RestaurantResponse)
+restaurant_list_adapter = TypeAdapter(List[RestaurantResponse])
+menu_item_list_adapter = TypeAdapter(List[MenuItemResponse])
+
+# Keyset pagination: list endpoints return the next page's cursor in X-Next-Cursor
+def get_cursor(cursor: Optional[str] = None, skip: int = 0):
+    if cursor:
+        # A cursor already says where the page starts; an offset on top would skip rows
+        if skip:
+            raise HTTPException(status_code=400, detail="Pass either cursor or skip, not both")
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return cursor
 
 # Authentication endpoints
 @app.post("/register", response_model=UserResponse)
 async def register(user: UserCreate, db: Session = Depends(get_db)):
     """Register a new user"""
-    db_user = get_user_by_email(db, email=user.email)
+    db_user = await run_db(db, get_user_by_email, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=400,
             detail="Email already registered"
         )
     
-    return create_user(db=db, user=user)
+    hashed_password = await get_password_hash_async(user.password)
+    return await run_db(db, create_user, user=user, hashed_password=hashed_password)
 
 @app.post("/token", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Login and get access token"""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -76,6 +153,28 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
     """Get current user information"""
     return current_user
 
+@app.put("/users/{user_id}", response_model=UserResponse)
+async def update_user_endpoint(
+    user_id: str,
+    user_update: UserUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Update a user, including role and active status (admins only)"""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=403,
+            detail="Only admins can update users"
+        )
+    
+    user = await run_db(db, get_user, user_id=user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    user = await run_db(db, update_user, user_id=user_id, user_update=user_update)
+    await invalidate_user_principal(user.email)
+    return user
+
 # Restaurant endpoints
 @app.post("/restaurants", response_model=RestaurantResponse)
 async def create_restaurant_endpoint(
@@ -90,22 +189,78 @@ async def create_restaurant_endpoint(
             detail="Only sellers and admins can create restaurants"
         )
     
-    return create_restaurant(db=db, restaurant=restaurant, owner_id=current_user.id)
+    db_restaurant = await run_db(db, create_restaurant, restaurant=restaurant, owner_id=current_user.id)
+    await catalog_cache.invalidate(catalog_cache.RESTAURANT_LIST_NAMESPACE)
+    geo_index.index_restaurant(db_restaurant)
+    search_index.index_restaurant(db_restaurant)
+    return db_restaurant
 
 @app.get("/restaurants", response_model=List[RestaurantResponse])
 async def get_restaurants_endpoint(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     cuisine_type: Optional[str] = None,
+    cursor: Optional[str] = Depends(get_cursor),
     db: Session = Depends(get_db)
 ):
-    """Get all restaurants with optional filtering"""
-    return get_restaurants(db, skip=skip, limit=limit, cuisine_type=cuisine_type)
+    """Get all restaurants with optional filtering (pass X-Next-Cursor back as ?cursor= for the next page)"""
+    cache_field = f"{cuisine_type or ''}|{skip}|{limit}|{cursor or ''}"
+    async def load():
+        db_restaurants = await run_db(db, get_restaurants, skip=skip, limit=limit, cuisine_type=cuisine_type, cursor=cursor)
+        return restaurant_list_adapter.validate_python(db_restaurants)
+    
+    restaurants = await catalog_cache.get_or_load(
+        catalog_cache.RESTAURANT_LIST_NAMESPACE, cache_field, restaurant_list_adapter, load
+    )
+    page_cursor = next_cursor(restaurants, limit)
+    if page_cursor:
+        response.headers["X-Next-Cursor"] = page_cursor
+    return restaurants
+
+@app.get("/restaurants/nearby", response_model=List[NearbyRestaurantResponse])
+async def get_nearby_restaurants_endpoint(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5.0, gt=0, le=50),
+    limit: int = Query(20, ge=1, le=100),
+    open_only: bool = True,
+    db: Session = Depends(get_db)
+):
+    """Get restaurants within radius_km of a point, nearest first"""
+    if geo_index.GEO_BACKEND == "postgis":
+        rows = await run_db(
+            db, get_nearby_restaurants_postgis,
+            latitude=latitude, longitude=longitude, radius_km=radius_km, limit=limit, open_only=open_only
+        )
+    else:
+        index = await geo_index.ensure_index(db)
+        hits = index.nearby(latitude, longitude, radius_km, limit, open_only=open_only)
+        restaurants = {
+            restaurant.id: restaurant
+            for restaurant in await run_db(db, get_restaurants_by_ids, restaurant_ids=[rid for _, rid in hits])
+        }
+        # The index can trail writes made by other workers; the rows are authoritative
+        rows = [
+            (restaurants[rid], distance) for distance, rid in hits
+            if rid in restaurants and restaurants[rid].is_active and (restaurants[rid].is_open or not open_only)
+        ]
+    
+    return [
+        NearbyRestaurantResponse(**RestaurantResponse.model_validate(restaurant).model_dump(), distance_km=distance)
+        for restaurant, distance in rows
+    ]
 
 @app.get("/restaurants/{restaurant_id}", response_model=RestaurantResponse)
 async def get_restaurant_endpoint(restaurant_id: str, db: Session = Depends(get_db)):
     """Get a specific restaurant"""
-    restaurant = get_restaurant(db, restaurant_id=restaurant_id)
+    async def load():
+        db_restaurant = await run_db(db, get_restaurant, restaurant_id=restaurant_id)
+        return None if db_restaurant is None else restaurant_adapter.validate_python(db_restaurant)
+    
+    restaurant = await catalog_cache.get_or_load(
+        catalog_cache.restaurant_namespace(restaurant_id), "", restaurant_adapter, load
+    )
     if restaurant is None:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     return restaurant
@@ -118,7 +273,7 @@ async def update_restaurant_endpoint(
     db: Session = Depends(get_db)
 ):
     """Update a restaurant (owner or admin only)"""
-    restaurant = get_restaurant(db, restaurant_id=restaurant_id)
+    restaurant = await run_db(db, get_restaurant, restaurant_id=restaurant_id)
     if not restaurant:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
@@ -129,7 +284,12 @@ async def update_restaurant_endpoint(
             detail="You can only update your own restaurants"
         )
     
-    return update_restaurant(db=db, restaurant_id=restaurant_id, restaurant_update=restaurant_update)
+    was_active = restaurant.is_active
+    db_restaurant = await run_db(db, update_restaurant, restaurant_id=restaurant_id, restaurant_update=restaurant_update)
+    await catalog_cache.invalidate_restaurant(restaurant_id)
+    geo_index.index_restaurant(db_restaurant)
+    search_index.index_restaurant(db_restaurant, reactivated=db_restaurant.is_active and not was_active)
+    return db_restaurant
 
 @app.delete("/restaurants/{restaurant_id}")
 async def delete_restaurant_endpoint(
@@ -138,7 +298,7 @@ async def delete_restaurant_endpoint(
     db: Session = Depends(get_db)
 ):
     """Delete a restaurant (owner or admin only)"""
-    restaurant = get_restaurant(db, restaurant_id=restaurant_id)
+    restaurant = await run_db(db, get_restaurant, restaurant_id=restaurant_id)
     if not restaurant:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
@@ -149,7 +309,11 @@ async def delete_restaurant_endpoint(
             detail="You can only delete your own restaurants"
         )
     
-    delete_restaurant(db=db, restaurant_id=restaurant_id)
+    await run_db(db, delete_restaurant, restaurant_id=restaurant_id)
+    await catalog_cache.invalidate_restaurant(restaurant_id)
+    await catalog_cache.invalidate_menu(restaurant_id)
+    geo_index.remove_restaurant(restaurant_id)
+    search_index.remove_restaurant(restaurant_id)
     return {"message": "Restaurant deleted successfully"}
 
 @app.get("/my-restaurants", response_model=List[RestaurantResponse])
@@ -164,7 +328,7 @@ async def get_my_restaurants(
             detail="Only sellers and admins can access this endpoint"
         )
     
-    return get_restaurants(db, owner_id=current_user.id)
+    return await run_db(db, get_restaurants, owner_id=current_user.id)
 
 # Menu Item endpoints
 @app.post("/restaurants/{restaurant_id}/menu-items", response_model=MenuItemResponse)
@@ -175,7 +339,7 @@ async def create_menu_item_endpoint(
     db: Session = Depends(get_db)
 ):
     """Create a menu item for a restaurant"""
-    restaurant = get_restaurant(db, restaurant_id=restaurant_id)
+    restaurant = await run_db(db, get_restaurant, restaurant_id=restaurant_id)
     if not restaurant:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
@@ -186,16 +350,99 @@ async def create_menu_item_endpoint(
             detail="You can only add menu items to your own restaurants"
         )
     
-    return create_menu_item(db=db, menu_item=menu_item, restaurant_id=restaurant_id)
+    db_menu_item = await run_db(db, create_menu_item, menu_item=menu_item, restaurant_id=restaurant_id)
+    await catalog_cache.invalidate_menu(restaurant_id)
+    search_index.index_menu_item(db_menu_item)
+    return db_menu_item
 
 @app.get("/restaurants/{restaurant_id}/menu-items", response_model=List[MenuItemResponse])
 async def get_menu_items_endpoint(
     restaurant_id: str,
     category: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Get menu items for a restaurant (served pre-encoded; If-None-Match with the ETag gives a 304)"""
+    async def load():
+        db_menu_items = await run_db(db, get_menu_items, restaurant_id=restaurant_id, category=category)
+        return catalog_cache.encode_response(
+            menu_item_list_adapter.dump_json(menu_item_list_adapter.validate_python(db_menu_items))
+        )
+    
+    etag, body = await catalog_cache.get_or_load(
+        catalog_cache.menu_namespace(restaurant_id), category or "", catalog_cache.encoded_response_adapter, load
+    )
+    # no-cache: clients may keep the menu but revalidate it, which costs a 304 when unchanged
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if catalog_cache.not_modified(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.post("/restaurants/{restaurant_id}/menu-items/import", response_model=MenuImportResult)
+async def import_menu_items_endpoint(
+    restaurant_id: str,
+    request: Request,
+    prune: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create or update a whole menu from a JSON array, NDJSON or CSV body (by Content-Type)"""
+    restaurant = await run_db(db, get_restaurant, restaurant_id=restaurant_id)
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    
+    if current_user.role != "admin" and restaurant.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=403,
+            detail="You can only import menu items to your own restaurants"
+        )
+    
+    # Validated in full before anything is written: the import applies entirely or not at all
+    try:
+        items, errors = await menu_bulk.read_items(
+            request.stream(), menu_bulk.body_format(request.headers.get("content-type", ""))
+        )
+    except menu_bulk.TooManyItems as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+    
+    inserts, updates, pruned_ids = await run_db(
+        db, import_menu_items, restaurant_id=restaurant_id, items=items, prune=prune,
+        batch_size=menu_bulk.MENU_IMPORT_BATCH_SIZE
+    )
+    await catalog_cache.invalidate_menu(restaurant_id)
+    search_index.index_menu_items(inserts + updates)
+    for item_id in pruned_ids:
+        search_index.remove_menu_item(item_id)
+    return MenuImportResult(created=len(inserts), updated=len(updates), unavailable=len(pruned_ids))
+
+@app.get("/restaurants/{restaurant_id}/menu-items/export")
+async def export_menu_items_endpoint(
+    restaurant_id: str,
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+    current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get menu items for a restaurant"""
-    return get_menu_items(db, restaurant_id=restaurant_id, category=category)
+    """Stream a restaurant's full menu, unavailable items included, in an importable format"""
+    restaurant = await run_db(db, get_restaurant, restaurant_id=restaurant_id)
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    
+    if current_user.role != "admin" and restaurant.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=403,
+            detail="You can only export menus of your own restaurants"
+        )
+    
+    rows = await run_db(db, get_menu_export_rows, restaurant_id=restaurant_id)
+    return StreamingResponse(
+        menu_bulk.encode_export(rows, format),
+        media_type=menu_bulk.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="menu-{restaurant_id}.{format}"'},
+    )
 
 @app.put("/menu-items/{item_id}", response_model=MenuItemResponse)
 async def update_menu_item_endpoint(
@@ -205,19 +452,22 @@ async def update_menu_item_endpoint(
     db: Session = Depends(get_db)
 ):
     """Update a menu item"""
-    menu_item = get_menu_item(db, item_id=item_id)
+    menu_item = await run_db(db, get_menu_item, item_id=item_id)
     if not menu_item:
         raise HTTPException(status_code=404, detail="Menu item not found")
     
     # Check if user owns the restaurant or is admin
-    restaurant = get_restaurant(db, restaurant_id=menu_item.restaurant_id)
+    restaurant = await run_db(db, get_restaurant, restaurant_id=menu_item.restaurant_id)
     if current_user.role != "admin" and restaurant.owner_id != current_user.id:
         raise HTTPException(
             status_code=403,
             detail="You can only update menu items from your own restaurants"
         )
     
-    return update_menu_item(db=db, item_id=item_id, menu_item_update=menu_item_update)
+    db_menu_item = await run_db(db, update_menu_item, item_id=item_id, menu_item_update=menu_item_update)
+    await catalog_cache.invalidate_menu(menu_item.restaurant_id)
+    search_index.index_menu_item(db_menu_item)
+    return db_menu_item
 
 @app.delete("/menu-items/{item_id}")
 async def delete_menu_item_endpoint(
@@ -226,47 +476,371 @@ async def delete_menu_item_endpoint(
     db: Session = Depends(get_db)
 ):
     """Delete a menu item"""
-    menu_item = get_menu_item(db, item_id=item_id)
+    menu_item = await run_db(db, get_menu_item, item_id=item_id)
     if not menu_item:
         raise HTTPException(status_code=404, detail="Menu item not found")
     
     # Check if user owns the restaurant or is admin
-    restaurant = get_restaurant(db, restaurant_id=menu_item.restaurant_id)
+    restaurant = await run_db(db, get_restaurant, restaurant_id=menu_item.restaurant_id)
     if current_user.role != "admin" and restaurant.owner_id != current_user.id:
         raise HTTPException(
             status_code=403,
             detail="You can only delete menu items from your own restaurants"
         )
     
-    delete_menu_item(db=db, item_id=item_id)
+    await run_db(db, delete_menu_item, item_id=item_id)
+    await catalog_cache.invalidate_menu(menu_item.restaurant_id)
+    search_index.remove_menu_item(item_id)
     return {"message": "Menu item deleted successfully"}
 
+# Search endpoints
+@app.get("/search", response_model=SearchResponse)
+async def search_endpoint(
+    q: str = Query(..., min_length=1, max_length=200),
+    vegetarian: Optional[bool] = None,
+    vegan: Optional[bool] = None,
+    gluten_free: Optional[bool] = None,
+    max_spice_level: Optional[int] = Query(None, ge=0, le=5),
+    min_spice_level: Optional[int] = Query(None, ge=0, le=5),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Ranked full-text search over restaurants and menu items, with dietary filters on menu items"""
+    filters = dict(vegetarian=vegetarian, vegan=vegan, gluten_free=gluten_free,
+                   max_spice_level=max_spice_level, min_spice_level=min_spice_level)
+    
+    if search_index.SEARCH_BACKEND == "postgres":
+        restaurant_rows = await run_db(db, search_restaurants_postgres, text=q, limit=limit)
+        menu_item_rows = await run_db(db, search_menu_items_postgres, text=q, limit=limit, **filters)
+    else:
+        index = await search_index.ensure_index(db)
+        restaurant_hits = index.restaurants.search(q, limit)
+        menu_item_hits = index.menu_items.search(q, limit, accept=search_index.menu_item_filter(**filters))
+        restaurants = {
+            restaurant.id: restaurant
+            for restaurant in await run_db(db, get_restaurants_by_ids, restaurant_ids=[rid for _, rid in restaurant_hits])
+        }
+        menu_items = {
+            menu_item.id: menu_item
+            for menu_item in await run_db(db, get_menu_items_by_ids, item_ids=[mid for _, mid in menu_item_hits],
+                                          active_restaurants_only=True)
+        }
+        # The index can trail writes made by other workers; the rows are authoritative
+        restaurant_rows = [(restaurants[rid], score) for score, rid in restaurant_hits
+                           if rid in restaurants and restaurants[rid].is_active]
+        menu_item_rows = [(menu_items[mid], score) for score, mid in menu_item_hits
+                          if mid in menu_items and menu_items[mid].is_available]
+    
+    return SearchResponse(
+        restaurants=[RestaurantSearchHit(score=score, restaurant=RestaurantResponse.model_validate(restaurant))
+                     for restaurant, score in restaurant_rows],
+        menu_items=[MenuItemSearchHit(score=score, menu_item=MenuItemResponse.model_validate(menu_item))
+                    for menu_item, score in menu_item_rows],
+    )
+
+# Review endpoints
+def check_rating(rating: Optional[int]):
+    if rating is not None and not 1 <= rating <= 5:
+        raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
+
+async def invalidate_rating(restaurant_id: str):
+    # Only the restaurant's own entry: list pages pick the new rating up within their
+    # TTL rather than every review flushing all of them
+    await catalog_cache.invalidate(catalog_cache.restaurant_namespace(restaurant_id))
+
+@app.post("/restaurants/{restaurant_id}/reviews", response_model=ReviewResponse)
+async def create_review_endpoint(
+    restaurant_id: str,
+    review: ReviewCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Review a restaurant (customers only, one review per restaurant)"""
+    if current_user.role != "customer":
+        raise HTTPException(status_code=403, detail="Only customers can review restaurants")
+    check_rating(review.rating)
+    
+    restaurant = await run_db(db, get_restaurant, restaurant_id=restaurant_id)
+    if not restaurant or not restaurant.is_active:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    
+    db_review = await run_db(db, create_review, review=review, restaurant_id=restaurant_id, customer_id=current_user.id)
+    if not db_review:
+        raise HTTPException(status_code=409, detail="You have already reviewed this restaurant")
+    await invalidate_rating(restaurant_id)
+    return db_review
+
+@app.get("/restaurants/{restaurant_id}/reviews", response_model=List[ReviewResponse])
+async def get_reviews_endpoint(
+    restaurant_id: str,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = Depends(get_cursor),
+    db: Session = Depends(get_db)
+):
+    """Get a restaurant's reviews, newest first"""
+    reviews = await run_db(db, get_reviews, restaurant_id=restaurant_id, skip=skip, limit=limit, cursor=cursor)
+    page_cursor = next_cursor(reviews, limit)
+    if page_cursor:
+        response.headers["X-Next-Cursor"] = page_cursor
+    return reviews
+
+@app.put("/reviews/{review_id}", response_model=ReviewResponse)
+async def update_review_endpoint(
+    review_id: str,
+    review_update: ReviewUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Update your review"""
+    check_rating(review_update.rating)
+    review = await run_db(db, get_review, review_id=review_id)
+    if not review:
+        raise HTTPException(status_code=404, detail="Review not found")
+    if review.customer_id != current_user.id:
+        raise HTTPException(status_code=403, detail="You can only update your own reviews")
+    
+    restaurant_id = review.restaurant_id  # review is expired once the update commits
+    updated_review = await run_db(
+        db, update_review, review_id=review_id, review_update=review_update, expected_rating=review.rating
+    )
+    if not updated_review:
+        raise HTTPException(status_code=409, detail="Review changed concurrently; refetch and retry")
+    await invalidate_rating(restaurant_id)
+    return updated_review
+
+@app.delete("/reviews/{review_id}")
+async def delete_review_endpoint(
+    review_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Delete a review (its author or an admin)"""
+    review = await run_db(db, get_review, review_id=review_id)
+    if not review:
+        raise HTTPException(status_code=404, detail="Review not found")
+    if current_user.role != "admin" and review.customer_id != current_user.id:
+        raise HTTPException(status_code=403, detail="You can only delete your own reviews")
+    
+    restaurant_id = review.restaurant_id
+    if not await run_db(db, delete_review, review_id=review_id):
+        raise HTTPException(status_code=404, detail="Review not found")
+    await invalidate_rating(restaurant_id)
+    return {"message": "Review deleted successfully"}
+
+# Cart endpoints (carts.py serves the cart; cart_items is written behind)
+def cart_response(cart: dict) -> CartResponse:
+    items = [
+        CartItemResponse(**line, total_price=line["unit_price"] * line["quantity"])
+        for line in cart["items"]
+    ]
+    return CartResponse(
+        restaurant_id=cart["restaurant_id"], items=items, subtotal=sum(item.total_price for item in items)
+    )
+
+@app.get("/cart", response_model=CartResponse)
+async def get_cart_endpoint(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Get the current user's cart"""
+    return cart_response(await carts.load(db, current_user.id))
+
+@app.put("/cart/items/{menu_item_id}", response_model=CartResponse)
+async def set_cart_item_endpoint(
+    menu_item_id: str,
+    cart_item: CartItemUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Set a menu item's quantity in the cart (0 removes it)"""
+    if not 0 <= cart_item.quantity <= carts.CART_MAX_QUANTITY:
+        raise HTTPException(status_code=400, detail=f"Quantity must be between 0 and {carts.CART_MAX_QUANTITY}")
+    
+    cart = await carts.load(db, current_user.id)
+    lines = [line for line in cart["items"] if line["menu_item_id"] != menu_item_id]
+    if cart_item.quantity == 0:
+        cart["items"] = lines
+        await carts.save(current_user.id, cart)
+        return cart_response(cart)
+    
+    menu_item = await run_db(db, get_menu_item, item_id=menu_item_id)
+    if not menu_item:
+        raise HTTPException(status_code=404, detail="Menu item not found")
+    if not menu_item.is_available:
+        raise HTTPException(status_code=409, detail="Menu item is not available")
+    if lines and cart["restaurant_id"] != menu_item.restaurant_id:
+        raise HTTPException(
+            status_code=409, detail="The cart holds items from another restaurant; clear it first"
+        )
+    
+    line = {
+        "menu_item_id": menu_item_id, "name": menu_item.name, "unit_price": menu_item.price,
+        "quantity": cart_item.quantity, "special_instructions": cart_item.special_instructions,
+    }
+    # Keep the line's position when it is only being changed
+    position = next((i for i, l in enumerate(cart["items"]) if l["menu_item_id"] == menu_item_id), len(lines))
+    lines.insert(position, line)
+    if len(lines) > carts.CART_MAX_LINES:
+        raise HTTPException(status_code=400, detail=f"A cart is limited to {carts.CART_MAX_LINES} items")
+    cart["restaurant_id"] = menu_item.restaurant_id
+    cart["items"] = lines
+    await carts.save(current_user.id, cart)
+    return cart_response(cart)
+
+@app.delete("/cart/items/{menu_item_id}", response_model=CartResponse)
+async def delete_cart_item_endpoint(
+    menu_item_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Remove a menu item from the cart"""
+    cart = await carts.load(db, current_user.id)
+    cart["items"] = [line for line in cart["items"] if line["menu_item_id"] != menu_item_id]
+    await carts.save(current_user.id, cart)
+    return cart_response(cart)
+
+@app.delete("/cart", response_model=CartResponse)
+async def clear_cart_endpoint(current_user: User = Depends(get_current_user)):
+    """Empty the cart"""
+    cart = carts.empty_cart()
+    await carts.save(current_user.id, cart)
+    return cart_response(cart)
+
+@app.post("/cart/checkout", response_model=OrderResponse)
+async def checkout_cart_endpoint(
+    checkout: CartCheckout,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Place an order for the cart; 409 with the changes if prices or availability moved"""
+    async def place_order():
+        cart = await carts.load(db, current_user.id)
+        if not cart["items"]:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+        
+        with metrics.CHECKOUT_SECONDS.time():
+            db_order, changes = await run_db(
+                db, checkout_cart, cart=cart, customer_id=current_user.id, checkout=checkout
+            )
+        if changes:
+            # Reprice the cart so the client can show what changed and confirm again
+            changed = {change["menu_item_id"]: change for change in changes}
+            lines = []
+            for line in cart["items"]:
+                change = changed.get(line["menu_item_id"])
+                if change is None:
+                    lines.append(line)
+                elif change["available"]:
+                    lines.append({**line, "unit_price": change["unit_price"]})
+            cart["items"] = lines
+            await carts.save(current_user.id, cart)
+            raise HTTPException(
+                status_code=409, detail={"message": "Cart prices or availability changed", "changes": changes}
+            )
+        
+        metrics.record_order_created(db_order.restaurant_id, db_order.total_amount)
+        await order_events.publish_status(db_order)
+        await carts.save(current_user.id, carts.empty_cart())
+        return OrderResponse.model_validate(db_order)
+    
+    return await idempotency.run(idempotency_key, f"{current_user.id}:POST /cart/checkout", checkout, place_order)
+
 # Order endpoints
 @app.post("/orders", response_model=OrderResponse)
 async def create_order_endpoint(
     order: OrderCreate,
+    idempotency_key: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Create a new order"""
-    return create_order(db=db, order=order, customer_id=current_user.id)
+    """Create a new order (a retry with the same Idempotency-Key gets the original order back)"""
+    async def place_order():
+        with metrics.CHECKOUT_SECONDS.time():
+            db_order = await run_db(db, create_order, order=order, customer_id=current_user.id)
+        if not db_order:
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+        metrics.record_order_created(db_order.restaurant_id, db_order.total_amount)
+        await order_events.publish_status(db_order)
+        return OrderResponse.model_validate(db_order)
+    
+    return await idempotency.run(idempotency_key, f"{current_user.id}:POST /orders", order, place_order)
 
 @app.get("/orders", response_model=List[OrderResponse])
 async def get_orders_endpoint(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     status: Optional[str] = None,
+    cursor: Optional[str] = Depends(get_cursor),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get orders (customers see their own, sellers see their restaurant orders, admins see all)"""
     if current_user.role == "customer":
-        return get_orders(db, customer_id=current_user.id, skip=skip, limit=limit, status=status)
+        orders = await run_db(db, get_orders, customer_id=current_user.id, skip=skip, limit=limit, status=status, cursor=cursor)
     elif current_user.role == "seller":
         # Get orders for seller's restaurants
-        return get_orders(db, seller_id=current_user.id, skip=skip, limit=limit, status=status)
+        orders = await run_db(db, get_orders, seller_id=current_user.id, skip=skip, limit=limit, status=status, cursor=cursor)
     else:  # admin
-        return get_orders(db, skip=skip, limit=limit, status=status)
+        orders = await run_db(db, get_orders, skip=skip, limit=limit, status=status, cursor=cursor)
+    
+    page_cursor = next_cursor(orders, limit)
+    if page_cursor:
+        response.headers["X-Next-Cursor"] = page_cursor
+    return orders
+
+@app.get("/orders/export")
+async def export_orders_endpoint(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    restaurant_id: Optional[str] = None,
+    status: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream orders created in [start, end) as NDJSON or CSV (sellers get their restaurants' orders, admins all)"""
+    if current_user.role == "customer":
+        raise HTTPException(status_code=403, detail="Customers cannot export orders")
+    seller_id = current_user.id if current_user.role == "seller" else None
+    
+    slot = order_export.check_capacity()
+    return order_export.ExportResponse(
+        order_export.stream_export(
+            format, start=start, end=end, restaurant_id=restaurant_id, status=status, seller_id=seller_id
+        ),
+        slot=slot,
+        media_type=order_export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'},
+    )
+
+@app.get("/orders/events")
+async def order_events_endpoint(
+    order_id: Optional[str] = None,
+    token: Optional[str] = None,
+    bearer: Optional[str] = Depends(optional_oauth2_scheme)
+):
+    """Server-sent order status updates for the orders the caller may see"""
+    if not (bearer or token):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user = await get_stream_user(bearer or token)
+    subscription = order_events.broker.subscribe(order_events.subscription_key(user), order_id)
+    return StreamingResponse(
+        order_events.sse_stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/ws/orders")
+async def order_events_websocket(websocket: WebSocket, token: str, order_id: Optional[str] = None):
+    """WebSocket order status updates for the orders the caller may see"""
+    try:
+        user = await get_stream_user(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscription = order_events.broker.subscribe(order_events.subscription_key(user), order_id)
+    await order_events.websocket_stream(websocket, subscription)
 
 @app.get("/orders/{order_id}", response_model=OrderResponse)
 async def get_order_endpoint(
@@ -275,7 +849,7 @@ async def get_order_endpoint(
     db: Session = Depends(get_db)
 ):
     """Get a specific order"""
-    order = get_order(db, order_id=order_id)
+    order = await run_db(db, get_order, order_id=order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -283,8 +857,7 @@ async def get_order_endpoint(
     if current_user.role == "customer" and order.customer_id != current_user.id:
         raise HTTPException(status_code=403, detail="You can only view your own orders")
     elif current_user.role == "seller":
-        restaurant = get_restaurant(db, restaurant_id=order.restaurant_id)
-        if restaurant.owner_id != current_user.id:
+        if order.restaurant.owner_id != current_user.id:
             raise HTTPException(status_code=403, detail="You can only view orders for your restaurants")
     
     return order
@@ -299,18 +872,104 @@ async def update_order_endpoint(
     """Update order status (sellers and admins only)"""
     if current_user.role == "customer":
         raise HTTPException(status_code=403, detail="Customers cannot update order status")
+    if order_update.status is not None and order_update.status not in ORDER_TRANSITIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown order status: {order_update.status}")
     
-    order = get_order(db, order_id=order_id)
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    # Check if seller owns the restaurant
-    if current_user.role == "seller":
-        restaurant = get_restaurant(db, restaurant_id=order.restaurant_id)
-        if restaurant.owner_id != current_user.id:
+    # Ownership and the allowed predecessor statuses are part of the UPDATE itself
+    owner_id = current_user.id if current_user.role == "seller" else None
+    updated_order, previous_status = await run_db(
+        db, update_order, order_id=order_id, order_update=order_update, owner_id=owner_id
+    )
+    if not updated_order:
+        # Nothing qualified: read the order back only to report why
+        order = await run_db(db, get_order, order_id=order_id, profile="ownership")
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        if owner_id is not None and order.restaurant.owner_id != owner_id:
             raise HTTPException(status_code=403, detail="You can only update orders for your restaurants")
+        raise HTTPException(
+            status_code=409, detail=f"Cannot move order from {order.status} to {order_update.status}"
+        )
+    await order_events.publish_status(updated_order, previous_status)
+    return updated_order
+
+# Analytics endpoints (served from the sales rollups in analytics.py)
+ANALYTICS_MAX_BUCKETS = {"hour": 24 * 31, "day": 366}
+
+async def analytics_scope(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    restaurant_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> dict:
+    """Validated range and restaurant filter (sellers: only their restaurants) for analytics queries"""
+    if current_user.role == "customer":
+        raise HTTPException(status_code=403, detail="Customers cannot view analytics")
+    if restaurant_id and current_user.role == "seller":
+        restaurant = await run_db(db, get_restaurant, restaurant_id=restaurant_id)
+        if not restaurant:
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+        if restaurant.owner_id != current_user.id:
+            raise HTTPException(status_code=403, detail="You can only view analytics for your own restaurants")
+    
+    step = analytics.GRANULARITIES[granularity]
+    end = analytics.bucket_end(end or datetime.utcnow(), granularity)
+    start = analytics.bucket_start(start, granularity) if start else end - step * (7 if granularity == "day" else 24)
+    if start >= end or (end - start) / step > ANALYTICS_MAX_BUCKETS[granularity]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range must cover 1 to {ANALYTICS_MAX_BUCKETS[granularity]} {granularity} buckets"
+        )
+    return {
+        "granularity": granularity, "start": start, "end": end, "restaurant_id": restaurant_id,
+        "owner_id": current_user.id if current_user.role == "seller" and not restaurant_id else None,
+    }
+
+def sales_totals(orders: int, cancelled_orders: int, delivered_orders: int, revenue: float) -> dict:
+    kept = orders - cancelled_orders
+    return {
+        "orders": orders, "cancelled_orders": cancelled_orders, "delivered_orders": delivered_orders,
+        "revenue": round(revenue, 2), "average_ticket": round(revenue / kept, 2) if kept > 0 else 0.0,
+    }
+
+@app.get("/analytics/sales", response_model=SalesAnalyticsResponse)
+async def sales_analytics_endpoint(scope: dict = Depends(analytics_scope), db: Session = Depends(get_db)):
+    """Revenue, order counts and average ticket per hour / day bucket (UTC)"""
+    rows = {row.bucket_start: row for row in await run_db(db, analytics.get_sales, **scope)}
+    
+    # Dense series for charts: buckets without orders are reported as zeros
+    buckets, totals = [], [0, 0, 0, 0.0]
+    step = analytics.GRANULARITIES[scope["granularity"]]
+    bucket = scope["start"]
+    while bucket < scope["end"]:
+        row = rows.get(bucket)
+        counters = [row.orders, row.cancelled_orders, row.delivered_orders, row.revenue] if row else [0, 0, 0, 0.0]
+        totals = [total + counter for total, counter in zip(totals, counters)]
+        buckets.append(SalesBucket(bucket_start=bucket, **sales_totals(*counters)))
+        bucket += step
     
-    return update_order(db=db, order_id=order_id, order_update=order_update)
+    return SalesAnalyticsResponse(
+        granularity=scope["granularity"], start=scope["start"], end=scope["end"],
+        totals=SalesTotals(**sales_totals(*totals)), buckets=buckets
+    )
+
+@app.get("/analytics/top-menu-items", response_model=List[TopMenuItem])
+async def top_menu_items_endpoint(
+    limit: int = Query(10, ge=1, le=100),
+    scope: dict = Depends(analytics_scope),
+    db: Session = Depends(get_db)
+):
+    """Best-selling menu items by revenue over the range"""
+    rows = await run_db(db, analytics.get_top_menu_items, limit=limit, **scope)
+    return [TopMenuItem(**row._mapping) for row in rows]
+
+# Metrics endpoint
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics (requests, orders, caches, connection pool, per-request SQL)"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -0,0 +1,190 @@
+import codecs
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, Dict, Iterable, List, Tuple
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+
+from schemas import MenuItemBase, MenuItemImport
+
+load_dotenv()
+
+# Bulk menu import / export: a menu arrives as a JSON array, NDJSON or CSV body,
+# is validated as a whole, then upserted in batches in one transaction (crud.import_menu_items).
+
+# Largest menu one import may carry
+MENU_IMPORT_MAX_ITEMS = int(os.getenv("MENU_IMPORT_MAX_ITEMS", "5000"))
+# Largest JSON array body, which is parsed whole; NDJSON and CSV stream and are only
+# bounded by MENU_IMPORT_MAX_ITEMS
+MENU_IMPORT_MAX_JSON_BYTES = int(os.getenv("MENU_IMPORT_MAX_JSON_BYTES", str(10 * 1024 * 1024)))
+# Rows per INSERT / UPDATE executemany
+MENU_IMPORT_BATCH_SIZE = int(os.getenv("MENU_IMPORT_BATCH_SIZE", "500"))
+# Validation errors reported back; any error rejects the whole import
+MENU_IMPORT_MAX_ERRORS = 50
+# Rows encoded per chunk of a streamed export
+EXPORT_CHUNK_ROWS = 500
+
+# Export columns, in order; an export can be edited and imported back as is
+EXPORT_FIELDS = ["id", *MenuItemBase.model_fields, "sort_order"]
+
+FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+class TooManyItems(ValueError):
+    pass
+
+class BodyTooLarge(TooManyItems):
+    pass
+
+def body_format(content_type: str) -> str:
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type == "text/csv":
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/jsonl", "application/json-seq"):
+        return "ndjson"
+    return "json"
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # utf-8-sig drops the byte order mark spreadsheet tools put in front of CSV
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+async def _ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict]:
+    line_number = 0
+    async for line in _lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {line_number}: invalid JSON")
+
+async def _csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict]:
+    header = None
+    record = ""
+    async for line in _lines(chunks):
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue  # newline inside a quoted field; the record goes on
+        values = next(csv.reader([record]), [])
+        record = ""
+        if not any(values):
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) > len(header):
+            raise ValueError(f"CSV row has {len(values)} fields but the header has {len(header)}")
+        # Empty cells mean "not given", so optional columns fall back to their defaults
+        yield {name: value for name, value in zip(header, values) if value != ""}
+    if record:
+        raise ValueError("CSV ends inside a quoted field")
+
+async def _json_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict]:
+    # A JSON array has to be parsed whole; NDJSON and CSV bodies are parsed as they arrive
+    body = bytearray()
+    async for chunk in chunks:
+        body += chunk
+        if len(body) > MENU_IMPORT_MAX_JSON_BYTES:
+            raise BodyTooLarge(
+                f"A JSON menu import is limited to {MENU_IMPORT_MAX_JSON_BYTES} bytes; send NDJSON or CSV instead"
+            )
+    try:
+        rows = json.loads(body) if body else []
+    except ValueError:
+        raise ValueError("Invalid JSON body")
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of menu items")
+    for row in rows:
+        yield row
+
+_PARSERS = {"json": _json_rows, "ndjson": _ndjson_rows, "csv": _csv_rows}
+
+async def read_items(chunks: AsyncIterator[bytes], import_format: str) -> Tuple[List[MenuItemImport], List[Dict]]:
+    """Parse and validate a whole import in one pass: (items, errors).
+
+    Raises ValueError for a malformed body, TooManyItems past MENU_IMPORT_MAX_ITEMS
+    and BodyTooLarge (a TooManyItems) for a JSON array past MENU_IMPORT_MAX_JSON_BYTES.
+    Errors carry the 1-based row (item position) they refer to.
+    """
+    items, errors, seen = [], [], {}
+    row_number = 0
+    async for row in _PARSERS[import_format](chunks):
+        row_number += 1
+        if row_number > MENU_IMPORT_MAX_ITEMS:
+            raise TooManyItems(f"A menu import is limited to {MENU_IMPORT_MAX_ITEMS} items")
+        if len(errors) >= MENU_IMPORT_MAX_ERRORS:
+            continue
+        if not isinstance(row, dict):
+            errors.append({"row": row_number, "errors": ["Expected an object"]})
+            continue
+        try:
+            item = MenuItemImport.model_validate(row)
+        except ValidationError as e:
+            errors.append({
+                "row": row_number,
+                "errors": [f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()],
+            })
+            continue
+        # Rows are matched to existing items by id, else by (category, name); a key
+        # given twice would make the result depend on row order
+        key = item.id or (item.category, item.name)
+        if key in seen:
+            errors.append({"row": row_number, "errors": [f"Duplicate of row {seen[key]}"]})
+            continue
+        seen[key] = row_number
+        items.append(item)
+    return items, errors
+
+def encode_export(rows: Iterable, export_format: str) -> Iterable[str]:
+    """Stream menu item rows (mappings of EXPORT_FIELDS) as JSON, NDJSON or CSV chunks"""
+    rows = iter(rows)
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(["" if row[field] is None else row[field] for field in EXPORT_FIELDS])
+            if count % EXPORT_CHUNK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+        return
+
+    encode = lambda row: json.dumps({field: row[field] for field in EXPORT_FIELDS})
+    if export_format == "ndjson":
+        chunk = []
+        for row in rows:
+            chunk.append(encode(row) + "\n")
+            if len(chunk) == EXPORT_CHUNK_ROWS:
+                yield "".join(chunk)
+                chunk = []
+        yield "".join(chunk)
+        return
+
+    separator = "["
+    chunk = []
+    for row in rows:
+        chunk.append(separator + encode(row))
+        separator = ","
+        if len(chunk) == EXPORT_CHUNK_ROWS:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("[]" if separator == "[" else "]")
+    yield "".join(chunk)
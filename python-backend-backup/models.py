@@ -1,10 +1,9 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, Text, ForeignKey, JSON
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, Text, ForeignKey, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
 
-Base = declarative_base()
+from database import Base
 
 class User(Base):
     __tablename__ = "users"
@@ -51,9 +50,11 @@ class Restaurant(Base):
     is_active = Column(Boolean, default=True)
     is_open = Column(Boolean, default=False)
     
-    # Ratings and stats
+    # Ratings and stats; rating_sum and total_reviews are running totals kept by
+    # reviews.apply_rating_delta, and average_rating is derived from them
     average_rating = Column(Float, default=0.0)
     total_reviews = Column(Integer, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
     total_orders = Column(Integer, default=0)
     
     # Delivery info
@@ -161,4 +162,78 @@ class OrderItem(Base):
     
     # Relationships
     order = relationship("Order", back_populates="order_items")
-    menu_item = relationship("MenuItem", back_populates="order_items")
\ No newline at end of file
+    menu_item = relationship("MenuItem", back_populates="order_items")
+
+class CartItem(Base):
+    """Persisted cart line; carts are served from carts.py's hot store and written here in batches"""
+    __tablename__ = "cart_items"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    menu_item_id = Column(String, ForeignKey("menu_items.id"), nullable=False)
+    quantity = Column(Integer, nullable=False, default=1)
+    customizations = Column(JSON)
+    special_instructions = Column(Text)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class RestaurantReview(Base):
+    __tablename__ = "restaurant_reviews"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    restaurant_id = Column(String, ForeignKey("restaurants.id"), nullable=False)
+    customer_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    order_id = Column(String, ForeignKey("orders.id"))
+    
+    rating = Column(Integer, nullable=False)  # 1-5
+    review_text = Column(Text)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    __table_args__ = (
+        # One review per customer per restaurant
+        UniqueConstraint("restaurant_id", "customer_id"),
+        # A restaurant's reviews, newest first (keyset pagination)
+        Index("idx_restaurant_reviews_restaurant_id", "restaurant_id", "created_at"),
+    )
+
+# Order counter shards (see order_counters.py): checkouts bump one random shard,
+# and the shards are periodically folded into restaurants.total_orders
+class RestaurantOrderCountShard(Base):
+    __tablename__ = "restaurant_order_count_shards"
+    
+    restaurant_id = Column(String, ForeignKey("restaurants.id"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)  # not yet folded into total_orders
+
+# Sales rollups (see analytics.py): counters per UTC hour / day bucket, updated in
+# the same transaction as the order writes
+class RestaurantSalesRollup(Base):
+    __tablename__ = "restaurant_sales_rollups"
+    
+    restaurant_id = Column(String, ForeignKey("restaurants.id"), primary_key=True)
+    granularity = Column(String, primary_key=True)  # hour, day
+    bucket_start = Column(DateTime, primary_key=True)  # naive UTC
+    
+    orders = Column(Integer, nullable=False, default=0)  # placed, cancelled ones included
+    cancelled_orders = Column(Integer, nullable=False, default=0)
+    delivered_orders = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)  # total_amount of orders not cancelled
+    
+    # Platform-wide (admin) series read every restaurant's buckets in a range
+    __table_args__ = (Index("idx_restaurant_sales_rollups_bucket", "granularity", "bucket_start"),)
+
+class MenuItemSalesRollup(Base):
+    __tablename__ = "menu_item_sales_rollups"
+    
+    menu_item_id = Column(String, ForeignKey("menu_items.id"), primary_key=True)
+    granularity = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    restaurant_id = Column(String, ForeignKey("restaurants.id"), nullable=False)
+    
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    
+    __table_args__ = (Index("idx_menu_item_sales_rollups_restaurant", "restaurant_id", "granularity", "bucket_start"),)
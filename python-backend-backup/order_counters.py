@@ -0,0 +1,105 @@
+from collections import defaultdict
+from contextlib import suppress
+from typing import Optional
+import asyncio
+import logging
+import os
+import random
+from dotenv import load_dotenv
+from prometheus_client import Counter
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from database import db_session, run_db
+from models import Restaurant, RestaurantOrderCountShard
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# restaurants.total_orders is a sharded counter: each checkout adds 1 to a random
+# one of the restaurant's shard rows in its own transaction, so concurrent
+# checkouts at a popular restaurant rarely wait on the same row lock, and a
+# background fold moves the shard counts into total_orders. The counts are
+# durable as soon as the order commits; total_orders trails them by at most
+# about ORDER_COUNTER_FOLD_SECONDS.
+ORDER_COUNTER_SHARDS = int(os.getenv("ORDER_COUNTER_SHARDS", "16"))
+ORDER_COUNTER_FOLD_SECONDS = float(os.getenv("ORDER_COUNTER_FOLD_SECONDS", "10"))
+
+ORDERS_FOLDED = Counter("order_counter_folded_total", "Orders moved from counter shards into restaurants.total_orders")
+
+_shards = RestaurantOrderCountShard.__table__
+_restaurants = Restaurant.__table__
+
+def record_order(db: Session, restaurant_id: str):
+    """Count a placed order in the caller's transaction"""
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    statement = dialect_insert(_shards).values(
+        restaurant_id=restaurant_id, shard=random.randrange(ORDER_COUNTER_SHARDS), orders=1
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[_shards.c.restaurant_id, _shards.c.shard],
+        set_={"orders": _shards.c.orders + 1},
+    ))
+
+def fold(db: Session) -> int:
+    """Move shard counts into restaurants.total_orders in one transaction; returns orders moved"""
+    # SKIP LOCKED: shards a checkout (or another worker's fold) holds are left for
+    # the next fold instead of being waited on
+    shards = db.execute(
+        select(_shards.c.restaurant_id, _shards.c.shard, _shards.c.orders)
+        .where(_shards.c.orders != 0)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not shards:
+        db.rollback()
+        return 0
+
+    deltas = defaultdict(int)
+    for restaurant_id, _, orders in shards:
+        deltas[restaurant_id] += orders
+    # Relative updates: anything counted after the read stays in its shard
+    db.execute(
+        update(_shards)
+        .where(_shards.c.restaurant_id == bindparam("b_restaurant_id"), _shards.c.shard == bindparam("b_shard"))
+        .values(orders=_shards.c.orders - bindparam("b_orders")),
+        [{"b_restaurant_id": restaurant_id, "b_shard": shard, "b_orders": orders}
+         for restaurant_id, shard, orders in shards],
+    )
+    # Sorted, so concurrent folds lock restaurant rows in the same order
+    db.execute(
+        update(_restaurants)
+        .where(_restaurants.c.id == bindparam("b_id"))
+        .values(total_orders=func.coalesce(_restaurants.c.total_orders, 0) + bindparam("b_delta")),
+        [{"b_id": restaurant_id, "b_delta": delta} for restaurant_id, delta in sorted(deltas.items())],
+    )
+    db.commit()
+    folded = sum(deltas.values())
+    ORDERS_FOLDED.inc(folded)
+    return folded
+
+_folder: Optional[asyncio.Task] = None
+_stopping = asyncio.Event()
+
+async def _fold_periodically():
+    while not _stopping.is_set():
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_stopping.wait(), ORDER_COUNTER_FOLD_SECONDS)
+        try:
+            async with db_session() as db:
+                await run_db(db, fold)
+        except Exception:
+            logger.error("Order counter fold failed; retrying next interval", exc_info=True)
+
+def start():
+    global _folder
+    if _folder is None or _folder.done():
+        _stopping.clear()
+        _folder = asyncio.get_running_loop().create_task(_fold_periodically())
+
+async def stop():
+    """Stop folding after one last fold (the shards are durable, so nothing is lost either way)"""
+    _stopping.set()
+    if _folder is not None and not _folder.done():
+        await _folder
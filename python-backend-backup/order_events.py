@@ -0,0 +1,196 @@
+from datetime import datetime
+from typing import Dict, Optional, Set
+import asyncio
+import json
+import logging
+import os
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Events a subscriber may have queued before it is treated as stalled and dropped
+ORDER_EVENTS_QUEUE_SIZE = int(os.getenv("ORDER_EVENTS_QUEUE_SIZE", "100"))
+# Keepalive interval for idle streams (proxies commonly cut connections idle for 60s)
+ORDER_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("ORDER_EVENTS_HEARTBEAT_SECONDS", "20"))
+# When set, events fan out through Redis pub/sub so every worker sees every transition
+ORDER_EVENTS_REDIS_URL = os.getenv("ORDER_EVENTS_REDIS_URL")
+ORDER_EVENTS_CHANNEL = os.getenv("ORDER_EVENTS_CHANNEL", "order-events")
+
+SUBSCRIBERS = Gauge("order_event_subscribers", "Open order status streams on this worker")
+EVENTS_DELIVERED = Counter("order_events_delivered_total", "Order events queued to subscribers")
+SUBSCRIBERS_DROPPED = Counter("order_event_subscribers_dropped_total", "Streams closed because they fell behind")
+
+# Routing keys: an event goes to its customer, the restaurant's owner and admins.
+# Subscribers register under the one key their role entitles them to, so fan-out
+# touches only the interested streams instead of scanning every connection.
+def customer_key(user_id: str) -> str:
+    return f"customer:{user_id}"
+
+def seller_key(user_id: str) -> str:
+    return f"seller:{user_id}"
+
+ADMIN_KEY = "admin"
+
+def subscription_key(user) -> str:
+    if user.role == "admin":
+        return ADMIN_KEY
+    if user.role == "seller":
+        return seller_key(user.id)
+    return customer_key(user.id)
+
+class Subscription:
+    """One open stream: a bounded queue, optionally narrowed to a single order"""
+
+    def __init__(self, key: str, order_id: Optional[str] = None):
+        self.key = key
+        self.order_id = order_id
+        self.queue: asyncio.Queue = asyncio.Queue(ORDER_EVENTS_QUEUE_SIZE)
+        self.dropped = False
+
+class LocalBroker:
+    """Fans events out to this worker's subscribers; must be used from the event loop"""
+
+    def __init__(self):
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, key: str, order_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(key, order_id)
+        self._subscriptions.setdefault(key, set()).add(subscription)
+        SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.key)
+        if subscriptions is not None and subscription in subscriptions:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.key]
+            SUBSCRIBERS.dec()
+
+    def deliver(self, event: dict):
+        for key in (customer_key(event["customer_id"]), seller_key(event["owner_id"]), ADMIN_KEY):
+            for subscription in list(self._subscriptions.get(key, ())):
+                if subscription.order_id is not None and subscription.order_id != event["order_id"]:
+                    continue
+                try:
+                    subscription.queue.put_nowait(event)
+                    EVENTS_DELIVERED.inc()
+                except asyncio.QueueFull:
+                    # A stalled client must not hold events in memory forever; close its
+                    # stream and let it reconnect and refetch
+                    subscription.dropped = True
+                    self.unsubscribe(subscription)
+                    SUBSCRIBERS_DROPPED.inc()
+
+    async def publish(self, event: dict):
+        self.deliver(event)
+
+    async def close(self):
+        pass
+
+class RedisBroker(LocalBroker):
+    """Publishes to one Redis channel; each worker's listener delivers to its own subscribers"""
+
+    def __init__(self, url: str, channel: str):
+        import redis.asyncio as redis
+
+        super().__init__()
+        self.channel = channel
+        self._redis = redis.Redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+
+    def subscribe(self, key: str, order_id: Optional[str] = None) -> Subscription:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return super().subscribe(key, order_id)
+
+    async def publish(self, event: dict):
+        try:
+            await self._redis.publish(self.channel, json.dumps(event))
+        except Exception:
+            logger.warning("Order event publish failed; delivering locally only", exc_info=True)
+            self.deliver(event)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.deliver(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Order event listener lost Redis; reconnecting", exc_info=True)
+                await asyncio.sleep(1)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        await self._redis.close()
+
+if ORDER_EVENTS_REDIS_URL:
+    broker = RedisBroker(ORDER_EVENTS_REDIS_URL, ORDER_EVENTS_CHANNEL)
+else:
+    broker = LocalBroker()
+
+def order_event(order, previous_status: Optional[str] = None) -> dict:
+    """Wire format of a status transition; order needs its restaurant loaded"""
+    return {
+        "order_id": order.id,
+        "restaurant_id": order.restaurant_id,
+        "customer_id": order.customer_id,
+        "owner_id": order.restaurant.owner_id,
+        "status": order.status,
+        "previous_status": previous_status,
+        "at": datetime.utcnow().isoformat() + "Z",
+    }
+
+async def publish_status(order, previous_status: Optional[str] = None):
+    """Announce a committed status change (previous_status None means a new order)"""
+    if previous_status != order.status:
+        await broker.publish(order_event(order, previous_status))
+
+def public_event(event: dict) -> dict:
+    # owner_id is only a routing key
+    return {key: value for key, value in event.items() if key != "owner_id"}
+
+async def sse_stream(subscription: Subscription):
+    """text/event-stream body; a dropped subscription gets its backlog, then the stream ends"""
+    try:
+        yield "retry: 3000\n\n"
+        while not subscription.dropped or not subscription.queue.empty():
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), ORDER_EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: order_status\ndata: {json.dumps(public_event(event))}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+async def websocket_stream(websocket, subscription: Subscription):
+    """Send events as JSON until the client disconnects (keepalive is the server's ping)"""
+
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        while not subscription.dropped or not subscription.queue.empty():
+            next_event = asyncio.ensure_future(subscription.queue.get())
+            await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                next_event.cancel()
+                return
+            await websocket.send_json(public_event(next_event.result()))
+        # Fell behind: ask the client to reconnect (and refetch)
+        await websocket.close(code=1013)
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(subscription)
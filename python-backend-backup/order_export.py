@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List
+
+import anyio
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from crud import iter_order_export_rows
+from database import SessionLocal
+
+load_dotenv()
+
+# Streaming order export for reporting: rows go from a yield_per cursor to the
+# client one partition at a time, so memory is bounded by the batch size.
+
+# Rows fetched from the cursor and encoded per chunk
+ORDER_EXPORT_BATCH_SIZE = int(os.getenv("ORDER_EXPORT_BATCH_SIZE", "1000"))
+# Each running export holds a pooled connection until it finishes; cap them per worker
+ORDER_EXPORT_MAX_CONCURRENT = int(os.getenv("ORDER_EXPORT_MAX_CONCURRENT", "2"))
+
+EXPORT_FIELDS = [
+    "id", "created_at", "status", "restaurant_id", "restaurant_name", "customer_id",
+    "subtotal", "delivery_fee", "tax_amount", "tip_amount", "total_amount", "payment_status",
+    "estimated_delivery_time", "actual_delivery_time",
+]
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+_exports_in_flight = 0
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _encode_ndjson(partition: List) -> str:
+    return "".join(
+        json.dumps({field: _value(value) for field, value in zip(EXPORT_FIELDS, row)}) + "\n" for row in partition
+    )
+
+def _encode_csv(partition: List) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([["" if value is None else _value(value) for value in row] for row in partition])
+    return buffer.getvalue()
+
+def _export_chunks(export_format: str, **filters) -> Iterator[str]:
+    # A session of its own: the export outlives the request's run_db calls and
+    # runs on the sync engine whether or not DB_ASYNC is set
+    db = SessionLocal()
+    try:
+        if export_format == "csv":
+            yield ",".join(EXPORT_FIELDS) + "\n"
+        encode = _encode_csv if export_format == "csv" else _encode_ndjson
+        for partition in iter_order_export_rows(db, ORDER_EXPORT_BATCH_SIZE, **filters):
+            yield encode(partition)
+    finally:
+        db.close()
+
+class ExportSlot:
+    """One of this worker's ORDER_EXPORT_MAX_CONCURRENT exports; release() is idempotent"""
+
+    def __init__(self):
+        self._held = True
+
+    def release(self):
+        global _exports_in_flight
+        if self._held:
+            self._held = False
+            _exports_in_flight -= 1
+
+def check_capacity() -> ExportSlot:
+    """Reserve an export slot, or 503 when this worker already runs ORDER_EXPORT_MAX_CONCURRENT.
+
+    The slot is taken on admission, so a burst of requests cannot all pass the
+    check before any of them starts streaming; ExportResponse releases it.
+    """
+    global _exports_in_flight
+    if _exports_in_flight >= ORDER_EXPORT_MAX_CONCURRENT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many order exports in progress, please retry",
+            headers={"Retry-After": "30"},
+        )
+    _exports_in_flight += 1
+    return ExportSlot()
+
+async def stream_export(export_format: str, **filters) -> AsyncIterator[str]:
+    """Response body of an export; each chunk's fetch and encoding run in the threadpool"""
+    chunks = _export_chunks(export_format, **filters)
+    try:
+        while True:
+            chunk = await run_in_threadpool(next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # Closing the generator closes the session and its cursor; shielded because
+        # this also runs when the request is cancelled by a client disconnect
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(chunks.close)
+
+class ExportResponse(StreamingResponse):
+    """StreamingResponse that finalizes its body even when the client leaves mid-stream.
+
+    Starlette abandons the body iterator on disconnect, leaving the cursor open
+    until the generator is garbage collected; close it deterministically instead.
+    The export slot is released then too, whether or not the body ever started.
+    """
+
+    def __init__(self, content, slot: ExportSlot, **kwargs):
+        self.slot = slot
+        try:
+            super().__init__(content, **kwargs)
+        except BaseException:
+            slot.release()
+            raise
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                with anyio.CancelScope(shield=True):
+                    await self.body_iterator.aclose()
+            finally:
+                self.slot.release()
@@ -0,0 +1,140 @@
+from contextvars import ContextVar
+from time import perf_counter
+from typing import List, Optional, Tuple
+import logging
+import os
+import re
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+from metrics import LoopHistogram, route_template
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Per-request SQL profiling: statement count, DB time and the slowest statements
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", "true").lower() == "true"
+# Debug only: report the profile in X-DB-* response headers (exposes SQL text to clients)
+QUERY_PROFILING_HEADERS = os.getenv("QUERY_PROFILING_HEADERS", "false").lower() == "true"
+# Statements at least this slow are logged with their route; 0 disables the log
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# How many of a request's slowest statements to keep
+QUERY_PROFILING_TOP = int(os.getenv("QUERY_PROFILING_TOP", "3"))
+
+REQUEST_STATEMENTS = LoopHistogram(
+    "db_request_statements",
+    "SQL statements executed per request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+REQUEST_DB_SECONDS = LoopHistogram(
+    "db_request_seconds",
+    "Time per request spent executing SQL",
+    ["method", "route"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_NUMBER_RE = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PARAM_LIST_RE = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)\s*\)")
+_POSTCOMPILE_RE = re.compile(r"\(?__\[POSTCOMPILE_\w+\]\)?")
+_SELECT_LIST_RE = re.compile(r"\bSELECT (?:(?!\bFROM\b).)+? FROM\b")
+_INSERT_LIST_RE = re.compile(r"\bINSERT INTO (\S+) \([^)]*\)")
+
+def normalize_sql(statement: str) -> str:
+    """One-line SQL with literals and parameter lists folded, so equal queries group together"""
+    statement = _STRING_RE.sub("?", statement)
+    statement = _NUMBER_RE.sub("?", statement)
+    statement = _PARAM_LIST_RE.sub("(...)", statement)
+    statement = _POSTCOMPILE_RE.sub("(...)", statement)
+    return _WHITESPACE_RE.sub(" ", statement).strip()
+
+def condense_sql(normalized: str) -> str:
+    """Column lists folded away, for headers where only the statement's shape matters"""
+    return _INSERT_LIST_RE.sub(r"INSERT INTO \1 (...)", _SELECT_LIST_RE.sub("SELECT ... FROM", normalized))
+
+class QueryProfile:
+    """SQL activity of one request; shared by reference with the threads that run its queries"""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.slowest: List[Tuple[float, str]] = []  # (seconds, normalized SQL), slowest first
+
+    @property
+    def route(self) -> str:
+        return route_template(self.scope)
+
+    def record(self, seconds: float, statement: str):
+        self.statements += 1
+        self.db_seconds += seconds
+        if len(self.slowest) < QUERY_PROFILING_TOP or seconds > self.slowest[-1][0]:
+            self.slowest.append((seconds, normalize_sql(statement)))
+            self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+            del self.slowest[QUERY_PROFILING_TOP:]
+
+_current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = perf_counter() - conn.info["query_start_time"].pop()
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(seconds, statement)
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s",
+            seconds * 1000, profile.route if profile is not None else "-", normalize_sql(statement),
+        )
+
+def _handle_error(exception_context):
+    # The statement failed before after_cursor_execute; drop its start time
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start_time"):
+        conn.info["query_start_time"].pop()
+
+def instrument_engine(engine):
+    """Attach statement timing to a (sync) Engine; pass async_engine.sync_engine for async"""
+    if not QUERY_PROFILING:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+class QueryProfilingMiddleware:
+    """ASGI middleware that opens a QueryProfile per HTTP request and reports it"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_PROFILING:
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile(scope)
+        token = _current_profile.set(profile)
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start" and QUERY_PROFILING_HEADERS:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-statements", str(profile.statements).encode()))
+                headers.append((b"x-db-time-ms", f"{profile.db_seconds * 1000:.2f}".encode()))
+                if profile.slowest:
+                    slowest = " | ".join(f"{seconds * 1000:.2f}ms {condense_sql(sql)[:200]}" for seconds, sql in profile.slowest)
+                    headers.append((b"x-db-slowest", slowest.encode("latin-1", "replace")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _current_profile.reset(token)
+            route = profile.route
+            REQUEST_STATEMENTS.observe(REQUEST_STATEMENTS.labels(scope["method"], route), profile.statements)
+            REQUEST_DB_SECONDS.observe(REQUEST_DB_SECONDS.labels(scope["method"], route), profile.db_seconds)
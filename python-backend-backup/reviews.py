@@ -0,0 +1,93 @@
+from sqlalchemy import Float, case, cast, func, inspect, select, text, update
+from sqlalchemy.orm import Session
+
+from models import Restaurant, RestaurantReview
+
+# Restaurant ratings: restaurants.rating_sum / total_reviews are running totals
+# moved by each review write (crud.create_review, update_review, delete_review) in
+# the same transaction, so a review costs one single-row UPDATE however many
+# reviews the restaurant has; average_rating is derived from them in that UPDATE.
+# reconcile() recomputes the totals from restaurant_reviews to repair drift from
+# writes that bypassed crud (bulk loads, manual edits). Restaurants without any
+# review rows keep their totals, which were imported (sample data, datagen); once
+# a restaurant has reviews, its totals follow them. migrate() upgrades a database
+# created before the running totals.
+
+def apply_rating_delta(db: Session, restaurant_id: str, rating_delta: int, count_delta: int):
+    """Add a review change to the restaurant's running totals in the caller's transaction"""
+    rating_sum = Restaurant.rating_sum + rating_delta
+    total_reviews = func.coalesce(Restaurant.total_reviews, 0) + count_delta
+    db.execute(
+        update(Restaurant)
+        .where(Restaurant.id == restaurant_id)
+        .values(
+            rating_sum=rating_sum,
+            total_reviews=total_reviews,
+            # SET expressions read the row's old values, so this is the new average
+            average_rating=case((total_reviews > 0, cast(rating_sum, Float) / total_reviews), else_=0.0),
+        )
+    )
+
+def reconcile(db: Session, batch_size: int = 1000) -> int:
+    """Recompute rating totals from restaurant_reviews, one batch of restaurants per
+    transaction; returns how many restaurants had drifted"""
+    fixed = 0
+    last_id = ""
+    while True:
+        # Locking the batch first means a review committing meanwhile is either
+        # counted by the aggregate below or applies its delta after this commit
+        restaurants = db.execute(
+            select(Restaurant.id, Restaurant.rating_sum, Restaurant.total_reviews, Restaurant.average_rating)
+            .where(Restaurant.id > last_id)
+            .order_by(Restaurant.id)
+            .limit(batch_size)
+            .with_for_update()
+        ).all()
+        if not restaurants:
+            return fixed
+        last_id = restaurants[-1].id
+
+        actual = {
+            restaurant_id: (rating_sum, count)
+            for restaurant_id, rating_sum, count in db.execute(
+                select(RestaurantReview.restaurant_id, func.sum(RestaurantReview.rating), func.count())
+                .where(RestaurantReview.restaurant_id.in_([row.id for row in restaurants]))
+                .group_by(RestaurantReview.restaurant_id)
+            )
+        }
+        drifted = []
+        for row in restaurants:
+            if row.id not in actual:
+                continue  # imported totals, nothing to recompute them from
+            rating_sum, count = actual[row.id]
+            average = rating_sum / count
+            # average_rating is DECIMAL(3, 2) in database_schema.sql, so compare to the cent
+            if (row.rating_sum, row.total_reviews) != (rating_sum, count) or abs((row.average_rating or 0.0) - average) >= 0.005:
+                drifted.append({"id": row.id, "rating_sum": rating_sum, "total_reviews": count, "average_rating": average})
+        if drifted:
+            db.execute(update(Restaurant), drifted)
+        db.commit()
+        fixed += len(drifted)
+
+def migrate(db: Session) -> int:
+    """Move a database from the rating trigger to running totals; safe to re-run.
+
+    Drops update_restaurant_rating_trigger (it would count every review twice
+    alongside apply_rating_delta), adds restaurants.rating_sum and backfills the
+    totals from restaurant_reviews. Returns how many restaurants were backfilled.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("DROP TRIGGER IF EXISTS update_restaurant_rating_trigger ON restaurant_reviews"))
+        db.execute(text("DROP FUNCTION IF EXISTS update_restaurant_rating()"))
+    columns = {column["name"] for column in inspect(db.connection()).get_columns("restaurants")}
+    if "rating_sum" not in columns:
+        db.execute(text("ALTER TABLE restaurants ADD COLUMN rating_sum INTEGER NOT NULL DEFAULT 0"))
+    db.commit()
+    return reconcile(db)
+
+if __name__ == "__main__":
+    __import__("main")  # creates the tables
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        print(f"reconciled ratings of {migrate(db)} restaurants")
@@ -13,6 +13,14 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     password: str
 
+class UserUpdate(BaseModel):
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    phone: Optional[str] = None
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+    profile_image_url: Optional[str] = None
+
 class UserResponse(UserBase):
     id: str
     is_active: bool
@@ -79,6 +87,9 @@ class RestaurantResponse(RestaurantBase):
     class Config:
         from_attributes = True
 
+class NearbyRestaurantResponse(RestaurantResponse):
+    distance_km: float
+
 # Menu Item schemas
 class MenuItemBase(BaseModel):
     name: str
@@ -111,6 +122,17 @@ class MenuItemUpdate(BaseModel):
     prep_time: Optional[int] = None
     category: Optional[str] = None
 
+class MenuItemImport(MenuItemBase):
+    # Existing item to overwrite; rows without one match on (category, name)
+    id: Optional[str] = None
+    # Defaults to the row's position in the import
+    sort_order: Optional[int] = None
+
+class MenuImportResult(BaseModel):
+    created: int
+    updated: int
+    unavailable: int
+
 class MenuItemResponse(MenuItemBase):
     id: str
     restaurant_id: str
@@ -171,4 +193,87 @@ class OrderResponse(OrderBase):
     order_items: List[OrderItemResponse]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Review schemas
+class ReviewBase(BaseModel):
+    rating: int  # 1-5
+    review_text: Optional[str] = None
+
+class ReviewCreate(ReviewBase):
+    pass
+
+class ReviewUpdate(BaseModel):
+    rating: Optional[int] = None
+    review_text: Optional[str] = None
+
+class ReviewResponse(ReviewBase):
+    id: str
+    restaurant_id: str
+    customer_id: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+# Cart schemas
+class CartItemUpdate(BaseModel):
+    quantity: int  # 0 removes the line
+    special_instructions: Optional[str] = None
+
+class CartItemResponse(BaseModel):
+    menu_item_id: str
+    name: str
+    unit_price: float
+    quantity: int
+    special_instructions: Optional[str] = None
+    total_price: float
+
+class CartResponse(BaseModel):
+    restaurant_id: Optional[str] = None
+    items: List[CartItemResponse]
+    subtotal: float
+
+class CartCheckout(BaseModel):
+    delivery_address: str
+    delivery_instructions: Optional[str] = None
+    special_instructions: Optional[str] = None
+
+# Analytics schemas
+class SalesTotals(BaseModel):
+    orders: int
+    cancelled_orders: int
+    delivered_orders: int
+    revenue: float
+    average_ticket: float
+
+class SalesBucket(SalesTotals):
+    bucket_start: datetime
+
+class SalesAnalyticsResponse(BaseModel):
+    granularity: str
+    start: datetime
+    end: datetime
+    totals: SalesTotals
+    buckets: List[SalesBucket]
+
+class TopMenuItem(BaseModel):
+    menu_item_id: str
+    restaurant_id: str
+    name: str
+    quantity: int
+    revenue: float
+
+# Search schemas
+class RestaurantSearchHit(BaseModel):
+    score: float
+    restaurant: RestaurantResponse
+
+class MenuItemSearchHit(BaseModel):
+    score: float
+    menu_item: MenuItemResponse
+
+class SearchResponse(BaseModel):
+    restaurants: List[RestaurantSearchHit]
+    menu_items: List[MenuItemSearchHit]
\ No newline at end of file
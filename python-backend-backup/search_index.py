@@ -0,0 +1,240 @@
+from collections import defaultdict
+from heapq import nlargest
+from math import log
+from time import monotonic
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import os
+import re
+from dotenv import load_dotenv
+
+from crud import get_menu_item_search_documents, get_restaurant_search_documents
+from database import run_db
+
+load_dotenv()
+
+# "memory" serves search from an in-process inverted index kept current on catalog
+# writes; "postgres" uses tsvector/GIN (see the search indexes in database_schema.sql)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "memory")
+# Full rebuild interval; picks up writes made through other workers
+SEARCH_INDEX_REFRESH_SECONDS = float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "300"))
+
+# Field weights: a hit in the name counts double a hit in the description
+NAME_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("a an and are as at be by for from in is it of on or the to with".split())
+
+def _stem(token: str) -> str:
+    # Plural folding is enough for dish names ("noodles" ~ "noodle", "curries" ~ "curry")
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("es") and token[-3] in "sxz":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+class InvertedIndex:
+    """BM25-ranked term postings; documents can be replaced or removed in place.
+
+    Postings hold each document's precomputed BM25 term impact, so a query costs
+    one multiply-add per posting. Impacts use the average document length at
+    write time; reweight() recomputes them against the current average.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # term -> {doc_id: BM25 term impact}
+        self._doc_terms = {}  # doc_id -> {term: weighted term frequency}
+        self._doc_length = {}  # doc_id -> weighted length
+        self._total_length = 0.0
+        self.attributes = {}  # doc_id -> filterable attributes
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id: str):
+        return doc_id in self._doc_terms
+
+    def upsert(self, doc_id: str, name: Optional[str], description: Optional[str], attributes: Dict = None):
+        self.remove(doc_id)
+        terms = defaultdict(float)
+        for token in tokenize(name):
+            terms[token] += NAME_WEIGHT
+        for token in tokenize(description):
+            terms[token] += DESCRIPTION_WEIGHT
+        self._doc_terms[doc_id] = terms
+        self._doc_length[doc_id] = sum(terms.values())
+        self._total_length += self._doc_length[doc_id]
+        self.attributes[doc_id] = attributes or {}
+        norm = self._length_norm(doc_id, self._total_length / len(self._doc_terms))
+        for term, frequency in terms.items():
+            self._postings[term][doc_id] = frequency * (BM25_K1 + 1) / (frequency + norm)
+
+    def _length_norm(self, doc_id: str, average_length: float) -> float:
+        return BM25_K1 * (1 - BM25_B + BM25_B * self._doc_length[doc_id] / (average_length or 1.0))
+
+    def reweight(self):
+        """Recompute every impact against the current average length (after bulk loads)"""
+        if not self._doc_terms:
+            return
+        average_length = self._total_length / len(self._doc_terms)
+        for doc_id, terms in self._doc_terms.items():
+            norm = self._length_norm(doc_id, average_length)
+            for term, frequency in terms.items():
+                self._postings[term][doc_id] = frequency * (BM25_K1 + 1) / (frequency + norm)
+
+    def remove(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_length.pop(doc_id)
+        self.attributes.pop(doc_id, None)
+
+    def search(self, query: str, limit: int, accept=None) -> List[Tuple[float, str]]:
+        """(score, doc_id) pairs, best first; accept(attributes) can veto documents"""
+        doc_count = len(self._doc_terms)
+        if not doc_count:
+            return []
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            get = scores.get
+            for doc_id, impact in postings.items():
+                scores[doc_id] = get(doc_id, 0.0) + idf * impact
+        by_score = lambda item: item[1]
+        if accept is None:
+            best = nlargest(limit, scores.items(), key=by_score)
+        else:
+            # Filter the best few candidates first; scan everything only when too few pass
+            attributes = self.attributes
+            best = [item for item in nlargest(limit * 4, scores.items(), key=by_score) if accept(attributes[item[0]])]
+            if len(best) < limit and len(scores) > limit * 4:
+                best = nlargest(limit, (item for item in scores.items() if accept(attributes[item[0]])), key=by_score)
+        return [(score, doc_id) for doc_id, score in best[:limit]]
+
+class CatalogSearchIndex:
+    def __init__(self):
+        self.restaurants = InvertedIndex()
+        self.menu_items = InvertedIndex()
+
+_index: Optional[CatalogSearchIndex] = None
+_built_at = 0.0
+_build_lock = asyncio.Lock()
+
+def _menu_item_attributes(menu_item) -> Dict:
+    return {
+        "restaurant_id": menu_item.restaurant_id,
+        "is_available": bool(menu_item.is_available),
+        "is_vegetarian": bool(menu_item.is_vegetarian),
+        "is_vegan": bool(menu_item.is_vegan),
+        "is_gluten_free": bool(menu_item.is_gluten_free),
+        "spice_level": menu_item.spice_level or 0,
+    }
+
+async def ensure_index(db) -> CatalogSearchIndex:
+    """The process-wide index, (re)built from the database when missing or stale"""
+    global _index, _built_at
+    if _index is not None and monotonic() - _built_at < SEARCH_INDEX_REFRESH_SECONDS:
+        return _index
+    async with _build_lock:
+        if _index is None or monotonic() - _built_at >= SEARCH_INDEX_REFRESH_SECONDS:
+            index = CatalogSearchIndex()
+            for row in await run_db(db, get_restaurant_search_documents):
+                index.restaurants.upsert(row.id, row.name, f"{row.cuisine_type} {row.description or ''}")
+            for row in await run_db(db, get_menu_item_search_documents):
+                index.menu_items.upsert(row.id, row.name, row.description, _menu_item_attributes(row))
+            index.restaurants.reweight()
+            index.menu_items.reweight()
+            _index, _built_at = index, monotonic()
+    return _index
+
+# The restaurant index holds exactly the active restaurants, and the menu item
+# index only items of restaurants in it, so hidden dishes never take top-k slots
+
+def index_restaurant(restaurant, reactivated: bool = False):
+    """Apply a restaurant write to the live index (no-op until it is first built).
+
+    reactivated: the restaurant was inactive before this write; its menu items
+    were dropped from the index then, so the next search rebuilds it.
+    """
+    global _built_at
+    if _index is None:
+        return
+    if restaurant.is_active:
+        _index.restaurants.upsert(
+            restaurant.id, restaurant.name, f"{restaurant.cuisine_type} {restaurant.description or ''}"
+        )
+        if reactivated:
+            _built_at = float("-inf")
+    else:
+        remove_restaurant(restaurant.id)
+
+def remove_restaurant(restaurant_id: str):
+    """Drop a deleted or deactivated restaurant and its menu items"""
+    if _index is None:
+        return
+    _index.restaurants.remove(restaurant_id)
+    attributes = _index.menu_items.attributes
+    for menu_item_id in [doc_id for doc_id, item in attributes.items() if item["restaurant_id"] == restaurant_id]:
+        _index.menu_items.remove(menu_item_id)
+
+def _index_menu_item(menu_item):
+    if menu_item.restaurant_id in _index.restaurants:
+        _index.menu_items.upsert(menu_item.id, menu_item.name, menu_item.description, _menu_item_attributes(menu_item))
+    else:
+        _index.menu_items.remove(menu_item.id)
+
+def index_menu_item(menu_item):
+    """Apply a menu item write to the live index (no-op until it is first built)"""
+    if _index is not None:
+        _index_menu_item(menu_item)
+
+def index_menu_items(rows):
+    """Apply a bulk menu import (rows as column mappings) to the live index"""
+    if _index is not None:
+        for row in rows:
+            _index_menu_item(SimpleNamespace(**row))
+
+def remove_menu_item(menu_item_id: str):
+    if _index is not None:
+        _index.menu_items.remove(menu_item_id)
+
+def menu_item_filter(vegetarian: Optional[bool] = None, vegan: Optional[bool] = None,
+                     gluten_free: Optional[bool] = None, max_spice_level: Optional[int] = None,
+                     min_spice_level: Optional[int] = None):
+    """accept() predicate over menu item attributes for the dietary filters"""
+    def accept(attributes):
+        if not attributes["is_available"]:
+            return False
+        if vegetarian is not None and attributes["is_vegetarian"] != vegetarian:
+            return False
+        if vegan is not None and attributes["is_vegan"] != vegan:
+            return False
+        if gluten_free is not None and attributes["is_gluten_free"] != gluten_free:
+            return False
+        if max_spice_level is not None and attributes["spice_level"] > max_spice_level:
+            return False
+        if min_spice_level is not None and attributes["spice_level"] < min_spice_level:
+            return False
+        return True
+    return accept
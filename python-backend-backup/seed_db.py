@@ -119,6 +119,7 @@ def seed_database():
             is_open=True,
             average_rating=4.5,
             total_reviews=234,
+            rating_sum=1053,
             delivery_fee=3.99,
             minimum_order=15.00,
             estimated_delivery_time=35
@@ -143,6 +144,7 @@ def seed_database():
             is_open=True,
             average_rating=4.3,
             total_reviews=189,
+            rating_sum=813,
             delivery_fee=2.99,
             minimum_order=12.00,
             estimated_delivery_time=30
@@ -167,6 +169,7 @@ def seed_database():
             is_open=True,
             average_rating=4.7,
             total_reviews=312,
+            rating_sum=1466,
             delivery_fee=4.99,
             minimum_order=20.00,
             estimated_delivery_time=25
@@ -191,6 +194,7 @@ def seed_database():
             is_open=False,
             average_rating=4.2,
             total_reviews=156,
+            rating_sum=655,
             delivery_fee=3.49,
             minimum_order=10.00,
             estimated_delivery_time=20
@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+
+from models import User, Restaurant, MenuItem, MenuItemSalesRollup, RestaurantSalesRollup
+from schemas import OrderCreate, OrderItemCreate, OrderUpdate
+import analytics
+import crud
+import main
+
+
+@pytest.fixture
+def menu(db):
+    customer = User(email="customer@example.com", password_hash="x", first_name="Jo", last_name="Doe")
+    owner = User(email="owner@example.com", password_hash="x", first_name="Own", last_name="Er", role="seller")
+    db.add_all([customer, owner])
+    db.flush()
+    restaurant = Restaurant(owner_id=owner.id, name="R", cuisine_type="italian", street_address="1 Main St",
+                            city="Town", state="CA", postal_code="90000")
+    db.add(restaurant)
+    db.flush()
+    items = [MenuItem(restaurant_id=restaurant.id, name=name, price=price) for name, price in (("Pizza", 10.0), ("Soda", 2.0))]
+    db.add_all(items)
+    db.commit()
+    return customer.id, restaurant.id, [item.id for item in items]
+
+
+def place(db, menu, quantities):
+    customer_id, restaurant_id, item_ids = menu
+    order = OrderCreate(restaurant_id=restaurant_id, delivery_address="2 Side St", items=[
+        OrderItemCreate(menu_item_id=item_id, quantity=quantity) for item_id, quantity in zip(item_ids, quantities)
+    ])
+    return crud.create_order(db, order, customer_id)
+
+
+def snapshot(db):
+    restaurants = db.execute(select(RestaurantSalesRollup).order_by(*RestaurantSalesRollup.__table__.primary_key)).scalars()
+    items = db.execute(select(MenuItemSalesRollup).order_by(*MenuItemSalesRollup.__table__.primary_key)).scalars()
+    return (
+        [(row.granularity, row.orders, row.cancelled_orders, row.delivered_orders, round(row.revenue, 2)) for row in restaurants],
+        [(row.menu_item_id, row.granularity, row.quantity, round(row.revenue, 2)) for row in items],
+    )
+
+
+def test_incremental_rollups_match_a_rebuild(db, menu):
+    orders = [place(db, menu, quantities) for quantities in ((1, 1), (2, 0), (3, 2))]
+    crud.update_order(db, orders[0].id, OrderUpdate(status="cancelled"), expected_status="pending")
+    crud.update_order(db, orders[1].id, OrderUpdate(status="delivered"), expected_status="pending")
+
+    incremental = snapshot(db)
+    analytics.rebuild(db)
+    db.expire_all()
+
+    assert incremental == snapshot(db)
+    restaurant_rows, _ = incremental
+    assert restaurant_rows[0][:4] == ("day", 3, 1, 1)
+
+
+def test_sales_read_is_one_query_over_buckets(db, menu, count_queries):
+    for _ in range(20):
+        place(db, menu, (1, 1))
+    statements = count_queries
+    statements.clear()
+
+    rows = analytics.get_sales(db, "day", datetime(2000, 1, 1), datetime(2100, 1, 1), restaurant_id=menu[1])
+
+    assert len(statements) == 1 and "FROM orders" not in statements[0]
+    assert [(row.orders, round(row.revenue, 2)) for row in rows] == [(20, round(20 * (12 * 1.08 + 2.99), 2))]
+
+
+def test_bucket_start_truncates_to_utc():
+    moment = datetime.fromisoformat("2024-03-05T17:45:12+02:00")
+
+    assert analytics.bucket_start(moment, "hour") == datetime(2024, 3, 5, 15)
+    assert analytics.bucket_start(moment, "day") == datetime(2024, 3, 5)
+
+
+def test_bucket_end_keeps_boundaries_and_rounds_up_the_rest():
+    assert analytics.bucket_end(datetime(2024, 3, 5), "day") == datetime(2024, 3, 5)
+    assert analytics.bucket_end(datetime(2024, 3, 5, 0, 0, 1), "day") == datetime(2024, 3, 6)
+    assert analytics.bucket_end(datetime.fromisoformat("2024-03-05T17:00:00+02:00"), "hour") == datetime(2024, 3, 5, 15)
+    assert analytics.bucket_end(datetime(2024, 3, 5, 14, 30), "hour") == datetime(2024, 3, 5, 15)
+
+
+def test_scope_end_on_a_boundary_is_not_widened():
+    def scope(**bounds):
+        return asyncio.run(main.analytics_scope(restaurant_id=None, current_user=SimpleNamespace(id="a1", role="admin"),
+                                                db=None, **bounds))
+
+    week = scope(granularity="day", start=datetime(2024, 3, 1), end=datetime(2024, 3, 8))
+    assert (week["start"], week["end"]) == (datetime(2024, 3, 1), datetime(2024, 3, 8))
+    partial = scope(granularity="hour", start=datetime(2024, 3, 1, 9, 30), end=datetime(2024, 3, 1, 11, 5))
+    assert (partial["start"], partial["end"]) == (datetime(2024, 3, 1, 9), datetime(2024, 3, 1, 12))
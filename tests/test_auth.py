@@ -0,0 +1,102 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+
+from models import User
+import auth
+
+
+@pytest.fixture
+def user(db, monkeypatch):
+    monkeypatch.setattr(auth, "USER_CACHE_TTL", 60)
+    monkeypatch.setattr(auth, "_principal_cache", type(auth._principal_cache)())
+    lookups = []
+
+    async def run_db(db, fn, *args, **kwargs):
+        lookups.append(fn.__name__)
+        return fn(db, *args, **kwargs)  # the in-memory database lives on this thread
+
+    monkeypatch.setattr(auth, "run_db", run_db)
+    user = User(email="customer@example.com", password_hash="x", first_name="Jo", last_name="Doe")
+    db.add(user)
+    db.commit()
+    return user, auth.create_access_token({"sub": user.email}), lookups
+
+
+def current_user(db, token):
+    return asyncio.run(auth.get_current_user(token=token, db=db))
+
+
+def test_principal_is_cached_between_requests(db, user):
+    db_user, token, lookups = user
+
+    assert current_user(db, token).id == db_user.id
+    assert current_user(db, token).id == db_user.id
+    assert lookups == ["get_user_by_email"]
+
+
+def test_invalidation_drops_the_cached_principal(db, user):
+    db_user, token, lookups = user
+    current_user(db, token)
+    db_user.is_active = False
+    db.commit()
+    # Still cached: deactivation needs the invalidation to take effect before the TTL
+    assert current_user(db, token).is_active
+
+    asyncio.run(auth.invalidate_user_principal(db_user.email))
+    with pytest.raises(HTTPException) as raised:
+        current_user(db, token)
+    assert raised.value.status_code == 400
+    assert lookups == ["get_user_by_email", "get_user_by_email"]
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio for one channel: publish, and a pubsub fed from a queue"""
+
+    def __init__(self):
+        self.published = []
+        self.messages = asyncio.Queue()
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+        await self.messages.put(message)
+
+    @asynccontextmanager
+    async def pubsub(self):
+        redis = self
+
+        class PubSub:
+            async def subscribe(self, channel):
+                pass
+
+            async def listen(self):
+                yield {"type": "subscribe", "data": 1}
+                while True:
+                    yield {"type": "message", "data": await redis.messages.get()}
+
+        yield PubSub()
+
+
+def test_invalidations_reach_other_workers(db, user, monkeypatch):
+    db_user, token, lookups = user
+    redis = FakeRedis()
+    monkeypatch.setattr(auth, "_redis", redis)
+
+    async def scenario():
+        listener = asyncio.ensure_future(auth._listen_for_invalidations(redis))
+        await asyncio.sleep(0.01)
+        await auth.get_current_user(token=token, db=db)
+        cached = db_user.email in auth._principal_cache
+        # Published by the worker that handled the change
+        await redis.publish(auth.USER_CACHE_CHANNEL, db_user.email)
+        await asyncio.sleep(0.01)
+        listener.cancel()
+        return cached
+
+    assert asyncio.run(scenario())
+    assert db_user.email not in auth._principal_cache
+
+    asyncio.run(auth.invalidate_user_principal(db_user.email))
+    assert redis.published[-1] == (auth.USER_CACHE_CHANNEL, db_user.email)
@@ -0,0 +1,108 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from models import User, Restaurant, MenuItem, Order, CartItem
+from schemas import CartCheckout
+import carts
+import crud
+import order_counters
+
+
+@pytest.fixture
+def menu(db):
+    customer = User(email="customer@example.com", password_hash="x", first_name="Jo", last_name="Doe")
+    owner = User(email="owner@example.com", password_hash="x", first_name="Own", last_name="Er", role="seller")
+    db.add_all([customer, owner])
+    db.flush()
+    restaurant = Restaurant(owner_id=owner.id, name="R", cuisine_type="italian", street_address="1 Main St",
+                            city="Town", state="CA", postal_code="90000", delivery_fee=3.0)
+    db.add(restaurant)
+    db.flush()
+    items = [MenuItem(restaurant_id=restaurant.id, name=name, price=price) for name, price in (("Pizza", 10.0), ("Soda", 2.0))]
+    db.add_all(items)
+    db.commit()
+    return customer.id, restaurant.id, items
+
+
+def cart_of(restaurant_id, lines):
+    return {"restaurant_id": restaurant_id, "items": [
+        {"menu_item_id": item.id, "name": item.name, "unit_price": price, "quantity": quantity,
+         "special_instructions": None}
+        for item, price, quantity in lines
+    ]}
+
+
+def test_replace_carts_round_trips_lines(db, menu):
+    customer_id, restaurant_id, (pizza, soda) = menu
+    crud.replace_carts(db, {customer_id: cart_of(restaurant_id, [(pizza, 10.0, 2), (soda, 2.0, 1)])})
+    crud.replace_carts(db, {customer_id: cart_of(restaurant_id, [(soda, 2.0, 3)])})
+
+    lines = crud.get_cart_lines(db, customer_id)
+    assert [(line.menu_item_id, line.quantity, line.price, line.restaurant_id) for line in lines] == [
+        (soda.id, 3, 2.0, restaurant_id)
+    ]
+    crud.replace_carts(db, {customer_id: cart_of(None, [])})
+    assert db.query(CartItem).count() == 0
+
+
+def test_checkout_reports_changed_lines_without_writing(db, menu):
+    customer_id, restaurant_id, (pizza, soda) = menu
+    pizza.price = 12.0
+    soda.is_available = False
+    db.commit()
+
+    order, changes = crud.checkout_cart(
+        db, cart_of(restaurant_id, [(pizza, 10.0, 1), (soda, 2.0, 1)]), customer_id, CartCheckout(delivery_address="x")
+    )
+    assert order is None
+    assert changes == [
+        {"menu_item_id": pizza.id, "available": True, "unit_price": 12.0, "previous_unit_price": 10.0},
+        {"menu_item_id": soda.id, "available": False},
+    ]
+    assert db.query(Order).count() == 0
+
+
+def test_checkout_places_order_at_cart_prices(db, menu):
+    customer_id, restaurant_id, (pizza, soda) = menu
+    order, changes = crud.checkout_cart(
+        db, cart_of(restaurant_id, [(pizza, 10.0, 2), (soda, 2.0, 1)]), customer_id, CartCheckout(delivery_address="x")
+    )
+    assert changes == []
+    assert order.restaurant_id == restaurant_id
+    assert order.subtotal == 22.0
+    assert order.total_amount == pytest.approx(22.0 + 3.0 + 22.0 * 0.08)
+    assert sorted((item.menu_item_id, item.quantity) for item in order.order_items) == sorted([(pizza.id, 2), (soda.id, 1)])
+    assert order_counters.fold(db) == 1
+    assert db.get(Restaurant, restaurant_id).total_orders == 1
+
+
+def test_flush_drops_deleted_items_and_isolates_rejected_carts(db, engine, menu, monkeypatch):
+    customer_id, restaurant_id, (pizza, soda) = menu
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+
+    @asynccontextmanager
+    async def test_session():
+        yield db
+
+    async def run_db(db, fn, *args, **kwargs):
+        return fn(db, *args, **kwargs)  # the in-memory database lives on this thread
+
+    monkeypatch.setattr(carts, "db_session", test_session)
+    monkeypatch.setattr(carts, "run_db", run_db)
+    monkeypatch.setattr(carts, "_store", carts.LocalCartStore(60, 100))
+    monkeypatch.setattr(carts, "_pending", {})
+    monkeypatch.setattr(carts, "CART_FLUSH_BATCH_SIZE", 10)
+
+    async def scenario():
+        await carts.save(customer_id, cart_of(restaurant_id, [(pizza, 10.0, 1), (soda, 2.0, 2)]))
+        # No such user: this cart violates the user_id foreign key
+        await carts.save("deleted-user", cart_of(restaurant_id, [(soda, 2.0, 1)]))
+        crud.delete_menu_item(db, pizza.id)
+        await carts.flush()
+
+    asyncio.run(scenario())
+    assert [(line.menu_item_id, line.quantity) for line in crud.get_cart_lines(db, customer_id)] == [(soda.id, 2)]
+    assert list(carts._pending) == ["deleted-user"]
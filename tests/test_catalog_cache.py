@@ -0,0 +1,180 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, get_db
+from models import User, Restaurant, MenuItem
+import catalog_cache
+import main
+
+adapter = TypeAdapter(list)
+
+
+@pytest.fixture(autouse=True)
+def backend(monkeypatch):
+    monkeypatch.setattr(catalog_cache, "CATALOG_CACHE_TTL", 60)
+    monkeypatch.setattr(catalog_cache, "_backend", catalog_cache.LocalCatalogCache(60, 100))
+
+
+def slow_load(results):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        result = results[len(calls) - 1]
+        await asyncio.sleep(0.01)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return load, calls
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = catalog_cache.LocalCatalogCache(60, 2)
+
+    async def scenario():
+        await cache.set("menu:r1", "", ["one"], adapter)
+        await cache.set("menu:r2", "", ["two"], adapter)
+        await cache.get("menu:r1", "", adapter)  # r1 is now the most recently used
+        await cache.set("menu:r3", "", ["three"], adapter)
+        return [await cache.get(f"menu:r{n}", "", adapter) for n in (1, 2, 3)]
+
+    assert asyncio.run(scenario()) == [["one"], None, ["three"]]
+
+
+def test_local_cache_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(catalog_cache, "monotonic", lambda: now[0])
+    cache = catalog_cache.LocalCatalogCache(60, 100)
+    asyncio.run(cache.set("restaurant:r1", "", ["r1"], adapter))
+
+    now[0] += 59
+    assert asyncio.run(cache.get("restaurant:r1", "", adapter)) == ["r1"]
+    now[0] += 2
+    assert asyncio.run(cache.get("restaurant:r1", "", adapter)) is None
+
+
+def test_invalidation_drops_only_its_namespaces():
+    cache = catalog_cache.LocalCatalogCache(60, 100)
+
+    async def scenario():
+        for namespace in ("restaurant:r1", "restaurants", "menu:r1"):
+            await cache.set(namespace, "", [namespace], adapter)
+        await cache.invalidate("restaurant:r1", "restaurants")
+        return [await cache.get(namespace, "", adapter) for namespace in ("restaurant:r1", "restaurants", "menu:r1")]
+
+    assert asyncio.run(scenario()) == [None, None, ["menu:r1"]]
+
+
+@pytest.fixture
+def client(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        owner = User(email="owner@example.com", password_hash="x", first_name="Own", last_name="Er", role="seller")
+        db.add(owner)
+        db.flush()
+        restaurant = Restaurant(owner_id=owner.id, name="Luigi's", cuisine_type="italian", street_address="1 Main St",
+                                city="Town", state="CA", postal_code="90000")
+        db.add(restaurant)
+        db.flush()
+        item = MenuItem(restaurant_id=restaurant.id, name="Pizza", price=10.0)
+        db.add(item)
+        db.commit()
+        ids = owner.id, restaurant.id, item.id
+        db.expunge(owner)
+
+    def session():
+        with Session() as db:
+            yield db
+
+    main.app.dependency_overrides[get_db] = session
+    main.app.dependency_overrides[main.get_current_user] = lambda: owner
+    yield TestClient(main.app), ids
+    main.app.dependency_overrides.clear()
+    engine.dispose()
+
+
+def test_catalog_writes_invalidate_cached_reads(client):
+    client, (_, restaurant_id, item_id) = client
+    menu = f"/restaurants/{restaurant_id}/menu-items"
+    assert client.get(f"/restaurants/{restaurant_id}").json()["name"] == "Luigi's"
+    assert [item["price"] for item in client.get(menu).json()] == [10.0]
+    listed = {restaurant["name"] for restaurant in client.get("/restaurants").json()}
+
+    assert client.put(f"/restaurants/{restaurant_id}", json={"name": "Luigi's Trattoria"}).status_code == 200
+    assert client.get(f"/restaurants/{restaurant_id}").json()["name"] == "Luigi's Trattoria"
+    assert {restaurant["name"] for restaurant in client.get("/restaurants").json()} == {"Luigi's Trattoria"} != listed
+
+    assert client.put(f"/menu-items/{item_id}", json={"price": 12.5}).status_code == 200
+    assert [item["price"] for item in client.get(menu).json()] == [12.5]
+    assert client.delete(f"/menu-items/{item_id}").status_code == 200
+    assert client.get(menu).json() == []
+
+    assert client.delete(f"/restaurants/{restaurant_id}").status_code == 200
+    assert client.get(f"/restaurants/{restaurant_id}").status_code == 404
+    assert client.get("/restaurants").json() == []
+
+
+def test_concurrent_misses_share_one_load():
+    load, calls = slow_load([["dish"]])
+
+    async def herd():
+        return await asyncio.gather(*[catalog_cache.get_or_load("menu:r1", "", adapter, load) for _ in range(50)])
+
+    assert asyncio.run(herd()) == [["dish"]] * 50
+    assert len(calls) == 1
+    # ...and the result was cached for the next reader
+    assert asyncio.run(catalog_cache.get_or_load("menu:r1", "", adapter, load)) == ["dish"]
+    assert len(calls) == 1
+
+
+def test_invalidation_detaches_an_in_flight_load():
+    load, calls = slow_load([["old"], ["new"]])
+
+    async def write_during_load():
+        first = asyncio.ensure_future(catalog_cache.get_or_load("menu:r1", "", adapter, load))
+        await asyncio.sleep(0)
+        await catalog_cache.invalidate_menu("r1")
+        second = await catalog_cache.get_or_load("menu:r1", "", adapter, load)
+        return await first, second
+
+    assert asyncio.run(write_during_load()) == (["old"], ["new"])
+    assert asyncio.run(catalog_cache.get_or_load("menu:r1", "", adapter, load)) == ["new"]
+
+
+def test_load_errors_are_shared_and_not_cached():
+    load, calls = slow_load([RuntimeError("database went away"), ["dish"]])
+
+    async def herd():
+        return await asyncio.gather(
+            *[catalog_cache.get_or_load("menu:r1", "", adapter, load) for _ in range(5)], return_exceptions=True
+        )
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(herd()))
+    assert asyncio.run(catalog_cache.get_or_load("menu:r1", "", adapter, load)) == ["dish"]
+    assert len(calls) == 2
+
+
+def test_encoded_responses_round_trip_with_content_etags():
+    etag, body = catalog_cache.encode_response(b'[{"name":"dish"}]')
+    assert etag.startswith('"') and etag.endswith('"')
+    assert catalog_cache.encode_response(b'[{"name":"dish"}]')[0] == etag
+    assert catalog_cache.encode_response(b'[{"name":"other"}]')[0] != etag
+    raw = catalog_cache.encoded_response_adapter.dump_json((etag, body))
+    assert catalog_cache.encoded_response_adapter.validate_json(raw) == (etag, body)
+
+
+def test_if_none_match():
+    etag = '"abc"'
+    assert catalog_cache.not_modified('"abc"', etag)
+    assert catalog_cache.not_modified('"x", W/"abc"', etag)
+    assert catalog_cache.not_modified("*", etag)
+    assert not catalog_cache.not_modified('"abd"', etag)
+    assert not catalog_cache.not_modified(None, etag)
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import User
+import crud
+import database
+
+
+def test_async_url_mapping():
+    assert database.to_async_url("postgresql://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert database.to_async_url("postgresql+psycopg2://db/app") == "postgresql+asyncpg://db/app"
+    assert database.to_async_url("sqlite:////tmp/app.db") == "sqlite+aiosqlite:////tmp/app.db"
+    assert database.to_async_url("postgresql+asyncpg://db/app") == "postgresql+asyncpg://db/app"
+
+
+def test_crud_runs_on_an_async_session(tmp_path, monkeypatch):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'async.db'}"
+
+    async def scenario():
+        engine = create_async_engine(url, **database.engine_kwargs(url, is_async=True))
+        async with engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        monkeypatch.setattr(database, "AsyncSessionLocal",
+                            async_sessionmaker(engine, autoflush=False, expire_on_commit=False))
+        try:
+            sessions = database.get_async_db()
+            db = await sessions.__anext__()
+            assert isinstance(db, AsyncSession)
+            db.add(User(email="customer@example.com", password_hash="x", first_name="Jo", last_name="Doe"))
+            await db.commit()
+            # crud is written against the sync Session API; run_db bridges it through run_sync
+            user = await database.run_db(db, crud.get_user_by_email, email="customer@example.com")
+            await sessions.aclose()
+
+            async with database.db_session() as other:
+                missing = await database.run_db(other, crud.get_user_by_email, email="nobody@example.com")
+            return user.first_name, missing
+        finally:
+            await engine.dispose()
+
+    monkeypatch.setattr(database, "DB_ASYNC", True)
+    assert asyncio.run(scenario()) == ("Jo", None)
+
+
+def test_run_db_uses_the_threadpool_for_a_sync_session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sync.db'}", connect_args={"check_same_thread": False})
+    database.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(email="customer@example.com", password_hash="x", first_name="Jo", last_name="Doe"))
+    db.commit()
+
+    async def scenario():
+        threads = []
+
+        def lookup(db, email):
+            threads.append(threading.get_ident())
+            return crud.get_user_by_email(db, email)
+
+        user = await database.run_db(db, lookup, email="customer@example.com")
+        return user.first_name, threads
+
+    first_name, threads = asyncio.run(scenario())
+    assert first_name == "Jo" and threads != [threading.get_ident()]
+    db.close()
+    engine.dispose()
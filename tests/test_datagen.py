@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import User, Restaurant, MenuItem, Order, OrderItem
+import datagen
+import reviews
+
+
+def generate(engine, **overrides):
+    params = dict(customers=200, restaurants=20, menu_items=8, orders=1500,
+                  start=datetime(2024, 1, 1), end=datetime(2024, 3, 1), progress=None)
+    return datagen.generate(engine, **{**params, **overrides})
+
+
+def test_generates_requested_volumes(engine):
+    written = generate(engine)
+
+    with Session(engine) as db:
+        assert db.scalar(select(func.count(Order.id))) == written["orders"] == 1500
+        assert db.scalar(select(func.count(Restaurant.id))) == 20
+        assert db.scalar(select(func.count(User.id)).where(User.role == "customer")) == 200
+        assert db.scalar(select(func.count(OrderItem.id))) == written["order_items"] >= 1500
+
+
+def test_rows_are_consistent(engine):
+    generate(engine)
+
+    with Session(engine) as db:
+        orphans = db.scalar(
+            select(func.count(OrderItem.id)).outerjoin(MenuItem, OrderItem.menu_item_id == MenuItem.id)
+            .where(MenuItem.id.is_(None))
+        )
+        assert orphans == 0
+        # Line items belong to the order's restaurant and add up to its subtotal
+        mismatched = db.scalar(
+            select(func.count(OrderItem.id)).join(Order).join(MenuItem)
+            .where(MenuItem.restaurant_id != Order.restaurant_id)
+        )
+        assert mismatched == 0
+        order = db.scalars(select(Order).order_by(Order.created_at)).first()
+        assert isinstance(order.created_at, datetime)
+        assert datetime(2024, 1, 1) <= order.created_at.replace(tzinfo=None) < datetime(2024, 3, 1)
+        assert order.subtotal == pytest.approx(sum(item.total_price for item in order.order_items), abs=0.05)
+        assert db.scalar(select(func.sum(Restaurant.total_orders))) == 1500
+
+
+def test_popularity_is_skewed(engine):
+    generate(engine)
+
+    with Session(engine) as db:
+        counts = db.scalars(select(Restaurant.total_orders).order_by(Restaurant.total_orders.desc())).all()
+    assert counts[0] > 5 * counts[len(counts) // 2]
+
+
+def test_same_seed_same_rows(engine):
+    generate(engine, seed=3)
+    other = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=other)
+    generate(other, seed=3)
+
+    query = select(Order.id, Order.restaurant_id, Order.total_amount).order_by(Order.id)
+    with engine.connect() as a, other.connect() as b:
+        assert a.execute(query).all() == b.execute(query).all()
+    other.dispose()
+
+
+def test_batches_respect_foreign_keys(engine, monkeypatch):
+    # Small batches so order_items (about twice as many rows as orders) fill first
+    monkeypatch.setattr(datagen, "BATCH_SIZE", 100)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+    written = generate(engine)
+
+    assert written["order_items"] > written["orders"] > datagen.BATCH_SIZE
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA foreign_key_check").all() == []
+
+
+def test_ratings_are_consistent(engine):
+    generate(engine)
+
+    with Session(engine) as db:
+        restaurants = db.scalars(select(Restaurant)).all()
+        assert all(r.total_reviews > 0 and r.average_rating == pytest.approx(r.rating_sum / r.total_reviews, abs=0.005)
+                   for r in restaurants)
+        before = [(r.id, r.rating_sum, r.total_reviews) for r in restaurants]
+        # No review rows were generated, so reconciliation keeps the generated totals
+        assert reviews.reconcile(db) == 0
+        assert [(r.id, r.rating_sum, r.total_reviews) for r in db.scalars(select(Restaurant))] == before
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, exc
+
+import db_pool
+
+
+def sample(name, label="sync"):
+    return REGISTRY.get_sample_value(name, {"engine": label}) or 0.0
+
+
+def test_engine_kwargs(monkeypatch):
+    assert db_pool.engine_kwargs("sqlite://") == {}
+    assert db_pool.engine_kwargs("sqlite+aiosqlite:///:memory:", is_async=True) == {}
+
+    kwargs = db_pool.engine_kwargs("sqlite:////tmp/app.db")
+    assert kwargs["poolclass"] is db_pool.InstrumentedQueuePool
+    assert kwargs["pool_size"] == db_pool.DB_POOL_SIZE and "connect_args" not in kwargs
+    assert db_pool.engine_kwargs("sqlite+aiosqlite:////tmp/app.db", is_async=True)["poolclass"] \
+        is db_pool.InstrumentedAsyncAdaptedQueuePool
+
+    monkeypatch.setattr(db_pool, "DB_STATEMENT_TIMEOUT_MS", 5000)
+    assert db_pool.engine_kwargs("postgresql://db/app")["connect_args"] == {"options": "-c statement_timeout=5000"}
+    assert db_pool.engine_kwargs("postgresql+asyncpg://db/app", is_async=True)["connect_args"] == {
+        "server_settings": {"statement_timeout": "5000"}
+    }
+    assert "connect_args" not in db_pool.engine_kwargs("sqlite:////tmp/app.db")
+
+
+def test_exhausted_pool_reports_waits_and_timeouts(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=db_pool.InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.2)
+    db_pool.register_pool_metrics(engine.pool, "test")
+    timeouts = sample("db_pool_timeouts_total")
+    waits = sample("db_pool_wait_seconds_count")
+    waited = sample("db_pool_wait_seconds_sum")
+
+    held = engine.connect()
+    assert sample("db_pool_checked_out", "test") == 1 and sample("db_pool_size", "test") == 1
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    assert sample("db_pool_timeouts_total") == timeouts + 1
+    assert sample("db_pool_wait_seconds_sum") - waited >= 0.2
+
+    # A caller queued behind the pool is counted until the connection comes back
+    queued = []
+    waiter = threading.Thread(target=lambda: queued.append(engine.connect()))
+    waiter.start()
+    time.sleep(0.05)
+    assert sample("db_pool_waiters") == 1
+    held.close()
+    waiter.join()
+    assert sample("db_pool_waiters") == 0 and sample("db_pool_wait_seconds_count") == waits + 3
+    queued[0].close()
+    engine.dispose()
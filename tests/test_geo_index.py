@@ -0,0 +1,78 @@
+import random
+from time import perf_counter
+
+import pytest
+
+from geo_index import GridIndex, haversine_km
+
+
+def scattered(lat, lng, count, spread, seed=7):
+    """count restaurants around (lat, lng), every third one closed"""
+    rng = random.Random(seed)
+    points = {}
+    for n in range(count):
+        r_lat = max(-90.0, min(90.0, lat + rng.uniform(-spread, spread)))
+        r_lng = (lng + rng.uniform(-spread * 4, spread * 4) + 180) % 360 - 180
+        points[f"r{n}"] = (r_lat, r_lng, n % 3 != 0)
+    index = GridIndex()
+    for restaurant_id, (r_lat, r_lng, is_open) in points.items():
+        index.upsert(restaurant_id, r_lat, r_lng, is_open)
+    return index, points
+
+
+def brute_force(points, lat, lng, radius_km, open_only=True):
+    return sorted(
+        (haversine_km(lat, lng, r_lat, r_lng), restaurant_id)
+        for restaurant_id, (r_lat, r_lng, is_open) in points.items()
+        if (is_open or not open_only) and haversine_km(lat, lng, r_lat, r_lng) <= radius_km
+    )
+
+
+@pytest.mark.parametrize("lat,lng", [(40.7, -74.0), (70.0, 20.0), (85.0, 0.0), (89.9, 45.0), (-89.95, 0.0),
+                                     (0.0, 179.95), (65.0, -179.99)])
+def test_radius_matches_brute_force(lat, lng):
+    index, points = scattered(lat, lng, 2000, 1.0)
+    for open_only in (True, False):
+        assert index.nearby(lat, lng, 50, len(points), open_only) == brute_force(points, lat, lng, 50, open_only)
+
+
+@pytest.mark.parametrize("lat,lng", [(40.7, -74.0), (80.0, 179.9)])
+def test_nearest_first_and_limited(lat, lng):
+    index, points = scattered(lat, lng, 2000, 1.0)
+    expected = brute_force(points, lat, lng, 50)
+    for limit in (1, 5, 20, 100):
+        assert index.nearby(lat, lng, 50, limit) == expected[:limit]
+
+
+def test_finds_restaurants_across_the_antimeridian_and_poleward():
+    index = GridIndex()
+    index.upsert("east", 10.0, 179.99, True)
+    index.upsert("west", 10.0, -179.99, True)
+    # 47 km from a 60°N query, and 22 km away on the far side of the pole
+    index.upsert("north", 60.4, 0.3, True)
+    index.upsert("over the pole", 89.9, 179.0, True)
+
+    assert [rid for _, rid in index.nearby(10.0, -179.995, 5, 10)] == ["west", "east"]
+    assert [rid for _, rid in index.nearby(60.0, 0.0, 50, 10)] == ["north"]
+    assert [rid for _, rid in index.nearby(89.9, 0.0, 25, 10)] == ["over the pole"]
+
+
+def test_polar_queries_stay_cheap():
+    index, _ = scattered(40.7, -74.0, 5000, 2.0)
+    index.upsert("pole", 89.95, 10.0, True)
+
+    started = perf_counter()
+    for lat in (85.0, 89.9, 90.0, -90.0):
+        index.nearby(lat, 0.0, 50, 20)
+    assert perf_counter() - started < 0.5
+    assert [rid for _, rid in index.nearby(90.0, 0.0, 50, 20)] == ["pole"]
+
+
+def test_moves_and_removals():
+    index = GridIndex()
+    index.upsert("r1", 40.7, -74.0, True)
+    index.upsert("r1", 41.7, -74.0, True)
+    assert index.nearby(40.7, -74.0, 50, 10) == []
+    assert [rid for _, rid in index.nearby(41.7, -74.0, 1, 10)] == ["r1"]
+    index.remove("r1")
+    assert len(index) == 0 and index.nearby(41.7, -74.0, 1, 10) == []
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import idempotency
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    monkeypatch.setattr(idempotency, "_store", idempotency.LocalIdempotencyStore(100))
+
+
+def counting_call(result=None, error=None):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)  # long enough for duplicates to arrive meanwhile
+        if error is not None:
+            raise error
+        return result
+
+    return call, calls
+
+
+def test_concurrent_duplicates_share_one_execution():
+    call, calls = counting_call({"id": "order-1"})
+
+    async def submit():
+        return await asyncio.gather(*[idempotency.run("k", "user:POST /orders", {"a": 1}, call) for _ in range(5)])
+
+    results = asyncio.run(submit())
+    assert len(calls) == 1
+    assert results[0] == {"id": "order-1"}
+    assert all(result.headers["Idempotent-Replayed"] == "true" for result in results[1:])
+
+
+def test_completed_request_is_replayed_and_bound_to_its_payload():
+    call, calls = counting_call({"id": "order-1"})
+    asyncio.run(idempotency.run("k", "user:POST /orders", {"a": 1}, call))
+
+    replayed = asyncio.run(idempotency.run("k", "user:POST /orders", {"a": 1}, call))
+    assert replayed.body == b'{"id":"order-1"}'
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(idempotency.run("k", "user:POST /orders", {"a": 2}, call))
+    assert raised.value.status_code == 422
+    # Keys are scoped: another user's identical key runs on its own
+    asyncio.run(idempotency.run("k", "other:POST /orders", {"a": 1}, call))
+    assert len(calls) == 2
+
+
+def test_failures_are_shared_but_not_stored():
+    call, calls = counting_call(error=HTTPException(status_code=404, detail="Restaurant not found"))
+
+    async def submit():
+        return await asyncio.gather(
+            *[idempotency.run("k", "user:POST /orders", {"a": 1}, call) for _ in range(3)], return_exceptions=True
+        )
+
+    assert [error.status_code for error in asyncio.run(submit())] == [404, 404, 404]
+    assert len(calls) == 1
+
+    call, calls = counting_call(error=RuntimeError("database went away"))
+    with pytest.raises(RuntimeError):
+        asyncio.run(idempotency.run("k", "user:POST /orders", {"a": 1}, call))
+    call, calls = counting_call({"id": "order-2"})
+    assert asyncio.run(idempotency.run("k", "user:POST /orders", {"a": 1}, call)) == {"id": "order-2"}
+
+
+def test_claim_outlives_a_slow_request(monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_LOCK_SECONDS", 0.03)
+
+    async def slow_call():
+        await asyncio.sleep(0.15)  # several lock lifetimes, e.g. stuck behind pool waits
+        return {"id": "order-1"}
+
+    async def scenario():
+        running = asyncio.ensure_future(idempotency.run("k", "user:POST /orders", {"a": 1}, slow_call))
+        await asyncio.sleep(0.1)
+        # A retry landing on another worker finds the claim still held
+        claimed_elsewhere = await idempotency._store.claim("user:POST /orders:k", "other worker", 0.03)
+        return claimed_elsewhere, await running
+
+    assert asyncio.run(scenario()) == (False, {"id": "order-1"})
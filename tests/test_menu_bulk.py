@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import pytest
+
+from models import User, Restaurant, MenuItem
+import crud
+import menu_bulk
+
+
+@pytest.fixture
+def restaurant_id(db):
+    owner = User(email="owner@example.com", password_hash="x", first_name="Own", last_name="Er", role="seller")
+    db.add(owner)
+    db.flush()
+    restaurant = Restaurant(owner_id=owner.id, name="R", cuisine_type="italian", street_address="1 Main St",
+                            city="Town", state="CA", postal_code="90000")
+    db.add(restaurant)
+    db.commit()
+    return restaurant.id
+
+
+def read(body, import_format, chunk_size=7):
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+    return asyncio.run(menu_bulk.read_items(chunks(), import_format))
+
+
+def test_csv_import_parses_quoted_fields_across_chunks():
+    body = 'name,price,description,is_vegan\nSoup,4.5,"hot,\n""fresh""",true\nBread,2,,\n'.encode()
+
+    items, errors = read(body, "csv")
+
+    assert errors == []
+    assert [(item.name, item.price, item.description, item.is_vegan) for item in items] == [
+        ("Soup", 4.5, 'hot,\n"fresh"', True), ("Bread", 2.0, None, False),
+    ]
+
+
+def test_import_reports_every_invalid_row():
+    body = b'{"name": "A", "price": "x"}\n{"name": "B", "price": 1}\n{"name": "B", "price": 2}\n'
+
+    items, errors = read(body, "ndjson")
+
+    assert [error["row"] for error in errors] == [1, 3]
+
+
+def test_json_import_body_is_size_limited(monkeypatch):
+    body = json.dumps([{"name": f"Dish {n}", "price": 5} for n in range(20)]).encode()
+    monkeypatch.setattr(menu_bulk, "MENU_IMPORT_MAX_JSON_BYTES", len(body))
+    assert len(read(body, "json")[0]) == 20
+
+    monkeypatch.setattr(menu_bulk, "MENU_IMPORT_MAX_JSON_BYTES", len(body) - 1)
+    with pytest.raises(menu_bulk.TooManyItems):
+        read(body, "json")
+    # Streamed formats are not held whole, so only the item limit applies to them
+    ndjson = b"\n".join(json.dumps({"name": f"Dish {n}", "price": 5}).encode() for n in range(20))
+    assert len(read(ndjson, "ndjson")[0]) == 20
+
+
+def test_import_statement_count_is_independent_of_menu_size(db, restaurant_id, count_queries):
+    statements = count_queries
+
+    def import_menu(category, count):
+        rows = (f'{{"name": "Dish {n}", "price": {n}, "category": "{category}"}}' for n in range(count))
+        items, _ = read("\n".join(rows).encode(), "ndjson")
+        statements.clear()
+        crud.import_menu_items(db, restaurant_id, items, batch_size=1000)
+        return len(statements)
+
+    assert import_menu("mains", 10) == import_menu("desserts", 500)
+    assert db.query(MenuItem).count() == 510
+
+
+def test_import_upserts_and_prunes(db, restaurant_id):
+    items, _ = read(b'[{"name": "Soup", "price": 4}, {"name": "Bread", "price": 2}]', "json")
+    crud.import_menu_items(db, restaurant_id, items)
+    soup_id = db.query(MenuItem.id).filter(MenuItem.name == "Soup").scalar()
+
+    items, _ = read(f'[{{"id": "{soup_id}", "name": "Tomato soup", "price": 5}}]'.encode(), "json")
+    inserts, updates, pruned_ids = crud.import_menu_items(db, restaurant_id, items, prune=True)
+
+    assert (len(inserts), len(updates), len(pruned_ids)) == (0, 1, 1)
+    db.expire_all()
+    menu = {item.name: (item.price, item.is_available) for item in db.query(MenuItem)}
+    assert menu == {"Tomato soup": (5.0, True), "Bread": (2.0, False)}
+
+
+def test_export_encodes_json_array():
+    rows = [dict.fromkeys(menu_bulk.EXPORT_FIELDS, 1) for _ in range(3)]
+
+    assert "".join(menu_bulk.encode_export([], "json")) == "[]"
+    assert len(json.loads("".join(menu_bulk.encode_export(rows, "json")))) == 3
@@ -0,0 +1,46 @@
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import metrics
+
+
+def routes_recorded():
+    return {route for _, route, _ in metrics.REQUEST_SECONDS._series}
+
+
+def test_streams_stay_out_of_request_metrics():
+    app = FastAPI()
+    in_flight_while_streaming = []
+
+    @app.get("/metrics-test/plain")
+    async def plain():
+        return {"ok": True}
+
+    @app.get("/metrics-test/events")
+    async def events():
+        async def stream():
+            yield "retry: 3000\n\n"
+            in_flight_while_streaming.append(metrics._in_flight)
+            yield "event: ping\ndata: {}\n\n"
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.websocket("/metrics-test/ws")
+    async def socket(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_json({"ok": True})
+        await websocket.close()
+
+    app.add_middleware(metrics.RequestMetricsMiddleware)
+    in_flight = metrics._in_flight
+    with TestClient(app) as client:
+        assert client.get("/metrics-test/plain").status_code == 200
+        assert "event: ping" in client.get("/metrics-test/events").text
+        with client.websocket_connect("/metrics-test/ws") as websocket:
+            assert websocket.receive_json() == {"ok": True}
+
+    assert "/metrics-test/plain" in routes_recorded()
+    assert not {"/metrics-test/events", "/metrics-test/ws"} & routes_recorded()
+    # The open stream no longer counted as an in-flight request, and nothing leaked
+    assert in_flight_while_streaming == [in_flight]
+    assert metrics._in_flight == in_flight
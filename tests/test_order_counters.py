@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import func, select
+
+from models import User, Restaurant, MenuItem, RestaurantOrderCountShard
+from schemas import OrderCreate, OrderItemCreate
+import crud
+import order_counters
+
+
+@pytest.fixture
+def menu(db):
+    customer = User(email="customer@example.com", password_hash="x", first_name="Jo", last_name="Doe")
+    owner = User(email="owner@example.com", password_hash="x", first_name="Own", last_name="Er", role="seller")
+    db.add_all([customer, owner])
+    db.flush()
+    restaurants = [
+        Restaurant(owner_id=owner.id, name=f"R{n}", cuisine_type="italian", street_address="1 Main St",
+                   city="Town", state="CA", postal_code="90000")
+        for n in range(2)
+    ]
+    db.add_all(restaurants)
+    db.flush()
+    items = [MenuItem(restaurant_id=restaurant.id, name="Pizza", price=10.0) for restaurant in restaurants]
+    db.add_all(items)
+    db.commit()
+    return customer.id, [(restaurant.id, item.id) for restaurant, item in zip(restaurants, items)]
+
+
+def place(db, customer_id, restaurant_id, item_id):
+    order = OrderCreate(restaurant_id=restaurant_id, delivery_address="2 Side St",
+                        items=[OrderItemCreate(menu_item_id=item_id, quantity=1)])
+    return crud.create_order(db, order, customer_id)
+
+
+def total_orders(db):
+    db.expire_all()
+    return {restaurant.id: restaurant.total_orders for restaurant in db.scalars(select(Restaurant))}
+
+
+def test_checkout_does_not_write_the_restaurant_row(db, menu, count_queries):
+    customer_id, [(restaurant_id, item_id), _] = menu
+    statements = count_queries
+    statements.clear()
+
+    place(db, customer_id, restaurant_id, item_id)
+    assert not [statement for statement in statements if statement.lstrip().upper().startswith("UPDATE RESTAURANTS")]
+
+
+def test_fold_moves_shard_counts_into_total_orders(db, menu):
+    customer_id, [(first_id, first_item), (second_id, second_item)] = menu
+    for _ in range(5):
+        place(db, customer_id, first_id, first_item)
+    place(db, customer_id, second_id, second_item)
+
+    assert order_counters.fold(db) == 6
+    assert total_orders(db) == {first_id: 5, second_id: 1}
+    assert db.scalar(select(func.sum(RestaurantOrderCountShard.orders))) == 0
+
+    # Orders counted after a fold wait for the next one
+    place(db, customer_id, second_id, second_item)
+    assert total_orders(db) == {first_id: 5, second_id: 1}
+    assert order_counters.fold(db) == 1
+    assert order_counters.fold(db) == 0
+    assert total_orders(db) == {first_id: 5, second_id: 2}
@@ -0,0 +1,90 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import order_events
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = order_events.LocalBroker()
+    monkeypatch.setattr(order_events, "broker", broker)
+    return broker
+
+
+def user(user_id, role):
+    return SimpleNamespace(id=user_id, role=role)
+
+
+def event(order_id="o1", customer_id="c1", owner_id="s1", status="confirmed"):
+    return {"order_id": order_id, "restaurant_id": "r1", "customer_id": customer_id, "owner_id": owner_id,
+            "status": status, "previous_status": "pending", "at": "2024-01-01T00:00:00Z"}
+
+
+def drain(subscription):
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait()["order_id"])
+    return events
+
+
+def test_events_reach_their_customer_owner_and_admins_only(broker):
+    subscriptions = {
+        name: broker.subscribe(order_events.subscription_key(user(user_id, role)))
+        for name, user_id, role in (("customer", "c1", "customer"), ("other customer", "c2", "customer"),
+                                    ("owner", "s1", "seller"), ("other owner", "s2", "seller"),
+                                    ("admin", "a1", "admin"))
+    }
+    broker.deliver(event())
+
+    assert {name: drain(subscription) for name, subscription in subscriptions.items()} == {
+        "customer": ["o1"], "other customer": [], "owner": ["o1"], "other owner": [], "admin": ["o1"],
+    }
+
+
+def test_order_id_narrows_a_subscription(broker):
+    subscription = broker.subscribe(order_events.customer_key("c1"), order_id="o2")
+    broker.deliver(event(order_id="o1"))
+    broker.deliver(event(order_id="o2"))
+    assert drain(subscription) == ["o2"]
+
+
+def test_a_seller_cannot_follow_another_restaurants_order(broker):
+    # The key comes from the authenticated user, so naming someone else's order is not enough
+    subscription = broker.subscribe(order_events.subscription_key(user("s2", "seller")), order_id="o1")
+    assert subscription.key == order_events.seller_key("s2")
+    broker.deliver(event(order_id="o1", owner_id="s1"))
+    assert drain(subscription) == []
+    # A customer role never maps onto a seller's or admin's key
+    assert order_events.subscription_key(user("s1", "customer")) == order_events.customer_key("s1")
+
+
+def test_stalled_subscriber_is_dropped(broker, monkeypatch):
+    monkeypatch.setattr(order_events, "ORDER_EVENTS_QUEUE_SIZE", 2)
+    subscription = broker.subscribe(order_events.customer_key("c1"))
+    for order_id in ("o1", "o2", "o3"):
+        broker.deliver(event(order_id=order_id))
+
+    assert subscription.dropped
+    assert drain(subscription) == ["o1", "o2"]
+    broker.deliver(event(order_id="o4"))
+    assert drain(subscription) == []
+
+
+def test_sse_stream_hides_routing_keys_and_unsubscribes(broker):
+    async def scenario():
+        subscription = broker.subscribe(order_events.customer_key("c1"))
+        stream = order_events.sse_stream(subscription)
+        assert await stream.__anext__() == "retry: 3000\n\n"
+        await broker.publish(event())
+        frame = await stream.__anext__()
+        await stream.aclose()
+        return frame, broker._subscriptions
+
+    frame, subscriptions = asyncio.run(scenario())
+    name, data = frame.strip().split("\n")
+    assert name == "event: order_status"
+    assert json.loads(data.removeprefix("data: ")) == {key: value for key, value in event().items() if key != "owner_id"}
+    assert subscriptions == {}
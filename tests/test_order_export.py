@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import order_export
+
+
+@pytest.fixture(autouse=True)
+def exports(monkeypatch):
+    monkeypatch.setattr(order_export, "ORDER_EXPORT_MAX_CONCURRENT", 2)
+    monkeypatch.setattr(order_export, "_exports_in_flight", 0)
+
+    def export_chunks(export_format, **filters):
+        yield "id\n"
+        yield "o1\n"
+
+    monkeypatch.setattr(order_export, "_export_chunks", export_chunks)
+
+
+async def request():
+    """What the endpoint does: admission, then the response (None when turned away)"""
+    try:
+        slot = order_export.check_capacity()
+    except HTTPException as e:
+        assert e.status_code == 503 and e.headers["Retry-After"]
+        return None
+    await asyncio.sleep(0)  # the response is only sent later; other requests arrive meanwhile
+    return order_export.ExportResponse(order_export.stream_export("csv"), slot=slot, media_type="text/csv")
+
+
+def run(response, send):
+    async def receive():
+        await asyncio.sleep(60)
+    return response({"type": "http", "method": "GET", "path": "/orders/export"}, receive, send)
+
+
+def test_a_burst_is_capped_before_any_body_streams():
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def burst():
+        responses = await asyncio.gather(*[request() for _ in range(5)])
+        admitted = [response for response in responses if response is not None]
+        assert len(admitted) == 2 and order_export._exports_in_flight == 2
+        await asyncio.gather(*[run(response, send) for response in admitted])
+
+    asyncio.run(burst())
+    assert order_export._exports_in_flight == 0
+    assert sorted(message["body"] for message in sent if message.get("body")) == [b"id\n", b"id\n", b"o1\n", b"o1\n"]
+
+
+def test_slot_is_released_when_the_body_never_starts():
+    async def send(message):
+        raise OSError("client went away")
+
+    async def scenario():
+        response = await request()
+        with pytest.raises(OSError):
+            await run(response, send)
+
+    asyncio.run(scenario())
+    assert order_export._exports_in_flight == 0
+    order_export.check_capacity().release()
@@ -0,0 +1,172 @@
+from datetime import datetime
+
+from models import User, Restaurant, MenuItem, Order, OrderItem
+from schemas import OrderCreate, OrderItemCreate, OrderResponse, OrderUpdate
+import crud
+
+
+def seed_orders(db, count):
+    customer = User(email="customer@example.com", password_hash="x", first_name="Jo", last_name="Doe")
+    owners = [User(email=f"owner{i}@example.com", password_hash="x", first_name="Own", last_name=str(i), role="seller")
+              for i in range(3)]
+    db.add_all([customer, *owners])
+    db.flush()
+
+    restaurants = []
+    for i, owner in enumerate(owners):
+        restaurant = Restaurant(owner_id=owner.id, name=f"R{i}", cuisine_type="italian", street_address="1 Main St",
+                                city="Town", state="CA", postal_code="90000")
+        restaurants.append(restaurant)
+    db.add_all(restaurants)
+    db.flush()
+
+    menu_items = [MenuItem(restaurant_id=r.id, name=f"Dish {j}", price=10.0 + j) for r in restaurants for j in range(4)]
+    db.add_all(menu_items)
+    db.flush()
+
+    for n in range(count):
+        restaurant = restaurants[n % len(restaurants)]
+        order = Order(customer_id=customer.id, restaurant_id=restaurant.id, delivery_address="2 Side St",
+                      subtotal=20.0, delivery_fee=2.99, tax_amount=1.6, total_amount=24.59)
+        db.add(order)
+        db.flush()
+        for item in [m for m in menu_items if m.restaurant_id == restaurant.id][:2]:
+            db.add(OrderItem(order_id=order.id, menu_item_id=item.id, quantity=1, unit_price=item.price,
+                             total_price=item.price))
+    db.commit()
+    owner_ids = [owner.id for owner in owners]
+    db.expunge_all()
+    return owner_ids
+
+
+def serialized_query_count(db, statements, **kwargs):
+    db.expunge_all()
+    statements.clear()
+    orders = crud.get_orders(db, **kwargs)
+    payload = [OrderResponse.model_validate(order) for order in orders]
+    assert len(payload) == kwargs["limit"]
+    return len(statements)
+
+
+def test_order_list_query_count_is_independent_of_page_size(db, count_queries):
+    seed_orders(db, 60)
+
+    small_page = serialized_query_count(db, count_queries, limit=5)
+    large_page = serialized_query_count(db, count_queries, limit=50)
+
+    assert small_page == large_page
+    assert large_page <= 3
+
+
+def test_seller_order_list_query_count_is_independent_of_page_size(db, count_queries):
+    owner_ids = seed_orders(db, 60)
+
+    small_page = serialized_query_count(db, count_queries, limit=2, seller_id=owner_ids[0])
+    large_page = serialized_query_count(db, count_queries, limit=20, seller_id=owner_ids[0])
+
+    assert small_page == large_page
+
+
+def test_order_detail_loads_response_graph_up_front(db, count_queries):
+    seed_orders(db, 3)
+    order_id = db.query(Order.id).first()[0]
+
+    db.expunge_all()
+    count_queries.clear()
+    order = crud.get_order(db, order_id)
+    OrderResponse.model_validate(order)
+
+    assert len(count_queries) <= 2
+
+
+def test_order_transition_is_one_conditional_update(db, count_queries):
+    seed_orders(db, 1)
+    order_id = db.query(Order.id).first()[0]
+    owner_id = db.get(Order, order_id).restaurant.owner_id
+
+    db.expunge_all()
+    count_queries.clear()
+    order, previous_status = crud.update_order(db, order_id, OrderUpdate(status="confirmed"), owner_id=owner_id)
+
+    assert (order.status, previous_status) == ("confirmed", "pending")
+    # No read-then-write: the first statement is the conditional UPDATE, carrying the
+    # ownership and status checks; what follows only loads the response
+    transition = count_queries[0].upper()
+    assert "UPDATE ORDERS" in transition and "RETURNING" in transition
+    assert "ORDERS.STATUS IN" in transition and "RESTAURANTS.OWNER_ID" in transition
+    assert [statement.lstrip().upper().split()[0] for statement in count_queries[1:]] == ["SELECT", "SELECT"]
+
+
+def test_order_transition_loses_race_on_stale_status(db):
+    seed_orders(db, 1)
+    order_id = db.query(Order.id).first()[0]
+
+    assert crud.update_order(db, order_id, OrderUpdate(status="cancelled"))[0]
+    # A second writer that also saw "pending" must not overwrite the cancellation
+    assert crud.update_order(db, order_id, OrderUpdate(status="confirmed")) == (None, None)
+    assert crud.get_order(db, order_id).status == "cancelled"
+
+
+def test_order_transition_checks_ownership(db):
+    seed_orders(db, 1)
+    order = db.query(Order).first()
+    order_id, owner_id = order.id, order.restaurant.owner_id
+    other_owner_id = db.query(Restaurant.owner_id).filter(Restaurant.owner_id != owner_id).first()[0]
+
+    assert crud.update_order(db, order_id, OrderUpdate(status="confirmed"), owner_id=other_owner_id) == (None, None)
+    assert crud.update_order(db, order_id, OrderUpdate(), owner_id=other_owner_id) == (None, None)
+    assert crud.get_order(db, order_id).status == "pending"
+
+
+def test_repeated_delivery_keeps_the_delivery_time(db):
+    seed_orders(db, 1)
+    order_id = db.query(Order.id).first()[0]
+    delivered_at = datetime(2024, 1, 1, 12, 30)
+
+    crud.update_order(db, order_id, OrderUpdate(status="delivered", actual_delivery_time=delivered_at),
+                      expected_status="pending")
+    order, previous_status = crud.update_order(db, order_id, OrderUpdate(status="delivered"))
+
+    assert previous_status == "delivered"
+    assert order.actual_delivery_time == delivered_at
+
+
+def test_order_lifecycle_transitions():
+    assert crud.can_transition("pending", "confirmed")
+    assert crud.can_transition("ready", "picked_up")
+    assert crud.can_transition("confirmed", "confirmed")
+    assert not crud.can_transition("pending", "delivered")
+    assert not crud.can_transition("delivering", "cancelled")
+    assert not crud.can_transition("cancelled", "pending")
+
+
+def test_order_export_streams_in_partitions(db):
+    owner_ids = seed_orders(db, 25)
+
+    partitions = list(crud.iter_order_export_rows(db, batch_size=10))
+    assert [len(partition) for partition in partitions] == [10, 10, 5]
+
+    seller_rows = [row for partition in crud.iter_order_export_rows(db, 10, seller_id=owner_ids[0]) for row in partition]
+    assert len(seller_rows) == 9
+    assert [row.created_at for row in seller_rows] == sorted(row.created_at for row in seller_rows)
+
+
+def test_checkout_statement_count_is_independent_of_cart_size(db, count_queries):
+    seed_orders(db, 0)
+    customer_id = db.query(User).filter_by(role="customer").one().id
+    restaurant_id = db.query(Restaurant).filter_by(name="R0").one().id
+    item_ids = [item.id for item in db.query(MenuItem).filter_by(restaurant_id=restaurant_id)]
+
+    def statements_for(lines):
+        order = OrderCreate(restaurant_id=restaurant_id, delivery_address="2 Side St",
+                            items=[OrderItemCreate(menu_item_id=item_id, quantity=2) for item_id in lines])
+        db.expunge_all()
+        count_queries.clear()
+        assert len(crud.create_order(db, order, customer_id).order_items) == len(lines)
+        return [statement.lstrip().split()[0].upper() for statement in count_queries]
+
+    # Restaurant and menu items; the order, its items (one executemany), the two
+    # rollups and the counter shard; then the order read back with its items
+    expected = ["SELECT", "SELECT", "INSERT", "INSERT", "INSERT", "INSERT", "INSERT", "SELECT", "SELECT"]
+    assert statements_for(item_ids[:1]) == expected
+    assert statements_for(item_ids) == expected
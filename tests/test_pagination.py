@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from models import User, Restaurant
+from pagination import decode_cursor, encode_cursor, next_cursor
+import crud
+import main
+
+
+@pytest.fixture
+def restaurant_ids(db):
+    owner = User(email="owner@example.com", password_hash="x", first_name="Own", last_name="Er", role="seller")
+    db.add(owner)
+    db.flush()
+    # Groups of five restaurants created in the same instant, so pages split ties
+    base = datetime(2024, 1, 1, 12, 0)
+    restaurants = [
+        Restaurant(owner_id=owner.id, name=f"R{n}", cuisine_type="italian", street_address="1 Main St",
+                   city="Town", state="CA", postal_code="90000", created_at=base + timedelta(seconds=n // 5))
+        for n in range(23)
+    ]
+    db.add_all(restaurants)
+    db.commit()
+    return [restaurant.id for restaurant in sorted(restaurants, key=lambda r: (r.created_at, r.id), reverse=True)]
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 1, 1, 12, 0, 0, 123456)
+    assert decode_cursor(encode_cursor(created_at, "r1")) == (created_at, "r1")
+
+
+@pytest.mark.parametrize("limit", [1, 3, 5, 7, 23])
+def test_pages_neither_repeat_nor_skip_rows(db, restaurant_ids, limit):
+    seen, cursor = [], None
+    while True:
+        page = crud.get_restaurants(db, limit=limit, cursor=cursor)
+        seen.extend(restaurant.id for restaurant in page)
+        cursor = next_cursor(page, limit)
+        if cursor is None:
+            break
+    assert seen == restaurant_ids
+
+
+def test_first_cursor_page_matches_offset_page(db, restaurant_ids):
+    first = crud.get_restaurants(db, limit=7)
+    assert [r.id for r in crud.get_restaurants(db, limit=7, cursor=next_cursor(first, 7))] == restaurant_ids[7:14]
+    assert [r.id for r in crud.get_restaurants(db, skip=7, limit=7)] == restaurant_ids[7:14]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "bm9wZQ", encode_cursor(datetime(2024, 1, 1), "r1")[:-3], "WzFd"])
+def test_malformed_cursor_is_a_400(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+    # Rejected by the dependency, before the endpoint touches the database
+    response = TestClient(main.app).get("/restaurants", params={"cursor": cursor})
+    assert response.status_code == 400
+
+
+def test_cursor_and_skip_cannot_be_combined():
+    cursor = encode_cursor(datetime(2024, 1, 1), "r1")
+    response = TestClient(main.app).get("/restaurants", params={"cursor": cursor, "skip": 10})
+    assert response.status_code == 400
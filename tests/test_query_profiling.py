@@ -0,0 +1,90 @@
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+import query_profiling
+from query_profiling import condense_sql, normalize_sql
+
+ROUTE = "/profiling-test/items/{item_id}"
+
+
+def test_normalize_sql_folds_literals_and_parameter_lists():
+    assert normalize_sql("SELECT *\n  FROM users WHERE id = 42 AND email = 'o''brien@example.com' LIMIT 10") == \
+        "SELECT * FROM users WHERE id = ? AND email = ? LIMIT ?"
+    assert normalize_sql("SELECT id FROM menu_items WHERE id IN (?, ?, ?)") == \
+        normalize_sql("SELECT id FROM menu_items WHERE id IN (%(id_1)s, %(id_2)s)") == \
+        "SELECT id FROM menu_items WHERE id IN (...)"
+    assert normalize_sql("SELECT id FROM orders WHERE id IN (__[POSTCOMPILE_id_1])") == \
+        "SELECT id FROM orders WHERE id IN (...)"
+    # Identifiers that merely contain digits are kept
+    assert normalize_sql("SELECT users_1.id FROM users AS users_1") == "SELECT users_1.id FROM users AS users_1"
+    assert condense_sql("SELECT a, b FROM t WHERE x = ?") == "SELECT ... FROM t WHERE x = ?"
+    assert condense_sql("INSERT INTO orders (id, status) VALUES (...)") == "INSERT INTO orders (...) VALUES (...)"
+
+
+@pytest.fixture
+def client(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'profiling.db'}")
+    query_profiling.instrument_engine(engine)
+    app = FastAPI()
+
+    @app.get(ROUTE)
+    def item(item_id: int):
+        # A sync endpoint: its queries run on a threadpool thread, under the request's profile
+        with engine.connect() as conn:
+            for n in range(item_id):
+                conn.execute(text(f"SELECT {n} AS n"))
+        return {"ok": True}
+
+    app.add_middleware(query_profiling.QueryProfilingMiddleware)
+    yield TestClient(app)
+    engine.dispose()
+
+
+def series(histogram):
+    return histogram._series.get(("GET", ROUTE))
+
+
+def observations(histogram):
+    values = series(histogram)
+    return (sum(values[:-1]), values[-1]) if values else (0, 0)
+
+
+def test_statements_are_counted_per_route(client, monkeypatch):
+    monkeypatch.setattr(query_profiling, "QUERY_PROFILING_HEADERS", False)
+    count, total = observations(query_profiling.REQUEST_STATEMENTS)
+
+    response = client.get("/profiling-test/items/3")
+    assert "x-db-statements" not in response.headers
+    assert observations(query_profiling.REQUEST_STATEMENTS) == (count + 1, total + 3)
+    client.get("/profiling-test/items/5")
+    assert observations(query_profiling.REQUEST_STATEMENTS) == (count + 2, total + 8)
+    assert observations(query_profiling.REQUEST_DB_SECONDS)[0] >= 2
+
+
+def test_profile_headers(client, monkeypatch):
+    monkeypatch.setattr(query_profiling, "QUERY_PROFILING_HEADERS", True)
+
+    response = client.get("/profiling-test/items/4")
+    assert response.headers["x-db-statements"] == "4"
+    assert float(response.headers["x-db-time-ms"]) > 0
+    slowest = response.headers["x-db-slowest"].split(" | ")
+    assert len(slowest) == query_profiling.QUERY_PROFILING_TOP
+    assert all(entry.endswith("ms SELECT ? AS n") for entry in slowest)
+
+
+def test_slow_queries_are_logged_with_their_route(client, monkeypatch, caplog):
+    monkeypatch.setattr(query_profiling, "SLOW_QUERY_MS", 0.000001)
+    with caplog.at_level(logging.WARNING, logger="query_profiling"):
+        client.get("/profiling-test/items/2")
+    assert [record.getMessage().split(": ", 1)[1] for record in caplog.records] == ["SELECT ? AS n"] * 2
+    assert all(f"on {ROUTE}" in record.getMessage() for record in caplog.records)
+
+    caplog.clear()
+    monkeypatch.setattr(query_profiling, "SLOW_QUERY_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="query_profiling"):
+        client.get("/profiling-test/items/2")
+    assert caplog.records == []
@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import text
+
+from models import User, Restaurant
+from schemas import ReviewCreate, ReviewUpdate
+import crud
+import reviews
+
+
+@pytest.fixture
+def restaurant(db):
+    owner = User(email="owner@example.com", password_hash="x", first_name="Own", last_name="Er", role="seller")
+    customers = [User(email=f"c{n}@example.com", password_hash="x", first_name="C", last_name=str(n)) for n in range(3)]
+    db.add_all([owner, *customers])
+    db.flush()
+    restaurant = Restaurant(owner_id=owner.id, name="R", cuisine_type="italian", street_address="1 Main St",
+                            city="Town", state="CA", postal_code="90000")
+    db.add(restaurant)
+    db.commit()
+    return restaurant.id, [customer.id for customer in customers]
+
+
+def totals(db, restaurant_id):
+    db.expire_all()
+    restaurant = db.get(Restaurant, restaurant_id)
+    return restaurant.rating_sum, restaurant.total_reviews, restaurant.average_rating
+
+
+def test_running_totals_follow_review_writes(db, restaurant):
+    restaurant_id, customer_ids = restaurant
+    review_ids = [crud.create_review(db, ReviewCreate(rating=rating), restaurant_id, customer_id).id
+                  for rating, customer_id in zip((5, 4, 1), customer_ids)]
+    assert totals(db, restaurant_id) == (10, 3, pytest.approx(10 / 3))
+
+    crud.update_review(db, review_ids[2], ReviewUpdate(rating=3), expected_rating=1)
+    assert crud.delete_review(db, review_ids[0])
+    assert not crud.delete_review(db, review_ids[0])
+    assert totals(db, restaurant_id) == (7, 2, 3.5)
+    assert reviews.reconcile(db) == 0
+
+
+def test_review_writes_never_scan_the_restaurants_reviews(db, restaurant, count_queries):
+    restaurant_id, customer_ids = restaurant
+    review_id = crud.create_review(db, ReviewCreate(rating=2), restaurant_id, customer_ids[0]).id
+    statements = count_queries
+    statements.clear()
+
+    crud.create_review(db, ReviewCreate(rating=4), restaurant_id, customer_ids[1])
+    crud.update_review(db, review_id, ReviewUpdate(rating=5), expected_rating=2)
+    crud.delete_review(db, review_id)
+    assert not [statement for statement in statements if "count(" in statement.lower() or "avg(" in statement.lower()]
+
+
+def test_duplicate_and_stale_writes_are_rejected(db, restaurant):
+    restaurant_id, customer_ids = restaurant
+    review = crud.create_review(db, ReviewCreate(rating=4), restaurant_id, customer_ids[0])
+    assert crud.create_review(db, ReviewCreate(rating=1), restaurant_id, customer_ids[0]) is None
+    # Another edit already moved the rating off 2
+    assert crud.update_review(db, review.id, ReviewUpdate(rating=5), expected_rating=2) is None
+    assert totals(db, restaurant_id) == (4, 1, 4.0)
+
+
+def test_reconcile_repairs_drift(db, restaurant):
+    restaurant_id, customer_ids = restaurant
+    for rating, customer_id in zip((5, 2), customer_ids):
+        crud.create_review(db, ReviewCreate(rating=rating), restaurant_id, customer_id)
+    db.query(Restaurant).update({"rating_sum": 0, "total_reviews": 40, "average_rating": 4.9})
+    db.commit()
+
+    assert reviews.reconcile(db, batch_size=1) == 1
+    assert totals(db, restaurant_id) == (7, 2, 3.5)
+
+
+def test_reconcile_keeps_imported_ratings(db, restaurant):
+    restaurant_id, customer_ids = restaurant
+    # Sample data style: totals without review rows behind them
+    db.query(Restaurant).update({"rating_sum": 1053, "total_reviews": 234, "average_rating": 4.5})
+    db.commit()
+
+    assert reviews.reconcile(db) == 0 and reviews.migrate(db) == 0
+    assert totals(db, restaurant_id) == (1053, 234, 4.5)
+    # Once real reviews exist they are the source of truth
+    crud.create_review(db, ReviewCreate(rating=3), restaurant_id, customer_ids[0])
+    assert reviews.reconcile(db) == 1
+    assert totals(db, restaurant_id) == (3, 1, 3.0)
+
+
+def test_migrate_adds_and_backfills_rating_sum(db, restaurant):
+    restaurant_id, customer_ids = restaurant
+    for rating, customer_id in zip((5, 2), customer_ids):
+        crud.create_review(db, ReviewCreate(rating=rating), restaurant_id, customer_id)
+    # A database from before running totals: no rating_sum column
+    db.execute(text("ALTER TABLE restaurants DROP COLUMN rating_sum"))
+    db.execute(text("UPDATE restaurants SET total_reviews = 0, average_rating = 0"))
+    db.commit()
+
+    assert reviews.migrate(db) == 1
+    assert totals(db, restaurant_id) == (7, 2, 3.5)
+    assert reviews.migrate(db) == 0
@@ -0,0 +1,196 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from models import User, Restaurant, MenuItem
+from search_index import CatalogSearchIndex, InvertedIndex, menu_item_filter, tokenize
+import crud
+import search_index
+
+
+@pytest.fixture
+def live_index(monkeypatch):
+    index = CatalogSearchIndex()
+    monkeypatch.setattr(search_index, "_index", index)
+    return index
+
+
+def ids(hits):
+    return [doc_id for _, doc_id in hits]
+
+
+def dish(item_id, name, description=None, **attributes):
+    return SimpleNamespace(id=item_id, restaurant_id="r1", name=name, description=description,
+                           **{"is_available": True, "is_vegetarian": False, "is_vegan": False,
+                              "is_gluten_free": False, "spice_level": 0, **attributes})
+
+
+def test_tokenize_folds_case_stopwords_and_plurals():
+    assert tokenize("The Noodles with Curries, and BOXES") == ["noodle", "curry", "box"]
+    assert tokenize(None) == []
+
+
+def test_bm25_ranking():
+    index = InvertedIndex()
+    index.upsert("name", "Spicy Noodles", "house special")
+    index.upsert("description", "House Special", "spicy noodles in broth")
+    index.upsert("short", "Noodles", None)
+    index.upsert("long", "Noodles", "with rice beef chicken pork shrimp egg and vegetables")
+    index.upsert("tofu", "Tofu Noodles", "silken tofu")
+    index.reweight()
+
+    ranked = ids(index.search("noodles", 10))
+    # A name hit outweighs a description hit, and a short document beats a long one
+    assert ranked.index("name") < ranked.index("description")
+    assert ranked.index("short") < ranked.index("long")
+    # Matching more query terms wins; the rarer term ("tofu") counts for more than "noodles"
+    assert ids(index.search("tofu noodles", 2))[0] == "tofu"
+    assert ids(index.search("spicy tofu", 3)) == ["tofu", "name", "description"]
+    assert index.search("sushi", 5) == [] and index.search("the", 5) == []
+
+
+def test_incremental_writes_match_a_rebuild():
+    documents = [("a", "Pad Thai", "rice noodles"), ("b", "Ramen", "wheat noodles in pork broth"),
+                 ("c", "Pho", "rice noodle soup"), ("d", "Udon", None)]
+    rebuilt = InvertedIndex()
+    for document in documents:
+        rebuilt.upsert(*document)
+    rebuilt.reweight()
+
+    incremental = InvertedIndex()
+    incremental.upsert("b", "Old name", "nothing alike")
+    incremental.upsert("x", "Removed", "noodles")
+    for document in documents:
+        incremental.upsert(*document)
+    incremental.remove("x")
+    incremental.reweight()
+
+    assert len(incremental) == 4
+    for query in ("noodles", "rice noodle soup", "pork", "old"):
+        assert incremental.search(query, 10) == pytest.approx(rebuilt.search(query, 10))
+
+
+def test_menu_item_filters():
+    index = InvertedIndex()
+    items = [
+        dish("veg-mild", "Curry", is_vegetarian=True, spice_level=1),
+        dish("veg-hot", "Curry", is_vegetarian=True, is_vegan=True, spice_level=4),
+        dish("meat", "Curry", spice_level=2, is_gluten_free=True),
+        dish("sold-out", "Curry", is_vegetarian=True, is_available=False),
+    ]
+    for item in items:
+        index.upsert(item.id, item.name, item.description, search_index._menu_item_attributes(item))
+
+    def found(**filters):
+        return sorted(ids(index.search("curry", 10, accept=menu_item_filter(**filters))))
+
+    assert found() == ["meat", "veg-hot", "veg-mild"]
+    assert found(vegetarian=True) == ["veg-hot", "veg-mild"]
+    assert found(vegetarian=False) == ["meat"]
+    assert found(vegan=True) == ["veg-hot"]
+    assert found(gluten_free=True) == ["meat"]
+    assert found(max_spice_level=2) == ["meat", "veg-mild"]
+    assert found(min_spice_level=2, vegetarian=True) == ["veg-hot"]
+
+
+def test_filtered_search_looks_past_the_best_candidates():
+    index = InvertedIndex()
+    for n in range(50):
+        index.upsert(f"meat{n}", "Burger", "beef burger", {"is_available": True, "is_vegetarian": False,
+                                                           "is_vegan": False, "is_gluten_free": False, "spice_level": 0})
+    index.upsert("veggie", "Veggie Patty", "burger", {"is_available": True, "is_vegetarian": True,
+                                                      "is_vegan": False, "is_gluten_free": False, "spice_level": 0})
+
+    assert ids(index.search("burger", 2, accept=menu_item_filter(vegetarian=True))) == ["veggie"]
+
+
+def test_catalog_writes_update_the_live_index(live_index, monkeypatch):
+    restaurant = SimpleNamespace(id="r1", name="Luigi's Trattoria", cuisine_type="italian", description="wood fired pizza",
+                                 is_active=True)
+    search_index.index_restaurant(restaurant)
+    assert ids(live_index.restaurants.search("pizza", 5)) == ["r1"]
+
+    restaurant.description = "fresh pasta"
+    search_index.index_restaurant(restaurant)
+    assert live_index.restaurants.search("pizza", 5) == []
+    assert ids(live_index.restaurants.search("pasta", 5)) == ["r1"]
+
+    search_index.index_menu_item(dish("m1", "Margherita", "tomato basil"))
+    search_index.index_menu_items([vars(dish("m2", "Marinara", "tomato garlic"))])
+    assert sorted(ids(live_index.menu_items.search("tomato", 5))) == ["m1", "m2"]
+    search_index.index_menu_item(dish("m1", "Margherita", "tomato basil", is_available=False))
+    assert ids(live_index.menu_items.search("tomato", 5, accept=menu_item_filter())) == ["m2"]
+    search_index.remove_menu_item("m2")
+    assert ids(live_index.menu_items.search("tomato", 5)) == ["m1"]
+
+    # Deactivating a restaurant hides its dishes too, including ones written meanwhile
+    restaurant.is_active = False
+    search_index.index_restaurant(restaurant)
+    assert live_index.restaurants.search("pasta", 5) == [] and len(live_index.menu_items) == 0
+    search_index.index_menu_item(dish("m1", "Margherita", "tomato basil"))
+    assert live_index.menu_items.search("tomato", 5) == []
+
+    # Its dishes come back with the next rebuild, which reactivation schedules
+    monkeypatch.setattr(search_index, "_built_at", 0.0)
+    restaurant.is_active = True
+    search_index.index_restaurant(restaurant, reactivated=True)
+    assert search_index._built_at == float("-inf")
+    search_index.index_menu_item(dish("m3", "Pomodoro", "tomato"))
+    search_index.remove_restaurant("r1")
+    assert len(live_index.menu_items) == 0 and len(live_index.restaurants) == 0
+
+
+def test_items_of_inactive_restaurants_are_not_ranked(db, monkeypatch):
+    owner = User(email="owner@example.com", password_hash="x", first_name="Own", last_name="Er", role="seller")
+    db.add(owner)
+    db.flush()
+    active, inactive = [
+        Restaurant(owner_id=owner.id, name=name, cuisine_type="thai", street_address="1 Main St", city="Town",
+                   state="CA", postal_code="90000", is_active=is_active)
+        for name, is_active in (("Thai Garden", True), ("Thai Palace", False))
+    ]
+    db.add_all([active, inactive])
+    db.flush()
+    # The closed restaurant's curries would rank first and fill every top-k slot
+    db.add_all([MenuItem(restaurant_id=inactive.id, name=f"Curry Curry {n}", price=12.0) for n in range(3)])
+    db.add(MenuItem(restaurant_id=active.id, name="Green Curry", price=12.0, description="coconut"))
+    db.commit()
+
+    async def run_db(db, fn, *args, **kwargs):
+        return fn(db, *args, **kwargs)  # the in-memory database lives on this thread
+
+    monkeypatch.setattr(search_index, "run_db", run_db)
+    monkeypatch.setattr(search_index, "_index", None)
+    index = asyncio.run(search_index.ensure_index(db))
+    hits = index.menu_items.search("curry", 1)
+    assert [index.menu_items.attributes[doc_id]["restaurant_id"] for doc_id in ids(hits)] == [active.id]
+
+    all_ids = [item.id for item in db.query(MenuItem)]
+    assert {item.restaurant_id for item in crud.get_menu_items_by_ids(db, all_ids, active_restaurants_only=True)} \
+        == {active.id}
+
+
+def test_index_builds_from_the_database(db, monkeypatch):
+    owner = User(email="owner@example.com", password_hash="x", first_name="Own", last_name="Er", role="seller")
+    db.add(owner)
+    db.flush()
+    active, inactive = [
+        Restaurant(owner_id=owner.id, name=name, cuisine_type="thai", street_address="1 Main St", city="Town",
+                   state="CA", postal_code="90000", is_active=is_active)
+        for name, is_active in (("Thai Garden", True), ("Thai Palace", False))
+    ]
+    db.add_all([active, inactive])
+    db.flush()
+    db.add(MenuItem(restaurant_id=active.id, name="Green Curry", price=12.0, is_vegan=True))
+    db.commit()
+
+    async def run_db(db, fn, *args, **kwargs):
+        return fn(db, *args, **kwargs)  # the in-memory database lives on this thread
+
+    monkeypatch.setattr(search_index, "run_db", run_db)
+    monkeypatch.setattr(search_index, "_index", None)
+    index = asyncio.run(search_index.ensure_index(db))
+
+    assert ids(index.restaurants.search("thai", 5)) == [active.id]
+    assert len(index.menu_items.search("curry", 5, accept=menu_item_filter(vegan=True))) == 1